@@ -0,0 +1,149 @@
+"""
+Benchmark the latency of cold and warm inspections.
+
+A cold inspection starts from an empty lintforbrains cache dir, so the Python SDK is discovered and the IDE system dir
+is created and indexed from scratch. A warm inspection reuses the cache dir of a previous inspection, as when the cache
+dir is kept on a named docker volume. Each inspection runs in a fresh process, and its wall time and phase timings are
+recorded. Without --pycharm-home-dir, the fake inspect.sh of the tests is used, which measures the lintforbrains
+overhead around the IDE.
+
+Usage: PYTHONPATH=src python benchmarks/bench_inspect.py [--pycharm-home-dir DIR] [--project DIR] [--runs N]
+                                                         [--output FILE]
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+_DEFAULT_PYCHARM_HOME_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'test-data', 'pycharm')
+
+
+def _run_inspection(project_dir: str, pycharm_version: str, pycharm_edition: str, pycharm_home_dir: str,
+                    pycharm_config_dir: str, cache_dir: str):
+    """
+    Run a single inspection in this process and return its measurements
+    """
+    from lintforbrains import config
+    from lintforbrains import inspect
+    from lintforbrains import metrics
+
+    project_config = config.load_config(os.path.join(project_dir, config.DEFAULT_CONFIG_FILE))
+    inspect_metrics = metrics.Metrics('inspect')
+    inspector = inspect.Inspector(pycharm_version, pycharm_edition, pycharm_home_dir, pycharm_config_dir,
+                                  sys.executable, debug_level=0, cache_dir=cache_dir,
+                                  command_metrics=inspect_metrics)
+
+    start = time.perf_counter()
+    results_dir = inspector.run(project_dir, project_config)
+    seconds = time.perf_counter() - start
+    shutil.rmtree(results_dir, ignore_errors=True)
+
+    return {
+        'seconds': seconds,
+        'phases': {p.name: p.wall_seconds for p in inspect_metrics.phases.values()},
+    }
+
+
+def _prepare_project(work_dir: str, files: int) -> str:
+    """
+    Return a generated project of Python files
+    """
+    project_dir = os.path.join(work_dir, f"project-{files}")
+    if not os.path.isdir(project_dir):
+        for i in range(files):
+            path = os.path.join(project_dir, 'src', f"pkg{i % 10}", f"module{i}.py")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as fh:
+                fh.write(f"def function{i}():\n    return {i}\n")
+        with open(os.path.join(project_dir, '.lintconfig'), 'w') as fh:
+            fh.write('inspect {\n  source_dir = "src/"\n  output_dir = "results/"\n}\n')
+    return project_dir
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, universal_newlines=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pycharm-version', default='2021.2')
+    parser.add_argument('--pycharm-edition', default='community')
+    parser.add_argument('--pycharm-home-dir', default=_DEFAULT_PYCHARM_HOME_DIR)
+    parser.add_argument('--project', help="project to inspect (default: a generated project)")
+    parser.add_argument('--files', type=int, default=200, help="files of the generated project")
+    parser.add_argument('--runs', type=int, default=5, help="cold and warm inspections")
+    parser.add_argument('--work-dir', default=os.path.join(tempfile.gettempdir(), 'lintforbrains-bench'),
+                        help="generated project cache")
+    parser.add_argument('--output', help="write JSON results to this file")
+    parser.add_argument('--run', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--pycharm-config-dir', help=argparse.SUPPRESS)
+    parser.add_argument('--cache-dir', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    project_dir = os.path.abspath(args.project or _prepare_project(args.work_dir, args.files))
+    pycharm_home_dir = os.path.abspath(args.pycharm_home_dir)
+
+    if args.run:
+        print(json.dumps(_run_inspection(project_dir, args.pycharm_version, args.pycharm_edition, pycharm_home_dir,
+                                         args.pycharm_config_dir, args.cache_dir)))
+        return
+
+    def _run(cache_dir: str):
+        command = [sys.executable, os.path.abspath(__file__), '--run', '--project', project_dir,
+                   '--pycharm-version', args.pycharm_version, '--pycharm-edition', args.pycharm_edition,
+                   '--pycharm-home-dir', pycharm_home_dir,
+                   '--pycharm-config-dir', os.path.join(temp_dir, 'pycharm-config'), '--cache-dir', cache_dir]
+        result = subprocess.run(command, stdout=subprocess.PIPE, universal_newlines=True, check=True)
+        return json.loads(result.stdout.splitlines()[-1])
+
+    measurements = []
+    with tempfile.TemporaryDirectory(prefix='lintforbrains-bench-') as temp_dir:
+        cold_runs = []
+        for i in range(args.runs):
+            cold_runs.append(_run(os.path.join(temp_dir, f"cold-cache-{i}")))
+
+        # the warm cache dir is kept between inspections, like a named docker volume
+        warm_cache_dir = os.path.join(temp_dir, 'warm-cache')
+        _run(warm_cache_dir)
+        warm_runs = [_run(warm_cache_dir) for _ in range(args.runs)]
+
+    for name, runs in [('cold', cold_runs), ('warm', warm_runs)]:
+        phases = sorted({p for r in runs for p in r['phases']})
+        measurement = {
+            'benchmark': name,
+            'runs': len(runs),
+            'seconds': statistics.median(r['seconds'] for r in runs),
+            'phases': {p: statistics.median(r['phases'].get(p, 0.0) for r in runs) for p in phases},
+        }
+        measurements.append(measurement)
+
+        slowest = sorted(measurement['phases'].items(), key=lambda p: -p[1])[:3]
+        print(f"{name:<5} {measurement['seconds']:8.3f}s median of {len(runs)}  "
+              f"({', '.join(f'{p} {s:.3f}s' for p, s in slowest)})")
+
+    output = {
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'pycharm_home_dir': pycharm_home_dir,
+        'project': project_dir,
+        'measurements': measurements,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(output, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""
+Benchmark loading, suppressing, grouping and writing inspection results.
+
+Each benchmark runs in a fresh process against a generated results directory, and its wall time, CPU time and peak RSS
+are recorded. The output JSON can be compared between commits with benchmarks/compare.py.
+
+Usage: PYTHONPATH=src python benchmarks/bench_report.py [--sizes 1000,100000] [--types N] [--output FILE]
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import bench_suppression
+import generate_results
+
+BENCHMARKS = ['load', 'suppress', 'group', 'write']
+
+_DEFAULT_SIZES = '1000,10000,100000,1000000'
+
+
+def _run_benchmark(benchmark: str, results_dir: str, jobs: int, rules: int, max_buffered_problems: int):
+    """
+    Run a single benchmark in this process and return its measurements
+    """
+    from lintforbrains import config
+    from lintforbrains import report
+    from lintforbrains import results
+    from lintforbrains import suppress
+
+    suppress_severity, suppress_files, suppress_problems = [], [], []
+    if benchmark != 'load':
+        suppress_severity, suppress_files, suppress_problems = bench_suppression._generate_rules(rules)
+
+    project_config = config.Configuration({
+        'inspect': {},
+        'report': {'suppress_severity': suppress_severity,
+                   'suppress_files': suppress_files,
+                   'suppress_problems': suppress_problems,
+                   'max_buffered_problems': max_buffered_problems},
+    })
+
+    start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start_cpu = time.process_time()
+    start = time.perf_counter()
+
+    suppressions = suppress.SuppressionMatcher(suppress_severity, suppress_files, suppress_problems)
+    inspection_results = results.InspectionResults('/project', results_dir, project_config, jobs=jobs,
+                                                  use_cache=False, suppressions=suppressions)
+
+    if benchmark == 'load':
+        count = len(inspection_results.problems)
+    else:
+        inspection_report = report.InspectionReport(inspection_results,
+                                                    suppressions=suppressions,
+                                                    max_buffered_problems=max_buffered_problems)
+        if benchmark == 'suppress':
+            count = sum(1 for _ in inspection_report.iter_problems())
+        elif benchmark == 'group':
+            count = sum(sum(1 for _ in file_problems) for _, file_problems in
+                        inspection_report.group_problems_by_file(inspection_report.iter_problems()))
+        else:
+            count = 0
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                report.SimpleReportWriter().write(inspection_report)
+
+    return {
+        'seconds': time.perf_counter() - start,
+        'cpu_seconds': time.process_time() - start_cpu,
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'start_rss_kb': start_rss,
+        'problems_out': count,
+    }
+
+
+def _prepare_results_dir(work_dir: str, problems: int, types: int, files: int) -> str:
+    """
+    Return a generated results directory, reusing one generated by a previous run
+    """
+    results_dir = os.path.join(work_dir, f"results-{problems}-{types}-{files}")
+    marker_path = os.path.join(results_dir, 'generated.json')
+    if not os.path.exists(marker_path):
+        print(f"Generating {problems} problems in {types} inspection types", file=sys.stderr)
+        generate_results.generate_results_dir(results_dir, problems, type_count=types, file_count=files)
+        with open(marker_path, 'w') as fh:
+            json.dump({'problems': problems, 'types': types, 'files': files}, fh)
+    return results_dir
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, universal_newlines=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default=_DEFAULT_SIZES, help="comma separated problem counts (up to 10000000)")
+    parser.add_argument('--types', type=int, default=100, help="inspection types")
+    parser.add_argument('--files', type=int, default=5000, help="distinct problem files")
+    parser.add_argument('--benchmarks', default=','.join(BENCHMARKS))
+    parser.add_argument('--repeat', type=int, default=1, help="runs per benchmark (the fastest is kept)")
+    parser.add_argument('--jobs', type=int, default=1, help="parser processes")
+    parser.add_argument('--rules', type=int, default=120, help="suppression rules")
+    parser.add_argument('--max-buffered-problems', type=int, default=1000000)
+    parser.add_argument('--work-dir', default=os.path.join(tempfile.gettempdir(), 'lintforbrains-bench'),
+                        help="generated results directory cache")
+    parser.add_argument('--output', help="write JSON results to this file")
+    parser.add_argument('--run', help=argparse.SUPPRESS)
+    parser.add_argument('--results-dir', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(_run_benchmark(args.run, args.results_dir, args.jobs, args.rules,
+                                        args.max_buffered_problems)))
+        return
+
+    benchmarks = args.benchmarks.split(',')
+    sizes = [int(s) for s in args.sizes.split(',')]
+
+    measurements = []
+    for size in sizes:
+        results_dir = _prepare_results_dir(args.work_dir, size, args.types, args.files)
+        for benchmark in benchmarks:
+            runs = []
+            for _ in range(args.repeat):
+                command = [sys.executable, os.path.abspath(__file__), '--run', benchmark, '--results-dir', results_dir,
+                           '--jobs', str(args.jobs), '--rules', str(args.rules),
+                           '--max-buffered-problems', str(args.max_buffered_problems)]
+                result = subprocess.run(command, stdout=subprocess.PIPE, universal_newlines=True, check=True)
+                runs.append(json.loads(result.stdout.splitlines()[-1]))
+
+            measurement = dict(min(runs, key=lambda r: r['seconds']),
+                               benchmark=benchmark, problems=size, types=args.types)
+            measurement['peak_rss_kb'] = min(r['peak_rss_kb'] for r in runs)
+            measurements.append(measurement)
+
+            print(f"{benchmark:<10} {size:>10} problems  {measurement['seconds']:9.3f}s  "
+                  f"{measurement['peak_rss_kb'] / 1024:9.1f} MB  ({size / measurement['seconds']:,.0f} problems/s)")
+
+    output = {
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'jobs': args.jobs,
+        'measurements': measurements,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(output, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark report suppression throughput.
+
+Usage: PYTHONPATH=src python benchmarks/bench_suppression.py [--problems N] [--rules N]
+"""
+import argparse
+import pathlib
+import random
+import time
+
+from lintforbrains import results
+from lintforbrains import suppress
+
+_SEVERITIES = list(results.InspectionProblemSeverity)
+
+
+def _generate_problems(problem_count: int, type_count: int = 500, file_count: int = 5000):
+    rnd = random.Random(0)
+
+    profile = results.InspectionProfile("Benchmark")
+    groups = [results.InspectionGroup(profile, f"Group{g}") for g in range(50)]
+    types = [results.InspectionType(groups[t % len(groups)], f"Inspection{t}", "", "", True) for t in range(type_count)]
+    files = [f"file:///project/src/package{f % 100}/module{f}.py" for f in range(file_count)]
+
+    return [results.InspectionProblem(rnd.choice(types), rnd.choice(_SEVERITIES), "description", rnd.choice(files),
+                                      rnd.randint(1, 1000), "details")
+            for _ in range(problem_count)]
+
+
+def _generate_rules(rule_count: int):
+    suppress_severity = ['TYPO']
+    suppress_files = [f"src/package{i}/*.py" for i in range(rule_count // 2)]
+    suppress_problems = [f"Group{i}::*" for i in range(0, 50, 10)]
+    suppress_problems += [f"Group{i % 50}::Inspection{i}"
+                          for i in range(max(rule_count - len(suppress_files) - len(suppress_problems) - 1, 0))]
+    return suppress_severity, suppress_files, suppress_problems
+
+
+def _naive_is_suppressed(p: results.InspectionProblem, suppress_severity, suppress_files, suppress_problems):
+    """
+    Suppression as implemented before SuppressionMatcher, for comparison
+    """
+    file_path = pathlib.PurePath(p.file)
+    for suppressed_pattern in suppress_files:
+        if file_path.match(suppressed_pattern):
+            return True
+    for suppressed_sev in suppress_severity:
+        if suppressed_sev == p.severity.value:
+            return True
+    for s in suppress_problems:
+        suppressed_group, _, suppressed_type = s.partition('::')
+        if suppressed_type == p.type.name and suppressed_group == p.type.group.name:
+            return True
+        if suppressed_type == '*' and suppressed_group == p.type.group.name:
+            return True
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--problems', type=int, default=500000)
+    parser.add_argument('--rules', type=int, default=120)
+    parser.add_argument('--naive-problems', type=int, default=20000,
+                        help="problems checked with the naive implementation")
+    args = parser.parse_args()
+
+    problems = _generate_problems(args.problems)
+    suppress_severity, suppress_files, suppress_problems = _generate_rules(args.rules)
+    rule_count = len(suppress_severity) + len(suppress_files) + len(suppress_problems)
+
+    start = time.perf_counter()
+    matcher = suppress.SuppressionMatcher(suppress_severity, suppress_files, suppress_problems)
+    suppressed = sum(1 for p in problems if matcher.is_suppressed(p))
+    elapsed = time.perf_counter() - start
+    print(f"matcher: {len(problems)} problems, {rule_count} rules, {suppressed} suppressed, "
+          f"{elapsed:.3f}s ({len(problems) / elapsed:,.0f} problems/s)")
+
+    naive_problems = problems[:args.naive_problems]
+    start = time.perf_counter()
+    suppressed = sum(1 for p in naive_problems
+                     if _naive_is_suppressed(p, suppress_severity, suppress_files, suppress_problems))
+    elapsed = time.perf_counter() - start
+    print(f"naive:   {len(naive_problems)} problems, {rule_count} rules, {suppressed} suppressed, "
+          f"{elapsed:.3f}s ({len(naive_problems) / elapsed:,.0f} problems/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+Compare two bench_report.py result files.
+
+Usage: python benchmarks/compare.py BASELINE.json CURRENT.json [--threshold PERCENT]
+
+Exits with status 1 if any benchmark is slower or uses more peak memory than the baseline by more than the threshold.
+"""
+import argparse
+import json
+import sys
+
+
+def _load_measurements(path: str):
+    with open(path) as fh:
+        data = json.load(fh)
+    return data, {(m['benchmark'], m['problems'], m['types']): m for m in data['measurements']}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--threshold', type=float, default=10.0, help="allowed regression in percent")
+    args = parser.parse_args()
+
+    baseline, baseline_measurements = _load_measurements(args.baseline)
+    current, current_measurements = _load_measurements(args.current)
+
+    print(f"baseline {baseline.get('commit')}, current {current.get('commit')}")
+    print(f"{'benchmark':<10} {'problems':>10} {'types':>6} {'time':>10} {'change':>8} {'peak rss':>10} {'change':>8}")
+
+    regressions = []
+    for key, m in current_measurements.items():
+        b = baseline_measurements.get(key)
+        if b is None:
+            continue
+
+        time_change = (m['seconds'] / b['seconds'] - 1) * 100 if b['seconds'] else 0.0
+        rss_change = (m['peak_rss_kb'] / b['peak_rss_kb'] - 1) * 100 if b['peak_rss_kb'] else 0.0
+
+        flags = ''
+        if time_change > args.threshold or rss_change > args.threshold:
+            flags = '  REGRESSION'
+            regressions.append(key)
+
+        print(f"{key[0]:<10} {key[1]:>10} {key[2]:>6} {m['seconds']:9.3f}s {time_change:+7.1f}% "
+              f"{m['peak_rss_kb'] / 1024:8.1f}MB {rss_change:+7.1f}%{flags}")
+
+    if regressions:
+        print(f"{len(regressions)} regressions above {args.threshold}%")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
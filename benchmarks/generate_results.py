@@ -0,0 +1,96 @@
+"""
+Generate a synthetic inspection results directory.
+
+Usage: python benchmarks/generate_results.py RESULTS_DIR [--problems N] [--types N] [--groups N] [--files N] [--seed N]
+"""
+import argparse
+import os
+import random
+from xml.sax.saxutils import escape
+from xml.sax.saxutils import quoteattr
+
+_SEVERITIES = ['ERROR', 'WARNING', 'WEAK WARNING', 'INFO', 'TYPO']
+
+_SEVERITY_WEIGHTS = [1, 10, 30, 5, 20]
+
+_DESCRIPTIONS = ['PEP 8 coding style violation', 'Unresolved reference', 'Type checker', 'Typo',
+                 'Redundant parentheses', 'Shadowing names from outer scopes']
+
+
+def generate_results_dir(results_dir: str, problem_count: int, type_count: int = 100, group_count: int = 10,
+                         file_count: int = 1000, seed: int = 0) -> int:
+    """
+    Write a results directory with a .descriptions.xml and one problems file per inspection type, and return the
+    number of problems written. Problems are spread over the types with a skewed distribution, like real results
+    where a few inspections report most of the problems.
+    """
+    rnd = random.Random(seed)
+
+    os.makedirs(results_dir, exist_ok=True)
+
+    groups = [f"Group{g}" for g in range(group_count)]
+    types = [(groups[t % group_count], f"Inspection{t}") for t in range(type_count)]
+    files = [f"src/package{f % 100}/module{f}.py" for f in range(file_count)]
+
+    with open(os.path.join(results_dir, '.descriptions.xml'), 'w', encoding='utf-8') as fh:
+        fh.write('<inspections profile="Benchmark">\n')
+        for group in groups:
+            fh.write(f'  <group name={quoteattr(group)}>\n')
+            for type_group, type_name in types:
+                if type_group == group:
+                    fh.write(f'    <inspection shortName={quoteattr(type_name)} '
+                             f'displayName={quoteattr(type_name + " inspection")} enabled="true">'
+                             f'{escape("<html><body>Reports " + type_name + " problems.</body></html>")}'
+                             f'</inspection>\n')
+            fh.write('  </group>\n')
+        fh.write('</inspections>\n')
+
+    # zipf-like weights: type t gets about 1/(t+1) of the problems
+    type_weights = [1 / (t + 1) for t in range(type_count)]
+    type_counts = [0] * type_count
+    for t in rnd.choices(range(type_count), weights=type_weights, k=min(problem_count, 100000)):
+        type_counts[t] += 1
+    scale = problem_count / max(sum(type_counts), 1)
+    type_counts = [int(c * scale) for c in type_counts]
+    type_counts[0] += problem_count - sum(type_counts)
+
+    written = 0
+    for (_, type_name), count in zip(types, type_counts):
+        if not count:
+            continue
+        description = rnd.choice(_DESCRIPTIONS)
+        with open(os.path.join(results_dir, f"{type_name}.xml"), 'w', encoding='utf-8', buffering=1 << 20) as fh:
+            fh.write('<problems is_local_tool="true">\n')
+            severities = rnd.choices(_SEVERITIES, weights=_SEVERITY_WEIGHTS, k=count)
+            problem_files = rnd.choices(files, k=count)
+            for severity, file in zip(severities, problem_files):
+                fh.write('<problem>\n'
+                         f'  <file>file://$PROJECT_DIR$/{file}</file>\n'
+                         f'  <line>{rnd.randint(1, 2000)}</line>\n'
+                         f'  <entry_point TYPE="file" FQNAME="file://$PROJECT_DIR$/{file}" />\n'
+                         f'  <problem_class severity="{severity}" attribute_key="WARNING_ATTRIBUTES">{description}'
+                         '</problem_class>\n'
+                         f'  <description>{type_name}: problem {rnd.randint(0, 99)}</description>\n'
+                         '</problem>\n')
+            fh.write('</problems>\n')
+        written += count
+
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('results_dir')
+    parser.add_argument('--problems', type=int, default=100000)
+    parser.add_argument('--types', type=int, default=100)
+    parser.add_argument('--groups', type=int, default=10)
+    parser.add_argument('--files', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    written = generate_results_dir(args.results_dir, args.problems, args.types, args.groups, args.files, args.seed)
+    print(f"Wrote {written} problems to {args.results_dir}")
+
+
+if __name__ == '__main__':
+    main()
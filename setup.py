@@ -39,6 +39,9 @@ setup(name='lintforbrains',
       package_dir={'': 'src'},
       include_package_data=True,
       install_requires=get_requirements(),
+      extras_require={
+          'zstd': ['zstandard>=0.15'],
+      },
       entry_points={
           'console_scripts': ['lintforbrains=lintforbrains.__main__:cli'],
       })
@@ -1,13 +1,23 @@
 import os
 import shutil
 import sys
+import typing
 
 import click
 
 from lintforbrains import logging
 from lintforbrains import config
+from lintforbrains.batch import run_inspect_all
+from lintforbrains.cache import run_cache_prune
+from lintforbrains.cache import run_cache_stats
 from lintforbrains.inspect import run_inspect
+from lintforbrains.metrics import parse_statsd_address
+from lintforbrains.report import REPORT_FORMATS
 from lintforbrains.report import run_report
+from lintforbrains.server import find_server
+from lintforbrains.server import run_inspect_client
+from lintforbrains.server import run_serve
+from lintforbrains.server import server_socket_path
 from lintforbrains.utilities import abort
 
 _DEFAULT_PYTHON_PATH = '/usr/bin/python'
@@ -48,6 +58,17 @@ def _get_pycharm_config_dir(pycharm_version: str, pycharm_edition: str):
         raise NotImplementedError()
 
 
+def _get_cache_dir():
+    """
+    Return the path of lintforbrains cache directory, $XDG_CACHE_HOME/lintforbrains or ~/.cache/lintforbrains when
+    XDG_CACHE_HOME is not set
+    """
+    if sys.platform.lower() == 'linux':
+        return os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser("~/.cache"), "lintforbrains")
+    else:
+        raise NotImplementedError()
+
+
 def _get_python_bin():
     """
     Return the path of the Python binary
@@ -65,6 +86,19 @@ def _load_config(config_file: str):
         abort(f"Failed to load configuration file: {config_file}")
 
 
+# noinspection PyUnusedLocal
+def _validate_statsd_address(ctx: click.Context, param: click.Parameter, value: typing.Optional[str]):
+    """
+    Check the StatsD address before the command runs, it is only used once the command finished
+    """
+    if value is not None:
+        try:
+            parse_statsd_address(value)
+        except ValueError as ex:
+            raise click.BadParameter(str(ex)) from ex
+    return value
+
+
 @click.group()
 @click.option('--debug/--no-debug', default=False, help="enable debug")
 def cli(debug: bool):
@@ -82,13 +116,66 @@ def cli(debug: bool):
 @click.option('pycharm_edition', '--pycharm-edition', type=str, help="pycharm edition")
 @click.option('pycharm_home_dir', '--pycharm-home-dir', type=str, help="pycharm home dir")
 @click.option('pycharm_config_dir', '--pycharm-config-dir', type=str, help="pycharm config dir")
+@click.option('pycharm_system_dir', '--pycharm-system-dir', type=str, help="pycharm system (caches and indexes) dir")
 @click.option('python_bin', '--python', type=click.Path(exists=True), help="python binary path")
+@click.option('cache_dir', '--cache-dir', type=str,
+              help="lintforbrains cache dir (default: $XDG_CACHE_HOME/lintforbrains or ~/.cache/lintforbrains)")
+@click.option('incremental', '--incremental', is_flag=True, help="only inspect files changed since the last results")
+@click.option('since', '--since', type=str, help="only inspect files changed since a git ref")
+@click.option('shards', '--shards', type=click.IntRange(min=1), default=1, help="concurrent inspector processes")
+@click.option('prune_profile', '--prune-profile/--no-prune-profile', default=None,
+              help="disable inspections whose problems are all suppressed by the report configuration")
+@click.option('report_results', '--report', is_flag=True,
+              help="report the results, parsing them while the inspector writes them")
+@click.option('report_format', '--report-format', type=click.Choice(REPORT_FORMATS),
+              help="report format (defaults to report.output in the config)")
+@click.option('report_output', '--report-output', type=click.Path(dir_okay=False),
+              help="write the report to a file")
+@click.option('report_jobs', '--report-jobs', type=click.IntRange(min=0), default=1,
+              help="report parser processes (0 for one per CPU)")
+@click.option('sandbox', '--sandbox', is_flag=True,
+              help="inspect in private copies of the pycharm config and system dirs, for concurrent inspections")
+@click.option('archive_results', '--archive', type=click.Choice(['gzip', 'zstd']),
+              help="pack the results into a compressed archive")
+@click.option('use_server', '--server', is_flag=True,
+              help="submit to the running inspection server, which inspects with its own python and pycharm")
+@click.option('timings', '--timings', is_flag=True, help="print phase timings")
+@click.option('metrics_prometheus', '--metrics-prometheus', type=str, help="write metrics to a prometheus textfile")
+@click.option('metrics_statsd', '--metrics-statsd', type=str, callback=_validate_statsd_address,
+              help="send metrics to a statsd host:port")
 def inspect(project_dir: str, config_file: str, python_bin: str,
-            pycharm_edition: str, pycharm_version: str, pycharm_home_dir: str, pycharm_config_dir: str):
+            pycharm_edition: str, pycharm_version: str, pycharm_home_dir: str, pycharm_config_dir: str,
+            pycharm_system_dir: str, cache_dir: str, incremental: bool, since: str, shards: int, prune_profile: bool,
+            report_results: bool, report_format: str, report_output: str, report_jobs: int, sandbox: bool,
+            archive_results: str, use_server: bool, timings: bool, metrics_prometheus: str, metrics_statsd: str):
     """
     Run code inspection
     """
 
+    # the server inspects with its own interpreter, IDE and system dir, and does not report or archive results
+    if use_server:
+        local_options = {'--python': python_bin,
+                         '--pycharm-version': pycharm_version,
+                         '--pycharm-edition': pycharm_edition,
+                         '--pycharm-home-dir': pycharm_home_dir,
+                         '--pycharm-config-dir': pycharm_config_dir,
+                         '--pycharm-system-dir': pycharm_system_dir,
+                         '--report': report_results,
+                         '--report-format': report_format,
+                         '--report-output': report_output,
+                         '--sandbox': sandbox,
+                         '--archive': archive_results,
+                         '--timings': timings,
+                         '--metrics-prometheus': metrics_prometheus,
+                         '--metrics-statsd': metrics_statsd}
+        unsupported_options = [name for name, value in local_options.items() if value]
+        if unsupported_options:
+            abort(f"{', '.join(unsupported_options)} cannot be used with the inspection server "
+                  f"(configure the server instead)")
+
+    if not report_results and (report_format or report_output):
+        abort("--report-format and --report-output require --report")
+
     if not pycharm_version:
         pycharm_version = _DEFAULT_PYCHARM_VERSION
 
@@ -101,11 +188,25 @@ def inspect(project_dir: str, config_file: str, python_bin: str,
     if not pycharm_config_dir:
         pycharm_config_dir = _get_pycharm_config_dir(pycharm_version, pycharm_edition)
 
+    if not cache_dir:
+        cache_dir = _get_cache_dir()
+
     # load project config
     if config_file is None:
         config_file = os.path.join(project_dir, config.DEFAULT_CONFIG_FILE)
     project_config = _load_config(config_file)
 
+    # submit project inspection to the inspection server
+    if use_server:
+        socket_path = find_server(server_socket_path(cache_dir))
+        if socket_path is None:
+            abort(f"Inspection server is not running: {server_socket_path(cache_dir)}")
+        return run_inspect_client(socket_path, project_dir, config_file,
+                                  incremental=incremental,
+                                  since=since,
+                                  shards=shards,
+                                  prune_profile=prune_profile)
+
     # run project inspection
     return run_inspect(project_dir,
                        project_config,
@@ -113,14 +214,102 @@ def inspect(project_dir: str, config_file: str, python_bin: str,
                        pycharm_edition,
                        pycharm_home_dir,
                        pycharm_config_dir,
-                       python_bin or _get_python_bin(), debug_level=2)
+                       python_bin or _get_python_bin(), debug_level=2,
+                       incremental=incremental,
+                       since=since,
+                       shards=shards,
+                       cache_dir=cache_dir,
+                       pycharm_system_dir=pycharm_system_dir,
+                       timings=timings,
+                       metrics_prometheus=metrics_prometheus,
+                       metrics_statsd=metrics_statsd,
+                       prune_profile=prune_profile,
+                       report=report_results,
+                       sandbox=sandbox,
+                       archive_results=archive_results,
+                       report_format=report_format,
+                       report_output=report_output,
+                       report_jobs=report_jobs)
+
+
+@cli.command('inspect-all')
+@click.argument('root_dir', type=click.Path(exists=True, file_okay=False), default='.')
+@click.option('pycharm_version', '--pycharm-version', type=str, help="pycharm version")
+@click.option('pycharm_edition', '--pycharm-edition', type=str, help="pycharm edition")
+@click.option('pycharm_home_dir', '--pycharm-home-dir', type=str, help="pycharm home dir")
+@click.option('pycharm_config_dir', '--pycharm-config-dir', type=str, help="pycharm config dir")
+@click.option('python_bin', '--python', type=click.Path(exists=True), help="python binary path")
+@click.option('cache_dir', '--cache-dir', type=str,
+              help="lintforbrains cache dir (default: $XDG_CACHE_HOME/lintforbrains or ~/.cache/lintforbrains)")
+@click.option('jobs', '--jobs', type=click.IntRange(min=1), default=None,
+              help="concurrent inspections (default: as many as the cores and available memory allow)")
+@click.option('incremental', '--incremental', is_flag=True, help="only inspect files changed since the last results")
+@click.option('since', '--since', type=str, help="only inspect files changed since a git ref")
+@click.option('prune_profile', '--prune-profile/--no-prune-profile', default=None,
+              help="disable inspections whose problems are all suppressed by the report configuration")
+@click.option('index_path', '--index', type=click.Path(dir_okay=False),
+              help="index file of the results dirs (default: inspect-all.json in the root dir)")
+def inspect_all(root_dir: str, python_bin: str, pycharm_edition: str, pycharm_version: str, pycharm_home_dir: str,
+                pycharm_config_dir: str, cache_dir: str, jobs: typing.Optional[int], incremental: bool, since: str,
+                prune_profile: bool, index_path: str):
+    """
+    Run code inspection of every project below a directory
+    """
+
+    if not pycharm_version:
+        pycharm_version = _DEFAULT_PYCHARM_VERSION
+
+    if not pycharm_edition:
+        pycharm_edition = _DEFAULT_PYCHARM_EDITION
+
+    if not pycharm_home_dir:
+        pycharm_home_dir = _get_pycharm_home_dir(pycharm_version, pycharm_edition)
+
+    if not pycharm_config_dir:
+        pycharm_config_dir = _get_pycharm_config_dir(pycharm_version, pycharm_edition)
+
+    if not cache_dir:
+        cache_dir = _get_cache_dir()
+
+    # run project inspections
+    return run_inspect_all(root_dir,
+                           pycharm_version,
+                           pycharm_edition,
+                           pycharm_home_dir,
+                           pycharm_config_dir,
+                           python_bin or _get_python_bin(), debug_level=2,
+                           cache_dir=cache_dir,
+                           jobs=jobs,
+                           incremental=incremental,
+                           since=since,
+                           prune_profile=prune_profile,
+                           index_path=index_path)
 
 
 @cli.command()
 @click.argument('project_dir', type=click.Path(exists=True), default='.')
 @click.option('config_file', '--config', type=click.Path(exists=True), help="config file")
-@click.option('results_dir', '--results', type=click.Path(exists=True), help="results dir")
-def report(project_dir: str, config_file: str, results_dir: str):
+@click.option('results_dir', '--results', type=click.Path(exists=True), help="results dir or results archive")
+@click.option('jobs', '--jobs', type=click.IntRange(min=0), default=1, help="parser processes (0 for one per CPU)")
+@click.option('use_cache', '--cache/--no-cache', default=True, help="use the parsed results cache")
+@click.option('timings', '--timings', is_flag=True, help="print phase timings")
+@click.option('metrics_prometheus', '--metrics-prometheus', type=str, help="write metrics to a prometheus textfile")
+@click.option('metrics_statsd', '--metrics-statsd', type=str, callback=_validate_statsd_address,
+              help="send metrics to a statsd host:port")
+@click.option('baseline_path', '--baseline', type=click.Path(exists=True),
+              help="only report problems missing from a baseline file or results dir")
+@click.option('write_baseline_path', '--write-baseline', type=click.Path(dir_okay=False),
+              help="write a baseline file of the problems instead of the report")
+@click.option('fail_on', '--fail-on', type=str, multiple=True,
+              help="exit with status 3 if there are more than N problems of a SEVERITY[:N] (N defaults to 0)")
+@click.option('quiet', '--quiet', '-q', is_flag=True,
+              help="only print summaries, and stop reading results once a --fail-on threshold is crossed")
+@click.option('output_format', '--format', type=click.Choice(REPORT_FORMATS),
+              help="report format (defaults to report.output in the config)")
+@click.option('output_path', '--output', type=click.Path(dir_okay=False), help="write the report to a file")
+def report(project_dir: str, config_file: str, results_dir: str, jobs: int, use_cache: bool, timings: bool,
+           metrics_prometheus: str, metrics_statsd: str, baseline_path: str, write_baseline_path: str,
+           fail_on: typing.Tuple[str, ...], quiet: bool, output_format: str, output_path: str):
     """
     View inspection results
     """
@@ -133,7 +322,94 @@ def report(project_dir: str, config_file: str, results_dir: str):
     # generate report
     return run_report(project_dir,
                       project_config,
-                      results_dir)
+                      results_dir,
+                      jobs=jobs,
+                      use_cache=use_cache,
+                      timings=timings,
+                      metrics_prometheus=metrics_prometheus,
+                      metrics_statsd=metrics_statsd,
+                      baseline_path=baseline_path,
+                      write_baseline_path=write_baseline_path,
+                      fail_on=fail_on,
+                      quiet=quiet,
+                      output_format=output_format,
+                      output_path=output_path)
+
+
+@cli.command()
+@click.option('pycharm_version', '--pycharm-version', type=str, help="pycharm version")
+@click.option('pycharm_edition', '--pycharm-edition', type=str, help="pycharm edition")
+@click.option('pycharm_home_dir', '--pycharm-home-dir', type=str, help="pycharm home dir")
+@click.option('pycharm_config_dir', '--pycharm-config-dir', type=str, help="pycharm config dir")
+@click.option('python_bin', '--python', type=click.Path(exists=True), help="python binary path")
+@click.option('cache_dir', '--cache-dir', type=str,
+              help="lintforbrains cache dir (default: $XDG_CACHE_HOME/lintforbrains or ~/.cache/lintforbrains)")
+@click.option('socket_path', '--socket', type=str, help="server socket path")
+@click.option('jobs', '--jobs', type=click.IntRange(min=1), default=1, help="concurrent inspection jobs")
+@click.option('sandbox', '--sandbox', is_flag=True,
+              help="inspect in private copies of the pycharm config and system dirs, for concurrent inspections")
+def serve(python_bin: str, pycharm_edition: str, pycharm_version: str, pycharm_home_dir: str, pycharm_config_dir: str,
+          cache_dir: str, socket_path: str, jobs: int, sandbox: bool):
+    """
+    Run the inspection server
+    """
+
+    if not pycharm_version:
+        pycharm_version = _DEFAULT_PYCHARM_VERSION
+
+    if not pycharm_edition:
+        pycharm_edition = _DEFAULT_PYCHARM_EDITION
+
+    if not pycharm_home_dir:
+        pycharm_home_dir = _get_pycharm_home_dir(pycharm_version, pycharm_edition)
+
+    if not pycharm_config_dir:
+        pycharm_config_dir = _get_pycharm_config_dir(pycharm_version, pycharm_edition)
+
+    if not cache_dir:
+        cache_dir = _get_cache_dir()
+
+    # run inspection server
+    return run_serve(pycharm_version,
+                     pycharm_edition,
+                     pycharm_home_dir,
+                     pycharm_config_dir,
+                     python_bin or _get_python_bin(), debug_level=2,
+                     cache_dir=cache_dir,
+                     jobs=jobs,
+                     socket_path=socket_path,
+                     sandbox=sandbox)
+
+
+@cli.group('cache')
+def cache_group():
+    """
+    Manage the inspector caches
+    """
+
+
+@cache_group.command('stats')
+@click.option('cache_dir', '--cache-dir', type=str,
+              help="lintforbrains cache dir (default: $XDG_CACHE_HOME/lintforbrains or ~/.cache/lintforbrains)")
+def cache_stats(cache_dir: str):
+    """
+    Show the size and last use of the inspector caches
+    """
+
+    return run_cache_stats(cache_dir or _get_cache_dir())
+
+
+@cache_group.command('prune')
+@click.option('cache_dir', '--cache-dir', type=str,
+              help="lintforbrains cache dir (default: $XDG_CACHE_HOME/lintforbrains or ~/.cache/lintforbrains)")
+@click.option('older_than', '--older-than', type=click.FloatRange(min=0), help="prune caches unused for DAYS")
+@click.option('prune_all', '--all', is_flag=True, help="prune all caches")
+def cache_prune(cache_dir: str, older_than: float, prune_all: bool):
+    """
+    Remove unused inspector caches
+    """
+
+    return run_cache_prune(cache_dir or _get_cache_dir(), older_than, prune_all)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,233 @@
+import contextlib
+import io
+import json
+import os
+import shutil
+import tarfile
+import time
+import typing
+
+from lintforbrains import logging
+from lintforbrains.utilities import atomic_write
+
+try:
+    import zstandard
+except ImportError:  # zstd compression is optional
+    zstandard = None
+
+_LOG = logging.get_logger(__name__)
+
+_ARCHIVE_INDEX_MEMBER = '.archive-index.json'
+
+_ARCHIVE_INDEX_VERSION = 1
+
+_DESCRIPTIONS_MEMBER = '.descriptions.xml'
+
+_GZIP_COMPRESS_LEVEL = 6
+
+_ZSTD_COMPRESS_LEVEL = 10
+
+_GZIP_MAGIC = b'\x1f\x8b'
+
+_ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+ARCHIVE_COMPRESSIONS = ('gzip', 'zstd')
+
+_ARCHIVE_SUFFIXES = {
+    'gzip': '.tar.gz',
+    'zstd': '.tar.zst',
+}
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def is_archive(path: str) -> bool:
+    """
+    Return True if a path is a results archive file.
+    """
+    return path.endswith(tuple(_ARCHIVE_SUFFIXES.values())) and os.path.isfile(path)
+
+
+def create_archive(results_dir: str, compression: str = 'gzip', remove: bool = False) -> str:
+    """
+    Pack a results directory into a compressed tar archive next to it, and return the archive path.
+
+    The archive starts with an index of its members and the inspection descriptions, followed by the problems files
+    in name order and then the other files of the results directory, so the results are read from the archive in a
+    single pass without extracting it. Hidden files other than the descriptions (such as the parsed results cache)
+    and subdirectories are not archived.
+
+    :param results_dir: results directory
+    :param compression: gzip or zstd
+    :param remove: remove the results directory once it is archived
+    """
+    if compression not in _ARCHIVE_SUFFIXES:
+        raise ArchiveError(f"Unknown archive compression {compression!r} (expected one of "
+                           f"{', '.join(ARCHIVE_COMPRESSIONS)})")
+    if compression == 'zstd' and zstandard is None:
+        raise ArchiveError("zstd archives require the zstandard package")
+
+    results_dir = os.path.normpath(results_dir)
+    archive_path = results_dir + _ARCHIVE_SUFFIXES[compression]
+
+    names = sorted(e.name for e in os.scandir(results_dir) if e.is_file(follow_symlinks=False) and
+                   (not e.name.startswith('.') or e.name == _DESCRIPTIONS_MEMBER))
+    problems_names = [n for n in names if n.endswith('.xml') and n != _DESCRIPTIONS_MEMBER]
+    other_names = [n for n in names if n != _DESCRIPTIONS_MEMBER and n not in problems_names]
+    member_names = ([_DESCRIPTIONS_MEMBER] if _DESCRIPTIONS_MEMBER in names else []) + problems_names + other_names
+
+    index = json.dumps({
+        'version': _ARCHIVE_INDEX_VERSION,
+        'members': [{'name': n, 'size': os.path.getsize(os.path.join(results_dir, n))} for n in member_names],
+        'problems': [n[:-len('.xml')] for n in problems_names],
+    }).encode('utf-8')
+
+    with atomic_write(archive_path, 'wb') as fh:
+        with _open_tar_writer(fh, compression) as tf:
+            index_info = tarfile.TarInfo(_ARCHIVE_INDEX_MEMBER)
+            index_info.size = len(index)
+            index_info.mtime = int(time.time())
+            index_info.mode = 0o644
+            tf.addfile(index_info, io.BytesIO(index))
+            for name in member_names:
+                tf.add(os.path.join(results_dir, name), arcname=name, recursive=False)
+
+    _LOG.debug(f"Archived {len(member_names)} results files of {results_dir} to {archive_path}")
+
+    if remove:
+        shutil.rmtree(results_dir)
+
+    return archive_path
+
+
+@contextlib.contextmanager
+def _open_tar_writer(fh: typing.BinaryIO, compression: str) -> typing.Iterator[tarfile.TarFile]:
+    """
+    Open a tar stream writing to a file with the given compression
+    """
+    if compression == 'gzip':
+        with tarfile.open(fileobj=fh, mode='w:gz', compresslevel=_GZIP_COMPRESS_LEVEL) as tf:
+            yield tf
+        return
+
+    writer = zstandard.ZstdCompressor(level=_ZSTD_COMPRESS_LEVEL).stream_writer(fh, closefd=False)
+    with writer:
+        with tarfile.open(fileobj=writer, mode='w|') as tf:
+            yield tf
+
+
+class ResultsArchive:
+    """
+    The ResultsArchive class reads the results files of a results archive as a stream, without extracting it.
+
+    Members are decompressed in order as they are read, so at most one chunk of the archive is held in memory. The
+    index at the start of the archive lists the problems files, so reading stops after the last of them instead of
+    decompressing the rest of the archive.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize instance of the ResultsArchive class.
+
+        :param path: archive path
+        """
+        self.path = path
+        self._index = None
+
+    @property
+    def problems_names(self) -> typing.List[str]:
+        """
+        Inspection names of the problems files in the archive, in archive order
+        """
+        return list(self._load_index()['problems'])
+
+    def read_descriptions(self) -> bytes:
+        """
+        Return the content of the inspection descriptions.
+        """
+        for name, fh in self.iter_members():
+            if name == _DESCRIPTIONS_MEMBER:
+                return fh.read()
+            break
+        raise ArchiveError(f"No inspection descriptions in results archive {self.path}")
+
+    def iter_problems_files(self) -> typing.Iterator[typing.Tuple[str, typing.BinaryIO]]:
+        """
+        Iterate over the (inspection name, file object) of each problems file in the archive. Each file object must be
+        read before the next one is yielded.
+        """
+        remaining = set(self.problems_names)
+        if not remaining:
+            return
+
+        for name, fh in self.iter_members():
+            inspection_name = name[:-len('.xml')] if name.endswith('.xml') else None
+            if inspection_name not in remaining:
+                continue
+            yield inspection_name, fh
+            remaining.discard(inspection_name)
+            if not remaining:
+                return
+
+    def iter_members(self) -> typing.Iterator[typing.Tuple[str, typing.BinaryIO]]:
+        """
+        Iterate over the (name, file object) of each file after the index of the archive.
+        """
+        with self._open_tar() as tf:
+            for i, member in enumerate(tf):
+                if i == 0:
+                    if member.name != _ARCHIVE_INDEX_MEMBER:
+                        raise ArchiveError(f"Not a results archive: {self.path}")
+                    if self._index is None:
+                        self._index = self._parse_index(tf.extractfile(member).read())
+                    continue
+                if member.isfile():
+                    yield member.name, tf.extractfile(member)
+
+    def _load_index(self) -> typing.Dict[str, typing.Any]:
+        if self._index is None:
+            with self._open_tar() as tf:
+                member = tf.next()
+                if member is None or member.name != _ARCHIVE_INDEX_MEMBER:
+                    raise ArchiveError(f"Not a results archive: {self.path}")
+                self._index = self._parse_index(tf.extractfile(member).read())
+        return self._index
+
+    def _parse_index(self, data: bytes) -> typing.Dict[str, typing.Any]:
+        try:
+            index = json.loads(data)
+        except ValueError as ex:
+            raise ArchiveError(f"Invalid index in results archive {self.path}: {ex}") from ex
+        if index.get('version') != _ARCHIVE_INDEX_VERSION:
+            raise ArchiveError(f"Unsupported results archive version in {self.path}")
+        return index
+
+    @contextlib.contextmanager
+    def _open_tar(self) -> typing.Iterator[tarfile.TarFile]:
+        """
+        Open the archive as a tar stream, detecting the compression from its magic number
+        """
+        try:
+            fh = open(self.path, 'rb')
+        except OSError as ex:
+            raise ArchiveError(f"Unable to read results archive {self.path}: {ex}") from ex
+
+        with fh:
+            magic = fh.read(len(_ZSTD_MAGIC))
+            fh.seek(0)
+            try:
+                if magic.startswith(_ZSTD_MAGIC):
+                    if zstandard is None:
+                        raise ArchiveError(f"Reading zstd archive {self.path} requires the zstandard package")
+                    with zstandard.ZstdDecompressor().stream_reader(fh, closefd=False) as reader:
+                        with tarfile.open(fileobj=reader, mode='r|') as tf:
+                            yield tf
+                elif magic.startswith(_GZIP_MAGIC):
+                    with tarfile.open(fileobj=fh, mode='r|gz') as tf:
+                        yield tf
+                else:
+                    raise ArchiveError(f"Not a results archive: {self.path}")
+            except (tarfile.TarError, EOFError, OSError) as ex:
+                raise ArchiveError(f"Unable to read results archive {self.path}: {ex}") from ex
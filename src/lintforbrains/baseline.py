@@ -0,0 +1,333 @@
+import array
+import bisect
+import collections
+import functools
+import hashlib
+import marshal
+import os
+import re
+import typing
+
+from lintforbrains import logging
+from lintforbrains import results
+from lintforbrains.utilities import atomic_write
+
+_LOG = logging.get_logger(__name__)
+
+_BASELINE_MAGIC = b'LFBBASE1'
+
+_NUMBER_PATTERN = re.compile(r'\d+')
+
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+
+_SOURCE_CACHE_SIZE = 2048
+
+
+class BaselineError(Exception):
+    pass
+
+
+class ProblemFingerprint(typing.NamedTuple):
+    problem_key: int
+    """
+    Hash of the inspection type, file and normalized description (line independent)
+    """
+
+    code_key: int
+    """
+    Hash of the problem key and the code of the problem line (the problem key if the code is unknown)
+    """
+
+    record: str
+    """
+    Inspection type and file of the problem, used to summarize fixed problems
+    """
+
+
+class ProblemFingerprinter:
+    """
+    The ProblemFingerprinter class computes fingerprints of inspection problems that survive line shifts.
+
+    A fingerprint has two keys. The problem key hashes the inspection type, the file relative to the project directory
+    and the problem description with numbers and whitespace normalized. The code key also hashes the code of the
+    problem line, so problems with the same description in one file can be told apart while the code is unchanged.
+    The code of a file modified after the problems were found is unknown, since its lines may have moved.
+    """
+
+    def __init__(self, project_dir: str, results_time: float = None):
+        """
+        Initialize instance of the ProblemFingerprinter class.
+
+        :param project_dir: project directory
+        :param results_time: time the problems were found (None if the source files are unchanged since)
+        """
+        self.project_dir = os.path.normpath(project_dir)
+        self.results_time = results_time
+
+        # records, descriptions and source lines repeat across many problems
+        self._records = dict()
+        self._descriptions = dict()
+        self._read_lines = functools.lru_cache(maxsize=_SOURCE_CACHE_SIZE)(_read_lines)
+        self._changed_paths = dict()
+
+    def fingerprint(self, problem: results.InspectionProblem) -> ProblemFingerprint:
+        record, path = self._record(problem.type, problem.file)
+
+        description = self._descriptions.get(problem.details)
+        if description is None:
+            description = self._descriptions[problem.details] = \
+                _WHITESPACE_PATTERN.sub(' ', _NUMBER_PATTERN.sub('0', problem.details or '')).strip()
+
+        problem_key = _hash64(f"{record}\0{description}")
+        if self._is_changed(path):
+            code_key = problem_key
+        else:
+            code_key = _hash64(f"{problem_key}\0{self._read_line(path, problem.line)}")
+
+        return ProblemFingerprint(problem_key, code_key, record)
+
+    def _record(self, inspection_type: typing.Optional[results.InspectionType],
+                file: str) -> typing.Tuple[str, str]:
+        """
+        Return the record (inspection type and project relative file) and the absolute path of a problem file
+        """
+        try:
+            return self._records[inspection_type, file]
+        except KeyError:
+            pass
+
+        type_name = f"{inspection_type.group.name}::{inspection_type.name}" if inspection_type is not None else ''
+
+        path = os.path.normpath(os.path.join(self.project_dir, results.problem_file_path(file)))
+        relative_file = os.path.relpath(path, self.project_dir).replace(os.sep, '/')
+
+        self._records[inspection_type, file] = value = f"{type_name}\0{relative_file}", path
+        return value
+
+    def _is_changed(self, path: str) -> bool:
+        """
+        Return True if a source file was modified after the problems were found
+        """
+        if self.results_time is None:
+            return False
+
+        changed = self._changed_paths.get(path)
+        if changed is None:
+            try:
+                changed = os.stat(path).st_mtime > self.results_time
+            except OSError:
+                changed = False
+            self._changed_paths[path] = changed
+        return changed
+
+    def _read_line(self, path: str, line: int) -> str:
+        """
+        Return the code of a line of a source file with whitespace normalized, or an empty string
+        """
+        lines = self._read_lines(path)
+        if 0 < line <= len(lines):
+            return _WHITESPACE_PATTERN.sub(' ', lines[line - 1]).strip()
+        return ''
+
+
+class BaselineIndex:
+    """
+    The BaselineIndex class is a compact index of the fingerprints of baseline problems.
+
+    The fingerprints are held in arrays sorted by code key and by problem key, so the index takes about 25 bytes per
+    problem and is searched by bisection. Matching consumes index entries: a problem first matches an unused entry
+    with the same code key, then any unused entry with the same problem key (its line changed). Problems without a
+    match are new, and entries that are never matched are fixed problems.
+    """
+
+    def __init__(self, problem_keys: array.array, code_keys: array.array, record_indexes: array.array,
+                 records: typing.List[str]):
+        """
+        Initialize instance of the BaselineIndex class.
+
+        :param problem_keys: problem key of each entry
+        :param code_keys: code key of each entry
+        :param record_indexes: index into records of each entry
+        :param records: inspection type and file records
+        """
+        self.records = records
+
+        # entries are stored sorted by code key
+        order = sorted(range(len(code_keys)), key=code_keys.__getitem__)
+        self._code_keys = array.array('Q', (code_keys[i] for i in order))
+        self._problem_keys = array.array('Q', (problem_keys[i] for i in order))
+        self._record_indexes = array.array('I', (record_indexes[i] for i in order))
+
+        # entry indexes sorted by problem key
+        self._problem_order = array.array('I', sorted(range(len(order)), key=self._problem_keys.__getitem__))
+        self._sorted_problem_keys = array.array('Q', (self._problem_keys[i] for i in self._problem_order))
+
+        self._matched = bytearray(len(order))
+        self._code_key_cursors = dict()
+        self._problem_key_cursors = dict()
+
+    def __len__(self):
+        return len(self._code_keys)
+
+    @classmethod
+    def from_problems(cls, problems: typing.Iterable[results.InspectionProblem],
+                      fingerprinter: ProblemFingerprinter) -> 'BaselineIndex':
+        """
+        Build an index of the fingerprints of problems.
+        """
+        problem_keys = array.array('Q')
+        code_keys = array.array('Q')
+        record_indexes = array.array('I')
+        records = []
+        record_ids = dict()
+
+        for p in problems:
+            fingerprint = fingerprinter.fingerprint(p)
+            record_id = record_ids.get(fingerprint.record)
+            if record_id is None:
+                record_id = record_ids[fingerprint.record] = len(records)
+                records.append(fingerprint.record)
+            problem_keys.append(fingerprint.problem_key)
+            code_keys.append(fingerprint.code_key)
+            record_indexes.append(record_id)
+
+        return cls(problem_keys, code_keys, record_indexes, records)
+
+    @classmethod
+    def load(cls, path: str) -> 'BaselineIndex':
+        """
+        Load an index from a baseline file.
+        """
+        with open(path, 'rb') as fh:
+            if fh.read(len(_BASELINE_MAGIC)) != _BASELINE_MAGIC:
+                raise BaselineError(f"Not a baseline file: {path}")
+            try:
+                data = marshal.load(fh)
+            except (EOFError, ValueError, TypeError) as ex:
+                raise BaselineError(f"Corrupt baseline file: {path}") from ex
+
+        problem_keys = array.array('Q')
+        problem_keys.frombytes(data['problem_keys'])
+        code_keys = array.array('Q')
+        code_keys.frombytes(data['code_keys'])
+        record_indexes = array.array('I')
+        record_indexes.frombytes(data['record_indexes'])
+
+        _LOG.debug(f"Loaded {len(code_keys)} baseline problems from {path}")
+
+        return cls(problem_keys, code_keys, record_indexes, data['records'])
+
+    def save(self, path: str):
+        """
+        Write the index to a baseline file.
+        """
+        data = {
+            'problem_keys': self._problem_keys.tobytes(),
+            'code_keys': self._code_keys.tobytes(),
+            'record_indexes': self._record_indexes.tobytes(),
+            'records': self.records,
+        }
+
+        with atomic_write(path, 'wb') as fh:
+            fh.write(_BASELINE_MAGIC)
+            marshal.dump(data, fh)
+
+        _LOG.debug(f"Wrote {len(self)} baseline problems to {path}")
+
+    def match(self, fingerprint: ProblemFingerprint) -> bool:
+        """
+        Match a problem fingerprint to an unused baseline entry, and return False if the problem is new.
+        """
+
+        # same problem on the same code
+        # entries before the cursor of a key are matched, so duplicate problems do not rescan them
+        start = self._code_key_cursors.get(fingerprint.code_key)
+        if start is None:
+            start = bisect.bisect_left(self._code_keys, fingerprint.code_key)
+        i = start
+        while i < len(self._code_keys) and self._code_keys[i] == fingerprint.code_key:
+            entry = i
+            i += 1
+            if not self._matched[entry]:
+                self._matched[entry] = 1
+                self._code_key_cursors[fingerprint.code_key] = i
+                return True
+        self._code_key_cursors[fingerprint.code_key] = i
+
+        # same problem, but the code of its line changed
+        start = self._problem_key_cursors.get(fingerprint.problem_key)
+        if start is None:
+            start = bisect.bisect_left(self._sorted_problem_keys, fingerprint.problem_key)
+        i = start
+        while i < len(self._sorted_problem_keys) and self._sorted_problem_keys[i] == fingerprint.problem_key:
+            entry = self._problem_order[i]
+            i += 1
+            if not self._matched[entry]:
+                self._matched[entry] = 1
+                self._problem_key_cursors[fingerprint.problem_key] = i
+                return True
+        self._problem_key_cursors[fingerprint.problem_key] = i
+
+        return False
+
+    def iter_unmatched(self) -> typing.Iterator[typing.Tuple[str, str, int]]:
+        """
+        Iterate over the (inspection type, file, count) of the baseline entries that were never matched.
+        """
+        counts = collections.Counter(self._record_indexes[i] for i, matched in enumerate(self._matched)
+                                     if not matched)
+        for record_index, count in sorted(counts.items(), key=lambda c: self.records[c[0]]):
+            type_name, _, file = self.records[record_index].partition('\0')
+            yield type_name, file, count
+
+
+class BaselineDiff:
+    """
+    The BaselineDiff class streams problems against a baseline index, passing through only the new problems.
+    """
+
+    def __init__(self, index: BaselineIndex, fingerprinter: ProblemFingerprinter):
+        """
+        Initialize instance of the BaselineDiff class.
+
+        :param index: baseline index
+        :param fingerprinter: problem fingerprinter
+        """
+        self.index = index
+        self.fingerprinter = fingerprinter
+        self.new_count = 0
+        self.matched_count = 0
+
+    def iter_new_problems(self, problems: typing.Iterable[results.InspectionProblem]):
+        """
+        Iterate over the problems that are not in the baseline.
+        """
+        for p in problems:
+            if self.index.match(self.fingerprinter.fingerprint(p)):
+                self.matched_count += 1
+            else:
+                self.new_count += 1
+                yield p
+
+    @property
+    def fixed_count(self) -> int:
+        return len(self.index) - self.matched_count
+
+    def iter_fixed_problems(self):
+        """
+        Iterate over the (inspection type, file, count) of the baseline problems that were not found. Only valid once
+        every problem has been passed through iter_new_problems.
+        """
+        return self.index.iter_unmatched()
+
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8', 'surrogateescape'), digest_size=8).digest(), 'little')
+
+
+def _read_lines(path: str) -> typing.Sequence[str]:
+    try:
+        with open(path, encoding='utf-8', errors='replace') as fh:
+            return fh.read().splitlines()
+    except OSError:
+        return ()
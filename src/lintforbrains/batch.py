@@ -0,0 +1,338 @@
+import concurrent.futures
+import datetime as dt
+import itertools
+import json
+import os
+import re
+import time
+import typing
+
+import click
+
+from lintforbrains import archive
+from lintforbrains import cache
+from lintforbrains import config
+from lintforbrains import inspect
+from lintforbrains import logging
+from lintforbrains import metrics
+from lintforbrains.utilities import abort
+from lintforbrains.utilities import atomic_write
+
+_LOG = logging.get_logger(__name__)
+
+_DURATIONS_CACHE_FILENAME = 'inspect-durations.json'
+
+_DEFAULT_INDEX_FILENAME = 'inspect-all.json'
+
+# an inspector process keeps about two cores busy
+_CPUS_PER_JOB = 2
+
+# memory an inspector process needs besides its heap (metaspace, code cache, native memory)
+_JOB_MEMORY_OVERHEAD = 1 << 30
+
+# memory an inspector process needs if its heap size is unknown
+_DEFAULT_JOB_MEMORY = 4 << 30
+
+_JOB_QUEUED = 'queued'
+_JOB_SUCCEEDED = 'succeeded'
+_JOB_FAILED = 'failed'
+
+_VMOPTIONS_HEAP_PATTERN = re.compile(r'^-Xmx(\d+)([kKmMgG]?)\s*$')
+
+_MEMORY_UNITS = {'': 1, 'k': 1 << 10, 'm': 1 << 20, 'g': 1 << 30}
+
+
+def run_inspect_all(root_dir: str, pycharm_version: str, pycharm_edition: str, pycharm_home_dir: str,
+                    pycharm_config_dir: str, python_bin: str, debug_level: int, cache_dir: str, jobs: int = None,
+                    incremental: bool = False, since: str = None, prune_profile: bool = None,
+                    index_path: str = None) -> int:
+    """
+    Run the inspect-all command
+    """
+
+    config_files = find_projects(root_dir)
+    if not config_files:
+        click.echo(f"No projects found in {root_dir}")
+        return 0
+
+    durations = DurationHistory(os.path.join(cache_dir, _DURATIONS_CACHE_FILENAME))
+    batch_jobs = plan_jobs(config_files, durations)
+
+    if jobs is None:
+        jobs = default_concurrency(job_memory(cache.base_vmoptions_path(pycharm_home_dir)))
+    jobs = min(jobs, len(batch_jobs))
+
+    click.echo(f"Inspecting {len(batch_jobs)} projects with {jobs} concurrent jobs")
+
+    # create inspector factory
+    def _inspector_factory(pycharm_system_dir: typing.Optional[str], command_metrics: metrics.Metrics):
+        return inspect.Inspector(pycharm_version,
+                                 pycharm_edition,
+                                 pycharm_home_dir,
+                                 pycharm_config_dir,
+                                 python_bin,
+                                 debug_level,
+                                 cache_dir=cache_dir,
+                                 pycharm_system_dir=pycharm_system_dir,
+                                 command_metrics=command_metrics,
+                                 # concurrent inspectors must not share the config dir
+                                 sandbox=jobs > 1)
+
+    inspect_projects(batch_jobs, _inspector_factory, jobs,
+                     system_dir_root=os.path.join(cache_dir, 'system'),
+                     incremental=incremental,
+                     since=since,
+                     prune_profile=prune_profile)
+
+    durations.update(batch_jobs)
+
+    index_path = index_path or os.path.join(root_dir, _DEFAULT_INDEX_FILENAME)
+    write_index(index_path, root_dir, batch_jobs)
+    click.echo(f"Index of the inspection results written to {index_path}")
+
+    failed = [j for j in batch_jobs if j.status == _JOB_FAILED]
+    if failed:
+        abort(f"{len(failed)} of {len(batch_jobs)} inspections failed")
+
+    return 0
+
+
+def find_projects(root_dir: str) -> typing.List[str]:
+    """
+    Return the project configuration files below a directory, skipping hidden directories.
+    """
+    config_files = []
+    for dir_path, dir_names, file_names in os.walk(root_dir):
+        dir_names[:] = sorted(d for d in dir_names if not d.startswith('.'))
+        if config.DEFAULT_CONFIG_FILE in file_names:
+            config_files.append(os.path.join(dir_path, config.DEFAULT_CONFIG_FILE))
+    return config_files
+
+
+def job_memory(vmoptions_path: str) -> int:
+    """
+    Return the memory an inspector process needs, from the heap size in its vmoptions.
+
+    :param vmoptions_path: vmoptions of the inspector
+    """
+    try:
+        with open(vmoptions_path, encoding='utf-8') as fh:
+            for line in fh:
+                m = _VMOPTIONS_HEAP_PATTERN.match(line.strip())
+                if m:
+                    return int(m.group(1)) * _MEMORY_UNITS[m.group(2).lower()] + _JOB_MEMORY_OVERHEAD
+    except OSError:
+        pass
+    return _DEFAULT_JOB_MEMORY
+
+
+def default_concurrency(memory_per_job: int) -> int:
+    """
+    Return the number of inspector processes the cores and the available memory of the host can run at the same time.
+
+    :param memory_per_job: memory an inspector process needs
+    """
+    concurrency = max(1, (os.cpu_count() or 1) // _CPUS_PER_JOB)
+
+    available_memory = _available_memory()
+    if available_memory is not None:
+        concurrency = min(concurrency, max(1, available_memory // memory_per_job))
+
+    return concurrency
+
+
+def _available_memory() -> typing.Optional[int]:
+    """
+    Return the memory available to new processes without swapping, or None if it is unknown
+    """
+    try:
+        with open('/proc/meminfo') as fh:
+            for line in fh:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+class BatchJob:
+    """
+    The BatchJob class tracks the inspection of one project of a batch.
+    """
+
+    def __init__(self, project_dir: str, config_file: str, expected_duration: typing.Optional[float]):
+        """
+        Initialize instance of the BatchJob class.
+
+        :param project_dir: project directory
+        :param config_file: project configuration file
+        :param expected_duration: seconds the previous inspection of the project took (None if unknown)
+        """
+        self.project_dir = project_dir
+        self.config_file = config_file
+        self.expected_duration = expected_duration
+        self.status = _JOB_QUEUED
+        self.results_dir = None
+        self.error = None
+        self.started = None
+        self.finished = None
+
+    @property
+    def duration(self) -> typing.Optional[float]:
+        if self.started is None or self.finished is None:
+            return None
+        return self.finished - self.started
+
+    def to_dict(self) -> typing.Dict[str, typing.Any]:
+        return {
+            'project_dir': self.project_dir,
+            'config_file': self.config_file,
+            'status': self.status,
+            'results_dir': self.results_dir,
+            'error': self.error,
+            'started': self.started,
+            'finished': self.finished,
+            'duration': self.duration,
+        }
+
+
+class DurationHistory:
+    """
+    The DurationHistory class records how long the last inspection of each project took, in the cache directory.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize instance of the DurationHistory class.
+
+        :param path: durations file path
+        """
+        self.path = path
+
+    def load(self) -> typing.Dict[str, float]:
+        """
+        Return the recorded durations by real project path.
+        """
+        try:
+            with open(self.path) as fh:
+                durations = json.load(fh)
+        except (OSError, ValueError) as ex:
+            _LOG.debug(f"No inspection durations in {self.path}: {ex}")
+            return dict()
+        return durations if isinstance(durations, dict) else dict()
+
+    def update(self, batch_jobs: typing.Iterable[BatchJob]):
+        """
+        Record the durations of the succeeded jobs.
+        """
+        durations = self.load()
+        for job in batch_jobs:
+            if job.status == _JOB_SUCCEEDED:
+                durations[os.path.realpath(job.project_dir)] = job.duration
+
+        try:
+            _write_json(self.path, durations)
+        except OSError as ex:
+            _LOG.warning(f"Unable to write inspection durations {self.path}: {ex}")
+
+
+def plan_jobs(config_files: typing.Iterable[str], durations: DurationHistory) -> typing.List[BatchJob]:
+    """
+    Return the jobs of the projects in the order they should start: projects never inspected first, then the
+    longest-running projects, so that the longest inspection does not start last and the batch finishes sooner.
+
+    :param config_files: project configuration files
+    :param durations: durations of previous inspections
+    """
+    previous_durations = durations.load()
+
+    batch_jobs = []
+    for config_file in config_files:
+        project_dir = os.path.dirname(os.path.abspath(config_file))
+        batch_jobs.append(BatchJob(project_dir, config_file, previous_durations.get(os.path.realpath(project_dir))))
+
+    batch_jobs.sort(key=lambda j: (j.expected_duration is not None, -(j.expected_duration or 0)))
+    return batch_jobs
+
+
+def inspect_projects(batch_jobs: typing.Sequence[BatchJob],
+                     inspector_factory: typing.Callable[[typing.Optional[str], metrics.Metrics], inspect.Inspector],
+                     concurrency: int, system_dir_root: str = None, incremental: bool = False, since: str = None,
+                     prune_profile: bool = None):
+    """
+    Run the inspections of a batch, starting the jobs in order with at most the given number running at a time.
+
+    :param batch_jobs: jobs in the order they should start
+    :param inspector_factory: returns an inspector for a system directory (None for the configured one) that records
+                              its phases in the given metrics
+    :param concurrency: number of concurrent inspections
+    :param system_dir_root: directory of the per-project system directories (None to share one)
+    :param incremental: only inspect files changed since the previous results
+    :param since: git ref to find changed files from
+    :param prune_profile: disable the inspections whose problems are all suppressed (None to use the configuration)
+    """
+
+    def _run_job(job: BatchJob):
+        job.started = time.time()
+        _LOG.info(f"Inspecting {job.project_dir}")
+
+        try:
+            project_config = config.load_config(job.config_file)
+
+            pycharm_system_dir = None
+            if system_dir_root is not None and not project_config.inspect.system_dir:
+                pycharm_system_dir = cache.project_system_dir(system_dir_root, job.project_dir)
+
+            job_metrics = metrics.Metrics('inspect')
+            inspector = inspector_factory(pycharm_system_dir, job_metrics)
+            job.results_dir = inspector.run(job.project_dir,
+                                            project_config,
+                                            incremental=incremental,
+                                            since=since,
+                                            prune_profile=prune_profile)
+            metrics.emit_metrics(job_metrics, job.results_dir if not archive.is_archive(job.results_dir) else None)
+        except Exception as ex:
+            _LOG.exception(f"Inspection of {job.project_dir} failed")
+            job.finished = time.time()
+            job.status = _JOB_FAILED
+            job.error = str(ex) or type(ex).__name__
+            click.echo(f"Failed to inspect {job.project_dir}: {job.error}")
+        else:
+            job.finished = time.time()
+            job.status = _JOB_SUCCEEDED
+            click.echo(f"Inspected {job.project_dir} in {job.duration:.1f}s: {job.results_dir}")
+
+    # jobs are submitted as running ones finish, so an interrupt leaves no queued jobs to start and only waits for the
+    # running inspections
+    queued_jobs = iter(batch_jobs)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='inspection') as executor:
+        running = {executor.submit(_run_job, j) for j in itertools.islice(queued_jobs, concurrency)}
+        while running:
+            done, running = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                future.result()
+            running.update(executor.submit(_run_job, j) for j in itertools.islice(queued_jobs, len(done)))
+
+
+def write_index(index_path: str, root_dir: str, batch_jobs: typing.Iterable[BatchJob]):
+    """
+    Write the index of the results directories of a batch.
+    """
+    _write_json(index_path, {
+        'root_dir': os.path.abspath(root_dir),
+        'created': dt.datetime.now().isoformat(timespec='seconds'),
+        'projects': [j.to_dict() for j in sorted(batch_jobs, key=lambda j: j.project_dir)],
+    })
+
+
+def _write_json(path: str, value: typing.Any):
+    """
+    Write a JSON file, replacing it atomically
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with atomic_write(path) as fh:
+        json.dump(value, fh, indent=2)
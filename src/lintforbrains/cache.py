@@ -0,0 +1,475 @@
+import contextlib
+import datetime as dt
+import fcntl
+import glob
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import typing
+
+import click
+
+from lintforbrains import logging
+
+_LOG = logging.get_logger(__name__)
+
+_SYSTEM_DIR_LOCK_FILENAME = '.lintforbrains.lock'
+
+_SYSTEM_DIR_CONFIG_DIRNAME = '.lintforbrains'
+
+_SYSTEM_DIR_LOG_DIRNAME = 'log'
+
+# entries of a system directory that belong to the run using it (its lock, the generated IDE config pointing at it and
+# the IDE logs), which are never copied between a sandbox and its template
+_SYSTEM_DIR_RUN_ENTRIES = frozenset([_SYSTEM_DIR_LOCK_FILENAME, _SYSTEM_DIR_CONFIG_DIRNAME, _SYSTEM_DIR_LOG_DIRNAME])
+
+# pruned system directories are renamed to this prefix before they are removed
+_SYSTEM_DIR_TOMBSTONE_PREFIX = '.pruned-'
+
+_SANDBOXES_DIRNAME = 'sandboxes'
+
+_SANDBOX_LOCK_FILENAME = '.lintforbrains.lock'
+
+
+def run_cache_stats(cache_dir: str) -> int:
+    """
+    Run the cache stats command
+    """
+
+    click.echo(f"Cache directory: {cache_dir}")
+
+    for system_dir in find_system_dirs(cache_dir):
+        stats = system_dir.stats()
+        last_used = dt.datetime.fromtimestamp(stats.last_used).isoformat(sep=' ', timespec='seconds') \
+            if stats.last_used else 'never'
+        click.echo(f"{stats.path}: {_format_size(stats.size)} in {stats.files} files, last used {last_used}")
+
+    return 0
+
+
+def run_cache_prune(cache_dir: str, older_than_days: typing.Optional[float], prune_all: bool) -> int:
+    """
+    Run the cache prune command
+    """
+
+    if not prune_all and older_than_days is None:
+        click.echo("Nothing to prune, specify --older-than or --all")
+        return 0
+
+    pruned_size = 0
+    for system_dir in find_system_dirs(cache_dir):
+        stats = system_dir.stats()
+        if not prune_all and stats.last_used and time.time() - stats.last_used < older_than_days * 86400:
+            continue
+        if system_dir.prune():
+            click.echo(f"Pruned {stats.path} ({_format_size(stats.size)})")
+            pruned_size += stats.size
+        else:
+            click.echo(f"Skipped {stats.path}, it is in use")
+
+    # pruned system directories whose removal was interrupted
+    for tombstone_path in glob.glob(os.path.join(cache_dir, 'system', f"{_SYSTEM_DIR_TOMBSTONE_PREFIX}*")):
+        shutil.rmtree(tombstone_path, ignore_errors=True)
+
+    # sandboxes are removed by their inspection, unless it was killed
+    for sandbox in find_sandboxes(cache_dir):
+        if sandbox.remove(blocking=False):
+            click.echo(f"Pruned abandoned sandbox {sandbox.path}")
+
+    python_sdk_cache_path = os.path.join(cache_dir, 'python-sdk.json')
+    if prune_all and os.path.exists(python_sdk_cache_path):
+        os.remove(python_sdk_cache_path)
+        click.echo(f"Pruned {python_sdk_cache_path}")
+
+    click.echo(f"Pruned {_format_size(pruned_size)}")
+
+    return 0
+
+
+def find_system_dirs(cache_dir: str) -> typing.List['SystemDirectory']:
+    """
+    Return the IDE system directories managed in a cache directory.
+    """
+    system_root = os.path.join(cache_dir, 'system')
+    if not os.path.isdir(system_root):
+        return []
+    return [SystemDirectory(os.path.join(system_root, d)) for d in sorted(os.listdir(system_root))
+            if os.path.isdir(os.path.join(system_root, d)) and not d.startswith(_SYSTEM_DIR_TOMBSTONE_PREFIX)]
+
+
+def project_system_dir(system_root: str, project_dir: str) -> str:
+    """
+    Return the path of the system directory of a project, in a directory of per-project system directories.
+    """
+    project_path = os.path.realpath(project_dir)
+    project_hash = hashlib.sha1(project_path.encode('utf-8')).hexdigest()[:12]
+
+    return os.path.join(system_root, f"{os.path.basename(project_path)}-{project_hash}")
+
+
+def find_sandboxes(cache_dir: str) -> typing.List['Sandbox']:
+    """
+    Return the inspection sandboxes in a cache directory.
+    """
+    sandboxes_dir = os.path.join(cache_dir, _SANDBOXES_DIRNAME)
+    if not os.path.isdir(sandboxes_dir):
+        return []
+    return [Sandbox(os.path.join(sandboxes_dir, d)) for d in sorted(os.listdir(sandboxes_dir))
+            if os.path.isdir(os.path.join(sandboxes_dir, d))]
+
+
+class SystemDirectoryStats(typing.NamedTuple):
+    path: str
+    size: int
+    files: int
+    last_used: typing.Optional[float]
+
+
+class SystemDirectoryError(Exception):
+    pass
+
+
+class SystemDirectory:
+    """
+    The SystemDirectory class manages a persistent IDE system directory.
+
+    The system directory holds the IDE caches and indexes. Keeping it between inspections means a warm inspection only
+    indexes what changed, instead of the whole SDK and project. The IDE is pointed at it by a generated idea.properties
+    and vmoptions file, and a lock keeps concurrent inspections from using it at the same time.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize instance of the SystemDirectory class.
+
+        :param path: system directory path
+        """
+        self.path = os.path.normpath(path)
+
+    @property
+    def lock_path(self):
+        return os.path.join(self.path, _SYSTEM_DIR_LOCK_FILENAME)
+
+    @property
+    def properties_path(self):
+        return os.path.join(self.path, _SYSTEM_DIR_CONFIG_DIRNAME, 'idea.properties')
+
+    @property
+    def vmoptions_path(self):
+        return os.path.join(self.path, _SYSTEM_DIR_CONFIG_DIRNAME, 'pycharm64.vmoptions')
+
+    @contextlib.contextmanager
+    def lock(self, blocking: bool = True):
+        """
+        Lock the system directory for the duration of the context.
+
+        :param blocking: wait for the lock, otherwise raise SystemDirectoryError when the lock is held
+        """
+        while True:
+            os.makedirs(self.path, exist_ok=True)
+
+            fh = open(self.lock_path, 'a')
+            try:
+                try:
+                    fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    if not blocking:
+                        raise SystemDirectoryError(f"System directory is in use: {self.path}")
+                    _LOG.info(f"Waiting for system directory lock: {self.path}")
+                    fcntl.flock(fh, fcntl.LOCK_EX)
+            except BaseException:
+                fh.close()
+                raise
+
+            # the directory was pruned while waiting for its lock, so lock the directory that replaces it
+            if _is_same_file(fh, self.lock_path):
+                break
+            fh.close()
+
+        with fh:
+            try:
+                # the lock file modification time records when the directory was last used
+                os.utime(self.lock_path)
+                yield self
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def configure(self, config_dir: str, base_vmoptions_path: str = None) -> typing.Dict[str, str]:
+        """
+        Write the idea.properties and vmoptions that point the IDE at the system directory and return the environment
+        variables that select them.
+
+        :param config_dir: IDE config directory
+        :param base_vmoptions_path: vmoptions the generated vmoptions extend
+        """
+        os.makedirs(os.path.dirname(self.properties_path), exist_ok=True)
+
+        log_dir = os.path.join(self.path, _SYSTEM_DIR_LOG_DIRNAME)
+
+        write_idea_properties(self.properties_path, {
+            'idea.config.path': config_dir,
+            'idea.system.path': self.path,
+            'idea.log.path': log_dir,
+        })
+
+        vmoptions = []
+        if base_vmoptions_path and os.path.isfile(base_vmoptions_path):
+            with open(base_vmoptions_path, encoding='utf-8') as fh:
+                vmoptions.extend(line.rstrip('\n') for line in fh
+                                 if not line.startswith(('-Didea.system.path=', '-Didea.log.path=')))
+        vmoptions.extend([f"-Didea.system.path={self.path}",
+                          f"-Didea.log.path={log_dir}"])
+        _write_if_changed(self.vmoptions_path, ''.join(f"{line}\n" for line in vmoptions))
+
+        return {
+            'PYCHARM_PROPERTIES': self.properties_path,
+            'PYCHARM_VM_OPTIONS': self.vmoptions_path,
+        }
+
+    def stats(self) -> SystemDirectoryStats:
+        """
+        Return the size, file count and last use time of the system directory.
+        """
+        size = 0
+        files = 0
+        for dir_path, _, file_names in os.walk(self.path):
+            for file_name in file_names:
+                try:
+                    size += os.lstat(os.path.join(dir_path, file_name)).st_size
+                except OSError:
+                    continue
+                files += 1
+
+        try:
+            last_used = os.stat(self.lock_path).st_mtime
+        except OSError:
+            last_used = None
+
+        return SystemDirectoryStats(self.path, size, files, last_used)
+
+    def prune(self) -> bool:
+        """
+        Remove the system directory unless it is in use.
+
+        :return: True if the system directory was removed
+        """
+        try:
+            with self.lock(blocking=False):
+                # moved aside while locked, so an inspection waiting for the lock finds its lock file gone and locks a
+                # new directory instead of running in one being removed
+                tombstone_path = tempfile.mkdtemp(prefix=_SYSTEM_DIR_TOMBSTONE_PREFIX, dir=os.path.dirname(self.path))
+                os.rename(self.path, tombstone_path)
+        except SystemDirectoryError:
+            return False
+
+        shutil.rmtree(tombstone_path, ignore_errors=True)
+        return True
+
+
+class Sandbox:
+    """
+    The Sandbox class is a private IDE config and system directory for one inspection.
+
+    Concurrent inspections on one host each run in their own sandbox, so none of them writes the shared config
+    directory or a system directory used by another. A sandbox is seeded from the shared config directory and from a
+    warm template system directory, copied with reflinks where the file system supports them so that seeding is cheap,
+    and it is removed when the inspection ends. A sandbox is locked while in use, so abandoned sandboxes of killed
+    inspections can be told apart and pruned.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize instance of the Sandbox class.
+
+        :param path: sandbox path
+        """
+        self.path = os.path.normpath(path)
+
+    @property
+    def config_dir(self) -> str:
+        return os.path.join(self.path, 'config')
+
+    @property
+    def system_dir(self) -> SystemDirectory:
+        return SystemDirectory(os.path.join(self.path, 'system'))
+
+    @property
+    def lock_path(self) -> str:
+        return os.path.join(self.path, _SANDBOX_LOCK_FILENAME)
+
+    @classmethod
+    @contextlib.contextmanager
+    def create(cls, sandboxes_dir: typing.Optional[str], config_template: str,
+               system_template: SystemDirectory = None) -> typing.Iterator['Sandbox']:
+        """
+        Create a sandbox seeded from the templates for the duration of the context.
+
+        :param sandboxes_dir: directory the sandbox is created in (None for the temporary directory)
+        :param config_template: IDE config directory copied into the sandbox
+        :param system_template: system directory copied into the sandbox, with its shard system directories
+        """
+        if sandboxes_dir is not None:
+            os.makedirs(sandboxes_dir, exist_ok=True)
+        sandbox = cls(tempfile.mkdtemp(prefix='sandbox-', dir=sandboxes_dir))
+
+        with open(sandbox.lock_path, 'a') as lock_fh:
+            fcntl.flock(lock_fh, fcntl.LOCK_EX)
+            try:
+                sandbox._seed(config_template, system_template)
+                _LOG.debug(f"Created sandbox {sandbox.path}")
+                yield sandbox
+            finally:
+                shutil.rmtree(sandbox.path, ignore_errors=True)
+                _LOG.debug(f"Removed sandbox {sandbox.path}")
+
+    def _seed(self, config_template: str, system_template: typing.Optional[SystemDirectory]):
+        if os.path.isdir(config_template):
+            _copy_tree(config_template, self.config_dir)
+        else:
+            os.makedirs(self.config_dir)
+
+        if system_template is None:
+            return
+
+        # sharded inspections use a system directory per shard next to the system directory
+        for template_path in [system_template.path] + sorted(glob.glob(f"{glob.escape(system_template.path)}.shard-*")):
+            template = SystemDirectory(template_path)
+            if not os.path.isdir(template.path):
+                continue
+            with template.lock():
+                _copy_tree(template.path, self.system_dir.path + template_path[len(system_template.path):],
+                           exclude=_SYSTEM_DIR_RUN_ENTRIES)
+
+    def promote(self, system_template: SystemDirectory) -> bool:
+        """
+        Copy the system directories of the sandbox back into the template, unless the template is in use, so that the
+        next inspection starts from the warmest caches. The lock, generated IDE config and logs of the sandbox are not
+        copied, and those of the template are kept.
+
+        :return: True if the template was updated
+        """
+        promoted = False
+
+        for sandbox_path in [self.system_dir.path] + sorted(glob.glob(f"{glob.escape(self.system_dir.path)}.shard-*")):
+            template = SystemDirectory(system_template.path + sandbox_path[len(self.system_dir.path):])
+            try:
+                with template.lock(blocking=False):
+                    for entry in os.listdir(template.path):
+                        if entry not in _SYSTEM_DIR_RUN_ENTRIES:
+                            _remove_path(os.path.join(template.path, entry))
+                    _copy_tree(sandbox_path, template.path, exclude=_SYSTEM_DIR_RUN_ENTRIES)
+            except SystemDirectoryError:
+                _LOG.debug(f"Not updating {template.path}, it is in use")
+                continue
+            promoted = True
+
+        return promoted
+
+    def remove(self, blocking: bool = True) -> bool:
+        """
+        Remove the sandbox, waiting until it is no longer in use unless not blocking.
+
+        :return: True if the sandbox was removed
+        """
+        try:
+            lock_fh = open(self.lock_path, 'a')
+        except FileNotFoundError:
+            return False
+
+        with lock_fh:
+            try:
+                fcntl.flock(lock_fh, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                return False
+            shutil.rmtree(self.path, ignore_errors=True)
+
+        return True
+
+
+def _copy_tree(source: str, target: str, exclude: typing.Collection[str] = ()):
+    """
+    Copy a directory tree into a (possibly existing) directory, sharing file data with reflinks where supported
+
+    :param exclude: names of the entries of the source directory that are not copied
+    """
+    if exclude:
+        os.makedirs(target, exist_ok=True)
+        source_paths = [os.path.join(source, e) for e in sorted(os.listdir(source)) if e not in exclude]
+        if not source_paths:
+            return
+    else:
+        source_paths = [os.path.join(source, '.')]
+
+    if sys.platform.startswith('linux') and shutil.which('cp'):
+        try:
+            subprocess.run(['cp', '-a', '--reflink=auto'] + source_paths + [target],
+                           stdout=subprocess.DEVNULL,
+                           stderr=subprocess.PIPE,
+                           check=True)
+            return
+        except subprocess.CalledProcessError as ex:
+            _LOG.debug(f"Copying {source} without reflinks: {ex.stderr.decode('utf-8', 'replace').strip()}")
+
+    shutil.copytree(source, target, symlinks=True, dirs_exist_ok=True,
+                    ignore=lambda dir_path, names: [n for n in names if n in exclude and dir_path == source])
+
+
+def _is_same_file(fh: typing.IO, path: str) -> bool:
+    """
+    Return True if an open file is the file at a path
+    """
+    try:
+        return os.path.samestat(os.fstat(fh.fileno()), os.stat(path))
+    except FileNotFoundError:
+        return False
+
+
+def _remove_path(path: str):
+    """
+    Remove a file or a directory tree
+    """
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+
+def base_vmoptions_path(pycharm_home_dir: str) -> str:
+    """
+    Return the path of the vmoptions of a pycharm installation.
+    """
+    return os.path.join(pycharm_home_dir, 'bin', 'pycharm64.vmoptions')
+
+
+def write_idea_properties(properties_path: str, properties: typing.Mapping[str, str]):
+    """
+    Write an IDE properties file, unless it already has the given properties.
+    """
+    _write_if_changed(properties_path, ''.join(f"{key}={value}\n" for key, value in properties.items()))
+
+
+def _write_if_changed(path: str, content: str):
+    """
+    Write a file unless it already has the given content
+    """
+    try:
+        with open(path, encoding='utf-8') as fh:
+            if fh.read() == content:
+                return
+    except FileNotFoundError:
+        pass
+
+    with open(path, 'w', encoding='utf-8') as fh:
+        fh.write(content)
+
+
+def _format_size(size: int) -> str:
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size < 1024:
+            return f"{size:.1f} {unit}" if unit != 'B' else f"{size} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
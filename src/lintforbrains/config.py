@@ -13,8 +13,22 @@ _DEFAULT_INSPECT_SOURCE_DIR = None
 
 _DEFAULT_INSPECT_PROFILE = None
 
+_DEFAULT_INSPECT_SYSTEM_DIR = None
+
+_DEFAULT_INSPECT_PRUNE_PROFILE = False
+
+_DEFAULT_INSPECT_KEEP_RESULTS = None
+
+_DEFAULT_INSPECT_MAX_RESULTS_AGE_DAYS = None
+
+_DEFAULT_INSPECT_MAX_RESULTS_BYTES = None
+
+_DEFAULT_INSPECT_ARCHIVE = None
+
 _DEFAULT_INSPECT_OUTPUT = 'plain'
 
+_DEFAULT_REPORT_MAX_BUFFERED_PROBLEMS = 1000000
+
 _LOG = logging.get_logger(__name__)
 
 
@@ -34,10 +48,22 @@ class Configuration(schematics.models.Model):
 
         profile = schematics.types.StringType(default=_DEFAULT_INSPECT_PROFILE)
 
+        system_dir = schematics.types.StringType(default=_DEFAULT_INSPECT_SYSTEM_DIR)
+
         include_files = schematics.types.ListType(schematics.types.StringType)
 
         exclude_files = schematics.types.ListType(schematics.types.StringType)
 
+        prune_profile = schematics.types.BooleanType(default=_DEFAULT_INSPECT_PRUNE_PROFILE)
+
+        keep_results = schematics.types.IntType(default=_DEFAULT_INSPECT_KEEP_RESULTS, min_value=1)
+
+        max_results_age_days = schematics.types.FloatType(default=_DEFAULT_INSPECT_MAX_RESULTS_AGE_DAYS, min_value=0)
+
+        max_results_bytes = schematics.types.IntType(default=_DEFAULT_INSPECT_MAX_RESULTS_BYTES, min_value=0)
+
+        archive = schematics.types.StringType(default=_DEFAULT_INSPECT_ARCHIVE, choices=['gzip', 'zstd'])
+
     class ReportSection(schematics.models.Model):
         """
         ReportSection defines report command configuration
@@ -51,6 +77,10 @@ class Configuration(schematics.models.Model):
 
         suppress_problems = schematics.types.ListType(schematics.types.StringType)
 
+        max_buffered_problems = schematics.types.IntType(default=_DEFAULT_REPORT_MAX_BUFFERED_PROBLEMS, min_value=1)
+
+        fail_on = schematics.types.ListType(schematics.types.StringType)
+
     inspect: InspectSection = schematics.types.ModelType(InspectSection)
 
     report: ReportSection = schematics.types.ModelType(ReportSection)
@@ -0,0 +1,124 @@
+import typing
+
+from lintforbrains import logging
+from lintforbrains import results
+
+_LOG = logging.get_logger(__name__)
+
+
+class GateError(Exception):
+    pass
+
+
+class SeverityThreshold(typing.NamedTuple):
+    severity: results.InspectionProblemSeverity
+    """
+    Problem severity
+    """
+
+    max_count: int
+    """
+    Number of problems of the severity allowed before the threshold is crossed
+    """
+
+    def __str__(self):
+        return f"{self.severity.value}:{self.max_count}"
+
+
+def parse_threshold(value: str) -> SeverityThreshold:
+    """
+    Parse a threshold given as SEVERITY[:N], which is crossed by more than N problems of the severity (N defaults to
+    0, so that any problem of the severity crosses it).
+
+    :param value: threshold, e.g. ERROR or WARNING:50
+    """
+    severity_name, _, max_count = value.rpartition(':') if ':' in value else (value, None, '0')
+    try:
+        severity = results.InspectionProblemSeverity(severity_name.strip().upper())
+    except ValueError:
+        severities = ', '.join(s.value for s in results.InspectionProblemSeverity)
+        raise GateError(f"Invalid severity in threshold {value!r} (expected one of {severities})") from None
+
+    if not max_count.strip().isdigit():
+        raise GateError(f"Invalid problem count in threshold {value!r}")
+
+    return SeverityThreshold(severity, int(max_count))
+
+
+class ProblemGate:
+    """
+    The ProblemGate class counts problems by severity and checks the counts against severity thresholds.
+    """
+
+    def __init__(self, thresholds: typing.Iterable[SeverityThreshold]):
+        """
+        Initialize instance of the ProblemGate class.
+
+        :param thresholds: severity thresholds
+        """
+        self.thresholds = list(thresholds)
+        self.counts = {s: 0 for s in results.InspectionProblemSeverity}
+        self.stopped_early = False
+
+        # the lowest allowed count of each gated severity
+        self._max_counts = dict()
+        for t in self.thresholds:
+            self._max_counts[t.severity] = min(t.max_count, self._max_counts.get(t.severity, t.max_count))
+
+    @property
+    def severities(self) -> typing.Set[results.InspectionProblemSeverity]:
+        """
+        Severities with a threshold
+        """
+        return set(self._max_counts)
+
+    @property
+    def crossed_thresholds(self) -> typing.List[SeverityThreshold]:
+        """
+        Thresholds crossed by the counted problems
+        """
+        return [t for t in self.thresholds if self.counts[t.severity] > t.max_count]
+
+    @property
+    def failed(self) -> bool:
+        return any(self.counts[s] > n for s, n in self._max_counts.items())
+
+    def count(self, problem: results.InspectionProblem) -> bool:
+        """
+        Count a problem, and return True if it crossed a threshold.
+        """
+        count = self.counts[problem.severity] = self.counts[problem.severity] + 1
+        max_count = self._max_counts.get(problem.severity)
+        return max_count is not None and count == max_count + 1
+
+    def iter_counted(self, problems: typing.Iterable[results.InspectionProblem]):
+        """
+        Iterate over problems, counting each one.
+        """
+        for p in problems:
+            self.count(p)
+            yield p
+
+    def check(self, problems: typing.Iterable[results.InspectionProblem]) -> bool:
+        """
+        Count problems until a threshold is crossed, and return True if every threshold held. Once a threshold is
+        crossed the remaining problems are not consumed, so the counts are only lower bounds.
+        """
+        for p in problems:
+            if self.count(p):
+                _LOG.debug(f"Threshold crossed by {p}")
+                self.stopped_early = True
+                return False
+        return True
+
+    def format_summary(self) -> str:
+        """
+        Return a summary of the counts of the gated severities and the crossed thresholds.
+        """
+        at_least = 'at least ' if self.stopped_early else ''
+        counts = ', '.join(f"{at_least}{self.counts[s]} {s.value}" for s in results.InspectionProblemSeverity
+                           if s in self._max_counts)
+        crossed = self.crossed_thresholds
+        if crossed:
+            return f"Failed: {counts} problems (thresholds crossed: {', '.join(str(t) for t in crossed)})"
+        return f"Passed: {counts} problems"
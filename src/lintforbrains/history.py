@@ -0,0 +1,283 @@
+import contextlib
+import datetime as dt
+import fcntl
+import json
+import os
+import re
+import shutil
+import time
+import typing
+
+from lintforbrains import archive
+from lintforbrains import config
+from lintforbrains import logging
+from lintforbrains.utilities import atomic_write
+
+_LOG = logging.get_logger(__name__)
+
+_INDEX_FILENAME = 'index.json'
+
+_INDEX_VERSION = 1
+
+_INDEX_LOCK_FILENAME = '.index.lock'
+
+_LATEST_LINK_NAME = 'latest'
+
+RESULTS_DIR_PREFIX = 'inspection-'
+
+RESULTS_DIR_TIMESTAMP_FORMAT = "%Y%m%dT%H%M%S"
+
+# written into results directories by reports after they are published, so not counted in their size
+RESULTS_CACHE_FILENAME = '.lintforbrains-cache'
+
+_RESULTS_TIMESTAMP_PATTERN = re.compile(re.escape(RESULTS_DIR_PREFIX) + r'(\d{8}T\d{6})')
+
+
+def is_results_name(name: str) -> bool:
+    """
+    Return True if a name in the output directory is one the inspector gives to results directories and archives.
+    """
+    return name.startswith(RESULTS_DIR_PREFIX) and os.sep not in name
+
+
+def results_timestamp(path: str) -> float:
+    """
+    Return the time the inspection of a results directory or archive started, from its name if the inspector named it
+    """
+    m = _RESULTS_TIMESTAMP_PATTERN.match(os.path.basename(os.path.realpath(path)))
+    if m:
+        return dt.datetime.strptime(m.group(1), RESULTS_DIR_TIMESTAMP_FORMAT).timestamp()
+    return os.stat(path).st_mtime
+
+
+class ResultsEntry(typing.NamedTuple):
+    name: str
+    """
+    Results directory name, in the output directory
+    """
+
+    finished: float
+    """
+    Time the inspection finished
+    """
+
+    size: int
+    """
+    Total size of the files of the results directory, without the results cache
+    """
+
+
+class RetentionPolicy(typing.NamedTuple):
+    keep: typing.Optional[int] = None
+    """
+    Number of results directories kept (None to keep all)
+    """
+
+    max_age_days: typing.Optional[float] = None
+    """
+    Days results directories are kept (None to keep them forever)
+    """
+
+    max_bytes: typing.Optional[int] = None
+    """
+    Total size of the results directories kept (None for no limit)
+    """
+
+    @classmethod
+    def from_config(cls, configuration: config.Configuration) -> 'RetentionPolicy':
+        return cls(keep=configuration.inspect.keep_results,
+                   max_age_days=configuration.inspect.max_results_age_days,
+                   max_bytes=configuration.inspect.max_results_bytes)
+
+    @property
+    def is_enabled(self) -> bool:
+        return self.keep is not None or self.max_age_days is not None or self.max_bytes is not None
+
+
+class ResultsHistory:
+    """
+    The ResultsHistory class indexes the results directories of an output directory.
+
+    When an inspection finishes, its results directory is added to index.json and the latest symlink is atomically
+    pointed at it, so the latest results are found without listing the output directory. The index records the size
+    of each results directory, so a retention policy is applied without walking them. An output directory written
+    before the index existed is indexed on first use.
+    """
+
+    def __init__(self, output_dir: str):
+        """
+        Initialize instance of the ResultsHistory class.
+
+        :param output_dir: inspection output directory
+        """
+        self.output_dir = os.path.normpath(output_dir)
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.output_dir, _INDEX_FILENAME)
+
+    @property
+    def latest_path(self) -> str:
+        return os.path.join(self.output_dir, _LATEST_LINK_NAME)
+
+    @property
+    def lock_path(self) -> str:
+        return os.path.join(self.output_dir, _INDEX_LOCK_FILENAME)
+
+    def latest(self) -> typing.Optional[str]:
+        """
+        Return the latest results directory (or archive), or None if there is no latest symlink or it is dangling.
+        """
+        try:
+            target = os.readlink(self.latest_path)
+        except OSError:
+            return None
+
+        results_dir = os.path.normpath(os.path.join(self.output_dir, target))
+        return results_dir if os.path.exists(results_dir) else None
+
+    def entries(self) -> typing.List[ResultsEntry]:
+        """
+        Return the indexed results directories, oldest first.
+        """
+        entries = self._load_index()
+        return entries if entries is not None else self._scan()
+
+    def publish(self, results_dir: str):
+        """
+        Add a finished results directory (or archive) to the index and make it the latest results.
+
+        :param results_dir: results directory or archive, in the output directory
+        """
+        name = os.path.basename(os.path.normpath(results_dir))
+
+        with self._lock():
+            entries = [e for e in self.entries()
+                       if e.name != name and os.path.exists(os.path.join(self.output_dir, e.name))]
+            entries.append(ResultsEntry(name, time.time(), _path_size(os.path.join(self.output_dir, name))))
+            self._save_index(entries)
+
+            # replace the symlink atomically, so readers never find it missing
+            temp_link_path = os.path.join(self.output_dir, f".{_LATEST_LINK_NAME}-{os.getpid()}")
+            if os.path.lexists(temp_link_path):
+                os.remove(temp_link_path)
+            os.symlink(name, temp_link_path)
+            os.replace(temp_link_path, self.latest_path)
+
+        _LOG.debug(f"Published {name} as the latest results in {self.output_dir}")
+
+    def prune(self, policy: RetentionPolicy, now: float = None) -> typing.List[str]:
+        """
+        Remove the results directories the retention policy does not keep, and return their paths. The latest results
+        directory is always kept, and anything the inspector did not create is never removed, since the output directory
+        may be shared with other files.
+
+        :param policy: retention policy
+        :param now: time the age of results directories is measured at (None for the current time)
+        """
+        if not policy.is_enabled:
+            return []
+
+        now = time.time() if now is None else now
+        latest = self.latest()
+
+        with self._lock():
+            kept = []
+            pruned = []
+            total_size = 0
+            for entry in reversed(self.entries()):
+                if not is_results_name(entry.name):
+                    continue
+                path = os.path.join(self.output_dir, entry.name)
+                if path != latest and ((policy.keep is not None and len(kept) >= policy.keep) or
+                                       (policy.max_age_days is not None and
+                                        now - entry.finished > policy.max_age_days * 86400) or
+                                       (policy.max_bytes is not None and total_size + entry.size > policy.max_bytes)):
+                    pruned.append(path)
+                    continue
+                kept.append(entry)
+                total_size += entry.size
+
+            if pruned:
+                self._save_index(list(reversed(kept)))
+
+        # removed after the index is updated, so the index never lists a partially removed directory
+        for path in pruned:
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            elif os.path.exists(path):
+                os.remove(path)
+            _LOG.info(f"Pruned results {path}")
+
+        return pruned
+
+    @contextlib.contextmanager
+    def _lock(self):
+        """
+        Lock the index for the duration of the context
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        with open(self.lock_path, 'a') as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _load_index(self) -> typing.Optional[typing.List[ResultsEntry]]:
+        """
+        Return the entries of the index, or None if there is no valid index
+        """
+        try:
+            with open(self.index_path, encoding='utf-8') as fh:
+                index = json.load(fh)
+            if index.get('version') != _INDEX_VERSION:
+                return None
+            return [ResultsEntry(e['name'], e['finished'], e['size']) for e in index['results']]
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as ex:
+            _LOG.warning(f"Ignoring invalid results index {self.index_path}: {ex}")
+            return None
+
+    def _save_index(self, entries: typing.Iterable[ResultsEntry]):
+        """
+        Write the index, replacing it atomically
+        """
+        with atomic_write(self.index_path) as fh:
+            json.dump({'version': _INDEX_VERSION, 'results': [e._asdict() for e in entries]}, fh, indent=2)
+
+    def _scan(self) -> typing.List[ResultsEntry]:
+        """
+        Return entries for the results directories and archives the inspector created in the output directory, oldest
+        first
+        """
+        entries = []
+        try:
+            dir_entries = list(os.scandir(self.output_dir))
+        except FileNotFoundError:
+            return []
+        for e in dir_entries:
+            if not is_results_name(e.name) or not (e.is_dir(follow_symlinks=False) or archive.is_archive(e.path)):
+                continue
+            entries.append(ResultsEntry(e.name, e.stat(follow_symlinks=False).st_mtime, _path_size(e.path)))
+        return sorted(entries, key=lambda e: (e.finished, e.name))
+
+
+def _path_size(path: str) -> int:
+    """
+    Return the size of a file, or the total size of the files in a results directory tree
+    """
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+
+    size = 0
+    for dir_path, _, file_names in os.walk(path):
+        for file_name in file_names:
+            if file_name == RESULTS_CACHE_FILENAME and dir_path == path:
+                continue
+            try:
+                size += os.lstat(os.path.join(dir_path, file_name)).st_size
+            except OSError:
+                continue
+    return size
@@ -1,40 +1,102 @@
+import contextlib
+import copy
 import datetime as dt
+import heapq
+import json
 import os
+import pathlib
+import re
+import shutil
 import subprocess
-import random
+import tempfile
 import typing
 
 import jinja2
+from lxml import etree
 
+from lintforbrains import archive
+from lintforbrains import cache
 from lintforbrains import config
+from lintforbrains import history
 from lintforbrains import logging
+from lintforbrains import metrics
+from lintforbrains import profile
+from lintforbrains import results
+from lintforbrains import scope
+from lintforbrains import suppress
+from lintforbrains import watch
+from lintforbrains.report import run_report
+from lintforbrains.utilities import atomic_write
 
 _LOG = logging.get_logger(__name__)
 
 _DEFAULT_DEBUG_LEVEL = 2
 
-_PYTHON_SDK_LIBRARY_CMD = 'from __future__ import print_function; import sys; ' \
-                          'print("\\n".join([p for p in sys.path if p]))'
+# the minimum number of changed files an incremental inspection starts another inspector process for
+_MIN_INCREMENTAL_SHARD_FILES = 50
+
+# above this many changed files, or this long a scope pattern (a single argument is limited to 128 KiB on Linux),
+# a full inspection runs instead of an incremental one
+_MAX_INCREMENTAL_FILES = 1000
+_MAX_SCOPE_PATTERN_LENGTH = 64 * 1024
+
+# characters of the IDE scope syntax, which file patterns cannot escape
+_SCOPE_SYNTAX_PATTERN = re.compile(r'[|&!()\s]')
+
+_PROJECT_FILE_URL = results.FILE_URL_PREFIX + '$PROJECT_DIR$/'
+
+_PYTHON_SDK_QUERY_CMD = 'from __future__ import print_function; import platform, sys; ' \
+                        'print("Python " + platform.python_version()); ' \
+                        'print("\\n".join([p for p in sys.path if p]))'
 
 _PYTHON_SDK_TEMPLATES = jinja2.Environment(loader=jinja2.PackageLoader('lintforbrains'),
                                            autoescape=jinja2.select_autoescape(['xml']))
 
 
 def run_inspect(project_dir: str, project_config: config.Configuration, pycharm_version: str, pycharm_edition: str,
-                pycharm_home_dir: str, pycharm_config_dir: str, python_bin: str, debug_level: int) -> int:
+                pycharm_home_dir: str, pycharm_config_dir: str, python_bin: str, debug_level: int,
+                incremental: bool = False, since: str = None, shards: int = 1, cache_dir: str = None,
+                pycharm_system_dir: str = None, timings: bool = False, metrics_prometheus: str = None,
+                metrics_statsd: str = None, prune_profile: bool = None, report: bool = False,
+                sandbox: bool = False, archive_results: str = None, report_format: str = None,
+                report_output: str = None, report_jobs: int = 1) -> int:
     """
     Run the inspect command
     """
 
+    inspect_metrics = metrics.Metrics('inspect')
+
     # run inspector
     inspector = Inspector(pycharm_version,
                           pycharm_edition,
                           pycharm_home_dir,
                           pycharm_config_dir,
                           python_bin,
-                          debug_level)
-
-    inspector.run(project_dir, project_config)
+                          debug_level,
+                          cache_dir=cache_dir,
+                          pycharm_system_dir=pycharm_system_dir,
+                          command_metrics=inspect_metrics,
+                          sandbox=sandbox)
+
+    # report the results while they are written
+    results_consumer = None
+    if report:
+        def results_consumer(_: str, results_watcher: watch.ResultsWatcher):
+            run_report(project_dir, project_config,
+                       jobs=report_jobs,
+                       results_watcher=results_watcher,
+                       output_format=report_format,
+                       output_path=report_output)
+
+    results_dir = inspector.run(project_dir, project_config, incremental=incremental, since=since, shards=shards,
+                                prune_profile=prune_profile, results_consumer=results_consumer,
+                                archive_results=archive_results)
+
+    # write inspection metrics, archives are not written to
+    metrics.emit_metrics(inspect_metrics, results_dir if not archive.is_archive(results_dir) else None,
+                         timings=timings,
+                         prometheus_path=metrics_prometheus,
+                         statsd_address=metrics_statsd)
 
     return 0
 
@@ -51,6 +113,12 @@ class InspectorError(Exception):
     pass
 
 
+ResultsConsumer = typing.Callable[[str, watch.ResultsWatcher], None]
+"""
+Callable that reads the results of an inspection from a results watcher, while the results are written
+"""
+
+
 class Inspector:
     """
     TODO: needs class summary
@@ -66,7 +134,8 @@ class Inspector:
     configuration = config.Configuration
 
     def __init__(self, pycharm_version: str, pycharm_edition: str, pycharm_home_dir: str, pycharm_config_dir: str,
-                 python_bin: str, debug_level: int):
+                 python_bin: str, debug_level: int, cache_dir: str = None, pycharm_system_dir: str = None,
+                 command_metrics: metrics.Metrics = None, sandbox: bool = False):
         """
         Initialize instance of the Inspection class.
 
@@ -76,6 +145,10 @@ class Inspector:
         :param pycharm_config_dir: pycharm config directory
         :param python_bin: python binary path
         :param debug_level: inspector debug level
+        :param cache_dir: lintforbrains cache directory (None to disable caching)
+        :param pycharm_system_dir: pycharm system directory (overrides the configured system directory)
+        :param command_metrics: metrics the inspection phases are recorded in
+        :param sandbox: run each inspection in a private copy of the config and system directories
         """
         self.pycharm_version = pycharm_version
         self.pycharm_edition = pycharm_edition
@@ -83,17 +156,19 @@ class Inspector:
         self.pycharm_config_dir = pycharm_config_dir
         self.python_bin = python_bin
         self.debug_level = debug_level
+        self.cache_dir = cache_dir
+        self.pycharm_system_dir = pycharm_system_dir
+        self.metrics = command_metrics or metrics.Metrics('inspect')
+        self.sandbox = sandbox
 
     def _configure_inspector(self):
 
         # get information about the python SDK
-        python_sdk = self._query_python_sdk(self.python_bin)
-        if python_sdk is None:
-            pass
+        python_sdk = self._query_python_sdk_cached(self.python_bin)
 
         # configure python SDK libs helpers
         python_helpers = "python-ce" if self.pycharm_edition == "community" else "python"
-        python_sdk.sdk_libs.extend([
+        python_sdk = python_sdk._replace(sdk_libs=python_sdk.sdk_libs + [
             f"$APPLICATION_HOME_DIR$/plugins/{python_helpers}/helpers/python-skeletons",
             f"$APPLICATION_HOME_DIR$/plugins/{python_helpers}/helpers/typeshed/stdlib"
         ])
@@ -102,46 +177,77 @@ class Inspector:
         if not os.path.exists(os.path.dirname(sdk_output_path)):
             os.makedirs(os.path.dirname(sdk_output_path), exist_ok=True)
 
+        sdk_config = _PYTHON_SDK_TEMPLATES.get_template('jdk_table_xml.j2').render(runtimes=[python_sdk])
+
+        # rewriting an unchanged SDK config makes the IDE reindex the SDK
+        if _read_file(sdk_output_path) == sdk_config:
+            _LOG.debug("SDK config unchanged: {}".format(sdk_output_path))
+            return
+
         with open(sdk_output_path, 'w', encoding='utf-8') as fh:
-            fh.write(_PYTHON_SDK_TEMPLATES.get_template('jdk_table_xml.j2').render(runtimes=[python_sdk]))
+            fh.write(sdk_config)
 
         _LOG.debug("Wrote SDK config: {}".format(sdk_output_path))
 
-    def _query_python_sdk(self, python_bin: str) -> InspectorSDKInfo:
+    def _query_python_sdk_cached(self, python_bin: str) -> InspectorSDKInfo:
+        """
+        Return information about the python SDK, reusing the cached information while the interpreter and its
+        site-packages dirs are unchanged
+        """
 
-        # get sdk version
-        command = [python_bin, '-V']
+        if self.cache_dir is None:
+            return self._query_python_sdk(python_bin)
 
-        _LOG.debug("Executing command: {}".format(command))
+        cache_path = os.path.join(self.cache_dir, 'python-sdk.json')
 
         try:
-            result = subprocess.run(command,
-                                    stdout=subprocess.PIPE,
-                                    stderr=subprocess.STDOUT,
-                                    encoding='utf-8',
-                                    universal_newlines=True,
-                                    check=True)
-        except subprocess.CalledProcessError as ex:
-            raise InspectorError("Error getting Python SDK version (return code = {})".format(ex.returncode)) from ex
+            with open(cache_path, encoding='utf-8') as fh:
+                sdk_cache = json.load(fh)
+        except FileNotFoundError:
+            sdk_cache = dict()
+        except (OSError, ValueError) as ex:
+            _LOG.debug(f"Ignoring unreadable Python SDK cache {cache_path}: {ex}")
+            sdk_cache = dict()
+
+        cache_entry = sdk_cache.get(python_bin)
+        if cache_entry is not None:
+            python_sdk = InspectorSDKInfo(*cache_entry['sdk'])
+            if cache_entry['key'] == _python_sdk_cache_key(python_sdk):
+                _LOG.debug(f"Using cached Python SDK for {python_bin}")
+                return python_sdk
+
+        python_sdk = self._query_python_sdk(python_bin)
+
+        sdk_cache[python_bin] = {'key': _python_sdk_cache_key(python_sdk), 'sdk': list(python_sdk)}
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with atomic_write(cache_path) as fh:
+                json.dump(sdk_cache, fh)
+        except OSError as ex:
+            _LOG.debug(f"Unable to write Python SDK cache {cache_path}: {ex}")
 
-        python_version = result.stdout.rstrip()
+        return python_sdk
 
-        # get sdk libraries
-        command = [python_bin, '-c', _PYTHON_SDK_LIBRARY_CMD]
+    def _query_python_sdk(self, python_bin: str) -> InspectorSDKInfo:
+
+        # get sdk version and libraries
+        command = [python_bin, '-c', _PYTHON_SDK_QUERY_CMD]
 
         _LOG.debug("Executing command: {}".format(command))
 
-        try:
-            result = subprocess.run(command,
-                                    stdout=subprocess.PIPE,
-                                    stderr=subprocess.STDOUT,
-                                    encoding='utf-8',
-                                    universal_newlines=True,
-                                    check=True)
-        except subprocess.CalledProcessError as ex:
-            raise InspectorError("Error querying Python SDK libraries (return code = {})".format(ex.returncode)) from ex
+        with self.metrics.phase('query_python_sdk') as phase:
+            try:
+                result = subprocess.run(command,
+                                        stdout=subprocess.PIPE,
+                                        stderr=subprocess.STDOUT,
+                                        encoding='utf-8',
+                                        universal_newlines=True,
+                                        check=True)
+            except subprocess.CalledProcessError as ex:
+                raise InspectorError("Error querying Python SDK (return code = {})".format(ex.returncode)) from ex
 
-        python_libs = result.stdout.rstrip().splitlines()
+            python_version, *python_libs = result.stdout.rstrip().splitlines()
+            phase.count('libs', len(python_libs))
 
         return InspectorSDKInfo("Python 3.9 (lucid-auth)",
                                 "Python SDK",
@@ -149,23 +255,176 @@ class Inspector:
                                 python_bin,
                                 python_libs)
 
+    def _find_system_dir(self, project_dir: str,
+                         project_config: config.Configuration) -> typing.Optional[cache.SystemDirectory]:
+        """
+        Return the persistent system directory of the inspector, or None to use the IDE default system directory
+        """
+
+        if self.pycharm_system_dir:
+            return cache.SystemDirectory(os.path.abspath(os.path.expanduser(self.pycharm_system_dir)))
+
+        # system_dir is relative to project_dir
+        if project_config.inspect.system_dir:
+            return cache.SystemDirectory(os.path.normpath(os.path.join(project_dir,
+                                                                       os.path.expanduser(
+                                                                           project_config.inspect.system_dir))))
+
+        if self.cache_dir:
+            pycharm_name = "PyCharmCE" if self.pycharm_edition.lower() == "community" else "PyCharm"
+            return cache.SystemDirectory(os.path.join(os.path.abspath(self.cache_dir), 'system',
+                                                      f"{pycharm_name}{self.pycharm_version}"))
+
+        return None
+
+    @contextlib.contextmanager
+    def _use_system_dir(self, system_dir: typing.Optional[cache.SystemDirectory]):
+        """
+        Lock and configure a system directory for an inspector process and yield its environment variables
+        """
+
+        if system_dir is None:
+            yield None
+            return
+
+        with system_dir.lock():
+            _LOG.debug(f"Using system directory {system_dir.path}")
+            yield system_dir.configure(self.pycharm_config_dir, self._base_vmoptions_path())
+
+    @contextlib.contextmanager
+    def _use_inspection_profile(self, profile_path: str, project_config: config.Configuration,
+                                pruned_inspection_types: typing.Optional[typing.Mapping[str, results.InspectionType]]):
+        """
+        Yield the path of the inspection profile, or of a temporary copy of it with the inspections disabled whose
+        problems are all suppressed by the report configuration if pruned_inspection_types is not None
+        """
+
+        if pruned_inspection_types is None:
+            yield profile_path
+            return
+
+        suppressions = suppress.SuppressionMatcher(suppress_severity=project_config.report.suppress_severity,
+                                                   suppress_problems=project_config.report.suppress_problems)
+
+        with tempfile.TemporaryDirectory(prefix='lintforbrains-profile-') as pruned_profile_dir:
+            pruned_profile_path = os.path.join(pruned_profile_dir, os.path.basename(profile_path))
+            with self.metrics.phase('prune_profile') as phase:
+                try:
+                    pruned = profile.prune_inspection_profile(profile_path, pruned_profile_path, suppressions,
+                                                              pruned_inspection_types)
+                except profile.ProfileError as ex:
+                    raise InspectorError(str(ex)) from ex
+                phase.count('inspections', len(pruned))
+            yield pruned_profile_path
+
+    def _find_previous_inspection_types(self, project_dir: str,
+                                        project_config: config.Configuration) -> typing.Dict[str, results.InspectionType]:
+        """
+        Return the inspection types of the previous results by name, or an empty dict if there are none
+        """
+        previous_results_dir = self._find_previous_results_dir(project_dir, project_config)
+        if previous_results_dir is None:
+            return dict()
+
+        try:
+            previous_results = results.InspectionResults(project_dir, previous_results_dir, project_config)
+            return dict(previous_results.profile.inspections)
+        except (OSError, etree.XMLSyntaxError) as ex:
+            _LOG.warning(f"Unable to read inspection descriptions of {previous_results_dir}: {ex}")
+            return dict()
+
+    @contextlib.contextmanager
+    def _use_sandbox(self, project_dir: str, project_config: config.Configuration) -> typing.Iterator['Inspector']:
+        """
+        Yield a copy of the inspector that uses a sandbox seeded from its config and system directories, and copy the
+        caches of the sandbox back into the system directory after a successful inspection
+        """
+
+        system_template = self._find_system_dir(project_dir, project_config)
+        sandboxes_dir = os.path.join(os.path.abspath(self.cache_dir), 'sandboxes') if self.cache_dir else None
+
+        with contextlib.ExitStack() as stack:
+            with self.metrics.phase('prepare_sandbox'):
+                sandbox = stack.enter_context(cache.Sandbox.create(sandboxes_dir, self.pycharm_config_dir,
+                                                                   system_template))
+            _LOG.debug(f"Inspecting in sandbox {sandbox.path}")
+
+            sandboxed_inspector = copy.copy(self)
+            sandboxed_inspector.pycharm_config_dir = sandbox.config_dir
+            sandboxed_inspector.pycharm_system_dir = sandbox.system_dir.path
+            sandboxed_inspector.sandbox = False
+            yield sandboxed_inspector
+
+            if system_template is not None:
+                with self.metrics.phase('promote_sandbox'):
+                    sandbox.promote(system_template)
+
+    def _base_vmoptions_path(self) -> str:
+        return cache.base_vmoptions_path(self.pycharm_home_dir)
+
     def _prepare_results_dir(self, output_dir):
-        random_val = random.randint(0, 9)
-        results_timestamp = dt.datetime.now().strftime("%Y%m%dT%H%M%S")
-        results_dir = os.path.join(output_dir, "inspection-{}-{}".format(results_timestamp, random_val))
-        os.makedirs(results_dir)
+        results_timestamp = dt.datetime.now().strftime(history.RESULTS_DIR_TIMESTAMP_FORMAT)
+        os.makedirs(output_dir, exist_ok=True)
+        # mkdtemp atomically creates a unique dir, so concurrent inspections never share one
+        results_dir = tempfile.mkdtemp(prefix=f"{history.RESULTS_DIR_PREFIX}{results_timestamp}-", dir=output_dir)
+        os.chmod(results_dir, 0o755)
         return results_dir
 
-    def _execute_inspector(self, project_dir: str, project_config: config.Configuration):
+    def _execute_inspector(self, project_dir: str, project_config: config.Configuration, incremental: bool = False,
+                           since: str = None, shards: int = 1, prune_profile: bool = None,
+                           results_consumer: ResultsConsumer = None, archive_results: str = None) -> str:
 
         # configure the inspector
-        self._configure_inspector()
+        with self.metrics.phase('configure_inspector'):
+            self._configure_inspector()
 
         # results_dir is relative to project_dir
         inspection_output_dir = os.path.normpath(os.path.join(project_dir, project_config.inspect.output_dir))
 
         # source_dir is relative to project_dir
-        inspection_source_dir = os.path.normpath(os.path.join(project_dir, project_config.inspect.source_dir))
+        inspection_source_dir = None
+        if project_config.inspect.source_dir:
+            inspection_source_dir = os.path.normpath(os.path.join(project_dir, project_config.inspect.source_dir))
+
+        # include_files and exclude_files narrow the inspected files to a scope
+        inspection_scope = scope.FileScope(project_config.inspect.include_files,
+                                           project_config.inspect.exclude_files,
+                                           source_dir=os.path.relpath(inspection_source_dir, project_dir)
+                                           if inspection_source_dir else None)
+        if inspection_scope.is_restricted:
+            _LOG.debug(f"Inspecting scope {inspection_scope.to_pattern()}")
+
+        # find previous results before the new results dir is created
+        previous_results_dir = None
+        if incremental:
+            previous_results_dir = self._find_previous_results_dir(project_dir, project_config)
+            if previous_results_dir is None:
+                _LOG.info("No previous inspection results, running a full inspection")
+            elif archive.is_archive(previous_results_dir):
+                _LOG.info("Previous inspection results are archived, running a full inspection")
+                previous_results_dir = None
+
+        # find the changed files before the new results dir is created
+        changed_files = inspected_files = None
+        if previous_results_dir is not None:
+            changed_files, inspected_files = self._find_inspected_files(project_dir,
+                                                                        inspection_source_dir,
+                                                                        inspection_output_dir,
+                                                                        previous_results_dir,
+                                                                        since,
+                                                                        file_scope=inspection_scope)
+            if len(inspected_files) > _MAX_INCREMENTAL_FILES or \
+                    len(_build_scope_pattern(inspected_files)) > _MAX_SCOPE_PATTERN_LENGTH:
+                _LOG.info(f"{len(inspected_files)} files changed since {since or previous_results_dir}, running a "
+                          f"full inspection")
+                previous_results_dir = None
+            else:
+                _LOG.info(f"Inspecting {len(inspected_files)} files changed since {since or previous_results_dir}")
+
+        # find the inspection types of previous results, used to prune the profile, before the new results dir is created
+        pruned_inspection_types = None
+        if prune_profile if prune_profile is not None else project_config.inspect.prune_profile:
+            pruned_inspection_types = self._find_previous_inspection_types(project_dir, project_config)
 
         # generate results dir in output_dir
         inspection_results_dir = self._prepare_results_dir(inspection_output_dir)
@@ -179,36 +438,503 @@ class Inspector:
         if inspection_profile_path is None:
             inspection_profile_path = os.path.join(project_dir, ".idea/inspectionProfiles/Project_Default.xml")
 
+        inspection_system_dir = self._find_system_dir(project_dir, project_config)
+
+        with self._use_inspection_profile(inspection_profile_path, project_config, pruned_inspection_types) \
+                as inspection_profile_path:
+            if previous_results_dir is None and shards > 1:
+                self._execute_sharded_inspection(project_dir,
+                                                 inspection_profile_path,
+                                                 inspection_results_dir,
+                                                 inspection_logfile_path,
+                                                 inspection_source_dir or os.path.normpath(project_dir),
+                                                 inspection_output_dir,
+                                                 shards,
+                                                 system_dir=inspection_system_dir,
+                                                 file_scope=inspection_scope)
+            else:
+                with self._use_system_dir(inspection_system_dir) as inspection_env:
+                    if previous_results_dir is None:
+                        self._execute_inspect_command(project_dir,
+                                                      inspection_profile_path,
+                                                      inspection_results_dir,
+                                                      inspection_logfile_path,
+                                                      source_dir=inspection_source_dir,
+                                                      scope=inspection_scope.to_pattern(),
+                                                      env=inspection_env,
+                                                      results_consumer=results_consumer)
+                        results_consumer = None
+                    else:
+                        self._execute_incremental_inspection(project_dir,
+                                                             inspection_profile_path,
+                                                             inspection_results_dir,
+                                                             inspection_logfile_path,
+                                                             previous_results_dir,
+                                                             changed_files,
+                                                             inspected_files,
+                                                             env=inspection_env,
+                                                             shards=shards,
+                                                             system_dir=inspection_system_dir)
+
+        # results of merged inspections are only complete once merged
+        if results_consumer is not None:
+            results_consumer(inspection_results_dir, watch.ResultsWatcher(inspection_results_dir))
+
+        # pack the results into an archive that replaces the results dir
+        archive_compression = archive_results if archive_results is not None else project_config.inspect.archive
+        if archive_compression:
+            with self.metrics.phase('archive_results'):
+                try:
+                    inspection_results_dir = archive.create_archive(inspection_results_dir, archive_compression,
+                                                                    remove=True)
+                except archive.ArchiveError as ex:
+                    raise InspectorError(str(ex)) from ex
+
+        # index the results as the latest results, and remove the results the retention policy does not keep
+        with self.metrics.phase('prune_results') as phase:
+            results_history = history.ResultsHistory(inspection_output_dir)
+            results_history.publish(inspection_results_dir)
+            pruned = results_history.prune(history.RetentionPolicy.from_config(project_config))
+            phase.count('results_dirs', len(pruned))
+
+        _LOG.info(f"Inspection results written to {inspection_results_dir}")
+
+        return inspection_results_dir
+
+    def _build_inspect_command(self, project_dir: str, profile_path: str, results_dir: str, source_dir: str = None,
+                               scope: str = None) -> typing.List[str]:
+
         command = [os.path.join(self.pycharm_home_dir, "bin", "inspect.sh"),
                    project_dir,
-                   inspection_profile_path,
-                   inspection_results_dir]
+                   profile_path,
+                   results_dir]
 
-        if inspection_source_dir:
-            command.extend(["-d", inspection_source_dir])
+        if scope:
+            command.extend(["-scope", scope])
+        elif source_dir:
+            command.extend(["-d", source_dir])
 
         if self.debug_level:
             command.extend(["-v{}".format(self.debug_level)])
 
+        return command
+
+    def _execute_inspect_command(self, project_dir: str, profile_path: str, results_dir: str, logfile_path: str,
+                                 source_dir: str = None, scope: str = None, env: typing.Mapping[str, str] = None,
+                                 results_consumer: ResultsConsumer = None):
+
+        command = self._build_inspect_command(project_dir, profile_path, results_dir, source_dir=source_dir,
+                                              scope=scope)
+
         _LOG.debug("Executing command: {}".format(command))
 
         try:
-            with open(inspection_logfile_path, "w") as outfile:
-                subprocess.run(command,
-                               stdout=outfile,
-                               stderr=subprocess.STDOUT,
-                               check=True)
+            with open(logfile_path, "a") as outfile, self.metrics.phase('inspect_sh') as phase:
+                phase.count('runs')
+                if results_consumer is None:
+                    subprocess.run(command,
+                                   stdout=outfile,
+                                   stderr=subprocess.STDOUT,
+                                   env=dict(os.environ, **env) if env else None,
+                                   check=True)
+                else:
+                    self._execute_pipelined_command(command, outfile, env, results_dir, results_consumer)
         except subprocess.CalledProcessError as ex:
             raise InspectorError("Error running inspector (return code = {})".format(ex.returncode)) from ex
 
-        _LOG.info(f"Inspection results written to {inspection_results_dir}")
+    def _execute_pipelined_command(self, command: typing.List[str], outfile: typing.IO,
+                                   env: typing.Optional[typing.Mapping[str, str]], results_dir: str,
+                                   results_consumer: ResultsConsumer):
+        """
+        Run the inspector while the results consumer reads its results as they are written
+        """
+
+        process = subprocess.Popen(command,
+                                   stdout=outfile,
+                                   stderr=subprocess.STDOUT,
+                                   env=dict(os.environ, **env) if env else None)
+        try:
+            try:
+                results_consumer(results_dir, watch.ResultsWatcher(results_dir, process))
+            except watch.WatchError as ex:
+                # part of the report may already be written, so fail instead of reporting the results again
+                raise InspectorError(f"Error running inspector, the report is incomplete: {ex}") from ex
+            returncode = process.wait()
+        finally:
+            # the consumer failed or stopped early
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, command)
+
+    def _find_inspected_files(self, project_dir: str, source_dir: typing.Optional[str], output_dir: str,
+                              previous_results_dir: str, since: typing.Optional[str],
+                              file_scope: scope.FileScope = None) -> typing.Tuple[typing.List[str], typing.List[str]]:
+        """
+        Return the files (relative to project_dir) changed since a git ref or since the previous results, and those of
+        them an incremental inspection inspects
+        """
+        with self.metrics.phase('find_changed_files') as phase:
+            changed_files = self._find_changed_files(project_dir, output_dir, previous_results_dir, since)
+            phase.count('files', len(changed_files))
+
+        # only files in source_dir are inspected, but problems of every changed file are replaced
+        inspected_files = changed_files
+        if source_dir:
+            source_path = pathlib.Path(os.path.relpath(source_dir, project_dir))
+            inspected_files = [f for f in changed_files if source_path in pathlib.Path(f).parents]
+        if file_scope is not None:
+            inspected_files = [f for f in inspected_files if file_scope.contains(f)]
+
+        return changed_files, inspected_files
+
+    def _execute_incremental_inspection(self, project_dir: str, profile_path: str, results_dir: str,
+                                        logfile_path: str, previous_results_dir: str, changed_files: typing.List[str],
+                                        inspected_files: typing.List[str], env: typing.Mapping[str, str] = None,
+                                        shards: int = 1, system_dir: cache.SystemDirectory = None):
+
+        changed_problem_files = {_PROJECT_FILE_URL + f for f in changed_files}
+
+        def _is_unchanged_problem_file(problem_file: str):
+            if problem_file in changed_problem_files:
+                return False
+            if problem_file.startswith(_PROJECT_FILE_URL):
+                # drop problems of deleted files
+                return os.path.exists(os.path.join(project_dir, problem_file[len(_PROJECT_FILE_URL):]))
+            return True
+
+        def _is_changed_problem_file(problem_file: str):
+            return problem_file in changed_problem_files
+
+        # an inspector process is only worth starting for enough changed files
+        shard_partitions = []
+        if shards > 1:
+            shard_partitions = _partition_by_size(
+                [(_file_size(os.path.join(project_dir, f)), f) for f in inspected_files],
+                min(shards, -(-len(inspected_files) // _MIN_INCREMENTAL_SHARD_FILES)))
+            if len(shard_partitions) < 2:
+                _LOG.info(f"Inspecting {len(inspected_files)} changed files in a single shard")
+
+        fresh_results_dir = tempfile.mkdtemp(prefix='.incremental-', dir=results_dir)
+        try:
+            if len(shard_partitions) > 1:
+                _LOG.info(f"Inspecting {len(inspected_files)} changed files in {len(shard_partitions)} shards")
+                self._execute_shard_commands(project_dir,
+                                             profile_path,
+                                             fresh_results_dir,
+                                             logfile_path,
+                                             [_build_scope_pattern(shard_files) for shard_files in shard_partitions],
+                                             system_dir=system_dir)
+            elif inspected_files:
+                self._execute_inspect_command(project_dir,
+                                              profile_path,
+                                              fresh_results_dir,
+                                              logfile_path,
+                                              scope=_build_scope_pattern(inspected_files),
+                                              env=env)
+
+            # scope patterns may match more files than the changed ones, whose problems are kept from the previous
+            # results
+            with self.metrics.phase('merge_results'):
+                results.merge_results_dirs(results_dir, [(previous_results_dir, _is_unchanged_problem_file),
+                                                         (fresh_results_dir, _is_changed_problem_file)])
+        finally:
+            shutil.rmtree(fresh_results_dir, ignore_errors=True)
+
+    def _execute_sharded_inspection(self, project_dir: str, profile_path: str, results_dir: str, logfile_path: str,
+                                    source_dir: str, output_dir: str, shards: int,
+                                    system_dir: cache.SystemDirectory = None, file_scope: scope.FileScope = None):
+
+        if file_scope is None:
+            file_scope = scope.FileScope()
+
+        shard_partitions = _partition_source_dirs(project_dir, source_dir, output_dir, shards, file_scope)
+        if len(shard_partitions) < 2:
+            with self._use_system_dir(system_dir) as env:
+                return self._execute_inspect_command(project_dir, profile_path, results_dir, logfile_path,
+                                                     source_dir=source_dir, scope=file_scope.to_pattern(), env=env)
+
+        shard_scopes = [scope.intersect_scope_patterns(_build_scope_pattern(_scope_dir_pattern(d) for d in shard_dirs),
+                                                       file_scope.to_pattern())
+                        for shard_dirs in shard_partitions]
+
+        _LOG.info(f"Inspecting {source_dir} in {len(shard_scopes)} shards")
+
+        self._execute_shard_commands(project_dir, profile_path, results_dir, logfile_path, shard_scopes,
+                                     system_dir=system_dir)
+
+    def _execute_shard_commands(self, project_dir: str, profile_path: str, results_dir: str, logfile_path: str,
+                                shard_scopes: typing.List[str], system_dir: cache.SystemDirectory = None):
+        """
+        Run an inspector process for each scope in parallel and merge their results into results_dir
+        """
 
-    def run(self, project_dir: str, project_config: config.Configuration):
+        shard_processes = []
+        shard_locks = contextlib.ExitStack()
+        try:
+            for shard_index, shard_scope in enumerate(shard_scopes):
+                shard_dir = os.path.join(results_dir, f".shard-{shard_index}")
+                shard_results_dir = os.path.join(shard_dir, "results")
+                shard_logfile_path = os.path.join(shard_dir, "inspect.log")
+
+                # each shard runs with its own copy of the config dir and its own system dir, which is kept between
+                # inspections when the inspector has a persistent system dir
+                shard_system_dir = None
+                if system_dir is not None:
+                    shard_system_dir = cache.SystemDirectory(f"{system_dir.path}.shard-{shard_index}")
+                    shard_locks.enter_context(shard_system_dir.lock())
+                shard_env = self._prepare_isolated_dirs(shard_dir, shard_system_dir)
+
+                command = self._build_inspect_command(project_dir, profile_path, shard_results_dir, scope=shard_scope)
+
+                _LOG.debug("Executing command: {}".format(command))
+
+                with open(shard_logfile_path, "w") as outfile:
+                    process = subprocess.Popen(command,
+                                               stdout=outfile,
+                                               stderr=subprocess.STDOUT,
+                                               env=dict(os.environ, **shard_env))
+                shard_processes.append((process, shard_results_dir, shard_logfile_path))
+
+            with self.metrics.phase('inspect_sh') as phase:
+                phase.count('runs', len(shard_processes))
+                failed_returncodes = [p.wait() for p, _, _ in shard_processes]
+                failed_returncodes = [r for r in failed_returncodes if r != 0]
+
+            with open(logfile_path, "a") as outfile:
+                for _, _, shard_logfile_path in shard_processes:
+                    with open(shard_logfile_path) as infile:
+                        shutil.copyfileobj(infile, outfile)
+
+            if failed_returncodes:
+                raise InspectorError("Error running inspector (return code = {})".format(failed_returncodes[0]))
+
+            with self.metrics.phase('merge_results'):
+                results.merge_results_dirs(results_dir, [(d, None) for _, d, _ in shard_processes])
+        finally:
+            for process, _, _ in shard_processes:
+                if process.poll() is None:
+                    process.kill()
+                    process.wait()
+            for shard_index in range(len(shard_scopes)):
+                shutil.rmtree(os.path.join(results_dir, f".shard-{shard_index}"), ignore_errors=True)
+            shard_locks.close()
+
+    def _prepare_isolated_dirs(self, base_dir: str,
+                               system_dir: cache.SystemDirectory = None) -> typing.Dict[str, str]:
+        """
+        Create config and system dirs for an inspector process and return the environment variables that select them
+        """
+
+        config_dir = os.path.join(base_dir, "config")
+
+        if os.path.isdir(self.pycharm_config_dir):
+            shutil.copytree(self.pycharm_config_dir, config_dir, symlinks=True)
+        else:
+            os.makedirs(config_dir)
+
+        if system_dir is not None:
+            return system_dir.configure(config_dir, self._base_vmoptions_path())
+
+        system_dir = os.path.join(base_dir, "system")
+        log_dir = os.path.join(base_dir, "log")
+
+        os.makedirs(system_dir, exist_ok=True)
+        os.makedirs(log_dir, exist_ok=True)
+
+        properties_path = os.path.join(base_dir, "idea.properties")
+        cache.write_idea_properties(properties_path, {
+            'idea.config.path': config_dir,
+            'idea.system.path': system_dir,
+            'idea.log.path': log_dir,
+        })
+
+        return {'PYCHARM_PROPERTIES': properties_path}
+
+    def _find_previous_results_dir(self, project_dir: str, project_config: config.Configuration):
+        try:
+            return results.latest_results_dir(project_dir, project_config)
+        except FileNotFoundError:
+            return None
+
+    def _find_changed_files(self, project_dir: str, output_dir: str, previous_results_dir: str,
+                            since: typing.Optional[str]) -> typing.List[str]:
+        """
+        Return the paths (relative to project_dir) of files changed since a git ref or since the previous results
+        """
+        if since:
+            changed_files = self._query_git(project_dir, ['diff', '--name-only', '--relative', since, '--'])
+            changed_files.extend(self._query_git(project_dir, ['ls-files', '--others', '--exclude-standard']))
+            return sorted(set(changed_files))
+
+        changed_since = history.results_timestamp(previous_results_dir)
+
+        changed_files = []
+        for dir_path, dir_names, file_names in os.walk(project_dir):
+            dir_names[:] = [d for d in dir_names
+                            if not d.startswith('.') and os.path.normpath(os.path.join(dir_path, d)) != output_dir]
+            for file_name in file_names:
+                file_path = os.path.join(dir_path, file_name)
+                if os.stat(file_path).st_mtime >= changed_since:
+                    changed_files.append(pathlib.Path(os.path.relpath(file_path, project_dir)).as_posix())
+
+        return sorted(changed_files)
+
+    def _query_git(self, project_dir: str, args: typing.List[str]) -> typing.List[str]:
+
+        command = ['git', '-C', project_dir] + args
+
+        _LOG.debug("Executing command: {}".format(command))
+
+        try:
+            result = subprocess.run(command,
+                                    stdout=subprocess.PIPE,
+                                    stderr=subprocess.PIPE,
+                                    encoding='utf-8',
+                                    universal_newlines=True,
+                                    check=True)
+        except subprocess.CalledProcessError as ex:
+            raise InspectorError("Error querying changed files (return code = {})".format(ex.returncode)) from ex
+
+        return [f for f in result.stdout.splitlines() if f]
+
+    def run(self, project_dir: str, project_config: config.Configuration, incremental: bool = False,
+            since: str = None, shards: int = 1, prune_profile: bool = None,
+            results_consumer: ResultsConsumer = None, archive_results: str = None) -> str:
         """
         Run the inspector.
 
+        In incremental mode only the files changed since the given git ref (or, without a ref, since the previous
+        results) are inspected, and the problems of the other files are carried over from the previous results.
+
+        With more than one shard, the source directories are split into shards of about the same size that are
+        inspected by concurrent inspector processes, and their results are merged into one results directory. In
+        incremental mode the changed files are split instead, into fewer shards when there are few changed files.
+
+        When the profile is pruned, the inspector runs with a temporary copy of the inspection profile in which the
+        inspections whose problems the report would suppress are disabled.
+
+        When sandboxed, the inspector runs with private copies of the config and system directories, so concurrent
+        inspections on one host never write the same IDE directories. The system directory is only a warm template
+        for the sandbox, and is updated from it after the inspection if no other inspection is using it.
+
         :param project_dir: project directory
         :param project_config: project configuration
+        :param incremental: only inspect files changed since the previous results
+        :param since: git ref to find changed files from (implies incremental)
+        :param shards: number of concurrent inspector processes
+        :param prune_profile: disable the inspections whose problems are all suppressed by the report configuration
+                              (None to use the inspect.prune_profile configuration)
+        :param results_consumer: called with the results directory and a watcher of it, while a single inspector
+                                 process writes the results or, when results are merged, once they are merged
+        :param archive_results: compression (gzip or zstd) of an archive the results directory is packed into, read
+                                by the report without extracting it (None to use the inspect.archive configuration)
+        :return: results directory, or results archive
         """
 
-        self._execute_inspector(project_dir, project_config)
+        if self.sandbox:
+            with self._use_sandbox(project_dir, project_config) as sandboxed_inspector:
+                return sandboxed_inspector.run(project_dir, project_config, incremental=incremental, since=since,
+                                               shards=shards, prune_profile=prune_profile,
+                                               results_consumer=results_consumer, archive_results=archive_results)
+
+        return self._execute_inspector(project_dir, project_config, incremental=incremental or bool(since),
+                                       since=since, shards=shards, prune_profile=prune_profile,
+                                       results_consumer=results_consumer, archive_results=archive_results)
+
+
+def _build_scope_pattern(files: typing.Iterable[str]) -> str:
+    """
+    Return an IDE scope pattern that matches the given files (relative to the project dir). Characters of the scope
+    syntax in file names are matched by the ? wildcard, so the pattern may match a few more files.
+    """
+    return '||'.join(f"file:{_SCOPE_SYNTAX_PATTERN.sub('?', f)}" for f in files)
+
+
+def _python_sdk_cache_key(python_sdk: InspectorSDKInfo):
+    """
+    Return the cache key of a python SDK: the interpreter path and mtime, and the mtimes of its site-packages dirs
+    """
+    def _mtime_ns(path: str):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    site_dirs = [p for p in python_sdk.sdk_libs if os.path.basename(p) in ('site-packages', 'dist-packages')]
+
+    return [os.path.realpath(python_sdk.sdk_home),
+            _mtime_ns(python_sdk.sdk_home),
+            [[d, _mtime_ns(d)] for d in site_dirs]]
+
+
+def _read_file(path: str) -> typing.Optional[str]:
+    """
+    Return the content of a file, or None if it does not exist
+    """
+    try:
+        with open(path, encoding='utf-8') as fh:
+            return fh.read()
+    except FileNotFoundError:
+        return None
+
+
+def _scope_dir_pattern(dir_path: str) -> str:
+    """
+    Return a file pattern that matches the files directly in a directory (relative to the project dir)
+    """
+    return '*' if dir_path == '.' else f"{dir_path}/*"
+
+
+def _partition_source_dirs(project_dir: str, source_dir: str, output_dir: str, shards: int,
+                           file_scope: scope.FileScope = None) -> typing.List[typing.List[str]]:
+    """
+    Partition the directories in source_dir into shards balanced by the size of the files directly in them that are
+    in the file scope
+    """
+    dir_sizes = []
+    for dir_path, dir_names, file_names in os.walk(source_dir):
+        relative_dir_path = pathlib.Path(os.path.relpath(dir_path, project_dir)).as_posix()
+        dir_names[:] = sorted(d for d in dir_names
+                              if not d.startswith('.') and os.path.normpath(os.path.join(dir_path, d)) != output_dir
+                              and not (file_scope and file_scope.excludes_dir(_relative_file(relative_dir_path, d))))
+        if file_scope is not None and file_scope.is_restricted:
+            file_names = [f for f in file_names if file_scope.contains(_relative_file(relative_dir_path, f))]
+        dir_size = sum(os.stat(os.path.join(dir_path, f)).st_size for f in file_names)
+        if dir_size:
+            dir_sizes.append((dir_size, relative_dir_path))
+
+    return _partition_by_size(dir_sizes, shards)
+
+
+def _partition_by_size(sizes: typing.List[typing.Tuple[int, str]], shards: int) -> typing.List[typing.List[str]]:
+    """
+    Partition (size, path) pairs into at most the given number of shards balanced by size
+    """
+    # assign the largest paths first, each to the smallest shard
+    shard_heap = [(0, i, []) for i in range(min(shards, len(sizes)))]
+    for size, path in sorted(sizes, key=lambda d: (-d[0], d[1])):
+        shard_size, shard_index, shard_paths = heapq.heappop(shard_heap)
+        shard_paths.append(path)
+        heapq.heappush(shard_heap, (shard_size + size, shard_index, shard_paths))
+
+    return [sorted(shard_paths) for _, _, shard_paths in sorted(shard_heap, key=lambda s: s[1])]
+
+
+def _file_size(path: str) -> int:
+    """
+    Return the size of a file, or 0 if it does not exist
+    """
+    try:
+        return os.stat(path).st_size
+    except OSError:
+        return 0
+
+
+def _relative_file(relative_dir_path: str, name: str) -> str:
+    """
+    Return the path of a file in a directory (both relative to the project dir)
+    """
+    return name if relative_dir_path == '.' else f"{relative_dir_path}/{name}"
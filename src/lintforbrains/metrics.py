@@ -0,0 +1,304 @@
+import contextlib
+import itertools
+import json
+import os
+import resource
+import socket
+import time
+import typing
+
+import click
+
+from lintforbrains import logging
+from lintforbrains.utilities import atomic_write
+
+_LOG = logging.get_logger(__name__)
+
+_TIMED_ITER_BATCH_SIZE = 256
+
+
+class PhaseMetrics:
+    """
+    The PhaseMetrics class holds the measurements of a phase of a command.
+
+    Times are exclusive: time spent in a nested phase is only counted for the nested phase. Memory is not measured
+    per phase: the process peak RSS is the high-water mark of the whole process (and of its largest finished
+    subprocess) when the phase last ended, including the memory of the phases before it.
+    """
+
+    def __init__(self, name: str):
+        """
+        Initialize instance of the PhaseMetrics class.
+
+        :param name: phase name
+        """
+        self.name = name
+        self.calls = 0
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.children_cpu_seconds = 0.0
+        self.process_peak_rss_kb = 0
+        self.children_process_peak_rss_kb = 0
+        self.counts = dict()
+
+    def count(self, name: str, value: int = 1):
+        """
+        Add to an item count of the phase.
+        """
+        self.counts[name] = self.counts.get(name, 0) + value
+
+    def to_dict(self) -> typing.Dict[str, typing.Any]:
+        return {
+            'name': self.name,
+            'calls': self.calls,
+            'wall_seconds': round(self.wall_seconds, 6),
+            'cpu_seconds': round(self.cpu_seconds, 6),
+            'children_cpu_seconds': round(self.children_cpu_seconds, 6),
+            'process_peak_rss_kb': self.process_peak_rss_kb,
+            'children_process_peak_rss_kb': self.children_process_peak_rss_kb,
+            'counts': dict(self.counts),
+        }
+
+
+class Metrics:
+    """
+    The Metrics class records the wall time, CPU time, process peak RSS and item counts of the phases of a command.
+
+    Phases nest: entering a phase pauses the enclosing phase, so the times of the phases add up to the time of the
+    command. Phases of streaming stages (problems flowing from the parser through the filter into the writer) are
+    measured with timed_iter, which accounts the time spent producing each batch of items to the producing phase.
+    """
+
+    def __init__(self, command: str):
+        """
+        Initialize instance of the Metrics class.
+
+        :param command: command name
+        """
+        self.command = command
+        self.phases = dict()
+        self.started = time.time()
+
+        self._stack = []
+        self._last = None
+        self._start_usage = _usage()
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        """
+        Measure a phase for the duration of the context and yield its PhaseMetrics.
+        """
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = PhaseMetrics(name)
+
+        self._switch(phase)
+        phase.calls += 1
+        try:
+            yield phase
+        finally:
+            self._switch(None)
+
+    def timed_iter(self, name: str, items: typing.Iterable, count_name: str = 'items') -> typing.Iterator:
+        """
+        Iterate over items, measuring the time spent producing them as a phase and counting them.
+        """
+        iterator = iter(items)
+        while True:
+            with self.phase(name) as phase:
+                batch = list(itertools.islice(iterator, _TIMED_ITER_BATCH_SIZE))
+                phase.count(count_name, len(batch))
+            if not batch:
+                return
+            yield from batch
+
+    def _switch(self, phase: typing.Optional[PhaseMetrics]):
+        """
+        Account the time since the last switch to the current phase, then enter the given phase (or leave the
+        current phase if None)
+        """
+        usage = _usage()
+
+        if self._stack:
+            current = self._stack[-1]
+            last = self._last
+            current.wall_seconds += usage.wall - last.wall
+            current.cpu_seconds += usage.cpu - last.cpu
+            current.children_cpu_seconds += usage.children_cpu - last.children_cpu
+            current.process_peak_rss_kb = max(current.process_peak_rss_kb, usage.peak_rss_kb)
+            current.children_process_peak_rss_kb = max(current.children_process_peak_rss_kb,
+                                                       usage.children_peak_rss_kb)
+
+        if phase is None:
+            self._stack.pop()
+        else:
+            self._stack.append(phase)
+
+        self._last = usage
+
+    def to_dict(self) -> typing.Dict[str, typing.Any]:
+        usage = _usage()
+        return {
+            'command': self.command,
+            'started': self.started,
+            'wall_seconds': round(usage.wall - self._start_usage.wall, 6),
+            'cpu_seconds': round(usage.cpu - self._start_usage.cpu, 6),
+            'children_cpu_seconds': round(usage.children_cpu - self._start_usage.children_cpu, 6),
+            'peak_rss_kb': usage.peak_rss_kb,
+            'children_peak_rss_kb': usage.children_peak_rss_kb,
+            'phases': [p.to_dict() for p in self.phases.values()],
+        }
+
+    def write_json(self, path: str):
+        """
+        Write the metrics to a JSON file.
+        """
+        _write_atomic(path, json.dumps(self.to_dict(), indent=2) + '\n')
+        _LOG.debug(f"Wrote metrics to {path}")
+
+    def write_prometheus(self, path: str):
+        """
+        Write the metrics to a Prometheus node exporter textfile.
+        """
+        lines = []
+        for metric, help_text, key in [
+            ('lintforbrains_phase_wall_seconds', 'Wall time of a phase', 'wall_seconds'),
+            ('lintforbrains_phase_cpu_seconds', 'CPU time of a phase', 'cpu_seconds'),
+            ('lintforbrains_phase_children_cpu_seconds', 'CPU time of the subprocesses of a phase',
+             'children_cpu_seconds'),
+            ('lintforbrains_process_peak_rss_bytes', 'Peak RSS of the process when a phase ended',
+             'process_peak_rss_kb'),
+            ('lintforbrains_phase_calls', 'Number of times a phase ran', 'calls'),
+        ]:
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} gauge")
+            for phase in self.phases.values():
+                value = getattr(phase, key)
+                if key == 'process_peak_rss_kb':
+                    value *= 1024
+                lines.append(f'{metric}{{command="{self.command}",phase="{phase.name}"}} {value}')
+
+        lines.append("# HELP lintforbrains_phase_items Number of items processed by a phase")
+        lines.append("# TYPE lintforbrains_phase_items gauge")
+        for phase in self.phases.values():
+            for count_name, value in phase.counts.items():
+                lines.append(f'lintforbrains_phase_items{{command="{self.command}",phase="{phase.name}",'
+                             f'item="{count_name}"}} {value}')
+
+        _write_atomic(path, '\n'.join(lines) + '\n')
+        _LOG.debug(f"Wrote Prometheus metrics to {path}")
+
+    def send_statsd(self, address: str, prefix: str = 'lintforbrains'):
+        """
+        Send the metrics to a StatsD server at host:port.
+        """
+        host, port = parse_statsd_address(address)
+
+        packets = []
+        for phase in self.phases.values():
+            name = f"{prefix}.{self.command}.{phase.name}"
+            packets.append(f"{name}.wall:{phase.wall_seconds * 1000:.3f}|ms")
+            packets.append(f"{name}.cpu:{phase.cpu_seconds * 1000:.3f}|ms")
+            packets.append(f"{name}.process_peak_rss:{phase.process_peak_rss_kb * 1024}|g")
+            for count_name, value in phase.counts.items():
+                packets.append(f"{name}.{count_name}:{value}|g")
+
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            for packet in packets:
+                try:
+                    sock.sendto(packet.encode('utf-8'), (host, port))
+                except OSError as ex:
+                    _LOG.debug(f"Unable to send metrics to {address}: {ex}")
+                    return
+
+        _LOG.debug(f"Sent {len(packets)} metrics to {address}")
+
+    def format_table(self) -> str:
+        """
+        Return a summary table of the phases.
+        """
+        rows = [('phase', 'calls', 'wall', 'cpu', 'child cpu', 'process peak rss', 'items')]
+        for phase in self.phases.values():
+            rows.append((phase.name,
+                         str(phase.calls),
+                         f"{phase.wall_seconds:.3f}s",
+                         f"{phase.cpu_seconds:.3f}s",
+                         f"{phase.children_cpu_seconds:.3f}s",
+                         f"{phase.process_peak_rss_kb / 1024:.1f}MB",
+                         ', '.join(f"{k}={v}" for k, v in phase.counts.items())))
+
+        total = self.to_dict()
+        rows.append(('total',
+                     '',
+                     f"{total['wall_seconds']:.3f}s",
+                     f"{total['cpu_seconds']:.3f}s",
+                     f"{total['children_cpu_seconds']:.3f}s",
+                     f"{total['peak_rss_kb'] / 1024:.1f}MB",
+                     ''))
+
+        widths = [max(len(r[i]) for r in rows) for i in range(len(rows[0]))]
+        return '\n'.join('  '.join(c.ljust(w) if i in (0, 6) else c.rjust(w) for i, (c, w) in enumerate(zip(r, widths)))
+                         .rstrip() for r in rows)
+
+
+def parse_statsd_address(address: str) -> typing.Tuple[str, int]:
+    """
+    Return the host and port of a StatsD host:port address, or raise ValueError if it is invalid.
+    """
+    host, _, port = address.rpartition(':')
+    if not host or not port.isdigit() or not 0 < int(port) < 65536:
+        raise ValueError(f"Invalid StatsD address, expected host:port: {address}")
+    return host, int(port)
+
+
+def emit_metrics(metrics: Metrics, results_dir: typing.Optional[str], timings: bool = False,
+                 prometheus_path: str = None, statsd_address: str = None):
+    """
+    Write the metrics of a command to its results dir and to the requested sinks.
+
+    :param metrics: command metrics
+    :param results_dir: results directory (None to skip the metrics file)
+    :param timings: print a summary table
+    :param prometheus_path: Prometheus textfile path
+    :param statsd_address: StatsD host:port
+    """
+    if results_dir is not None:
+        try:
+            metrics.write_json(os.path.join(results_dir, f"{metrics.command}-metrics.json"))
+        except OSError as ex:
+            _LOG.warning(f"Unable to write metrics to {results_dir}: {ex}")
+
+    if prometheus_path:
+        metrics.write_prometheus(prometheus_path)
+
+    if statsd_address:
+        metrics.send_statsd(statsd_address)
+
+    if timings:
+        click.echo(metrics.format_table(), err=True)
+
+
+class _Usage(typing.NamedTuple):
+    wall: float
+    cpu: float
+    children_cpu: float
+    peak_rss_kb: int
+    children_peak_rss_kb: int
+
+
+def _usage() -> _Usage:
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return _Usage(time.perf_counter(),
+                  self_usage.ru_utime + self_usage.ru_stime,
+                  children_usage.ru_utime + children_usage.ru_stime,
+                  self_usage.ru_maxrss,
+                  children_usage.ru_maxrss)
+
+
+def _write_atomic(path: str, content: str):
+    """
+    Write a file atomically, so readers never see a partial file
+    """
+    with atomic_write(path) as fh:
+        fh.write(content)
@@ -0,0 +1,99 @@
+import typing
+
+from lxml import etree
+
+from lintforbrains import logging
+from lintforbrains import results
+from lintforbrains import suppress
+
+_LOG = logging.get_logger(__name__)
+
+
+class ProfileError(Exception):
+    pass
+
+
+def prune_inspection_profile(profile_path: str, pruned_profile_path: str, suppressions: suppress.SuppressionMatcher,
+                             inspection_types: typing.Mapping[str, results.InspectionType] = None) -> typing.List[str]:
+    """
+    Write a copy of an inspection profile with the inspections disabled whose problems are all suppressed, and return
+    the names of the disabled inspections.
+
+    An inspection is suppressed by a group::type or group::* problem suppression, or by a severity suppression of the
+    level of the inspection and of all its scopes. The groups of the inspections are only known from the descriptions
+    of previous inspection results, so without them group::* suppressions are not applied and group::type
+    suppressions are matched by type. Inspections missing from the profile are added to it disabled.
+
+    :param profile_path: inspection profile path
+    :param pruned_profile_path: pruned inspection profile path
+    :param suppressions: report suppressions
+    :param inspection_types: inspection types by name, from the descriptions of previous inspection results
+    """
+    try:
+        tree = etree.parse(profile_path)
+    except (OSError, etree.XMLSyntaxError) as ex:
+        raise ProfileError(f"Unable to read inspection profile {profile_path}: {ex}") from ex
+
+    # project profiles wrap the profile in a component element
+    root = tree.getroot()
+    profile = root if root.tag == 'profile' else root.find('profile')
+    if profile is None:
+        raise ProfileError(f"No inspection profile in {profile_path}")
+
+    inspection_types = inspection_types or dict()
+    tools = {e.get('class'): e for e in profile.findall('inspection_tool')}
+
+    # without inspection groups, group::type suppressions are matched by type
+    suppressed_type_names = set()
+    if not inspection_types:
+        for s in suppressions.suppress_problems:
+            _, _, suppressed_type = s.partition('::')
+            if suppressed_type and suppressed_type != '*':
+                suppressed_type_names.add(suppressed_type)
+
+    pruned = []
+    for name in sorted(set(tools) | set(inspection_types) | suppressed_type_names):
+        tool = tools.get(name)
+        if tool is not None and not _is_enabled_tool(tool):
+            continue
+
+        inspection_type = inspection_types.get(name)
+        if not (name in suppressed_type_names or
+                (inspection_type is not None and suppressions.is_suppressed_type(inspection_type)) or
+                (tool is not None and _is_suppressed_tool_level(tool, suppressions))):
+            continue
+
+        if tool is None:
+            etree.SubElement(profile, 'inspection_tool', {'class': name, 'enabled': 'false', 'level': 'WARNING',
+                                                          'enabled_by_default': 'false'})
+        else:
+            tool.set('enabled', 'false')
+            tool.set('enabled_by_default', 'false')
+            for scope in tool.findall('scope'):
+                scope.set('enabled', 'false')
+
+        pruned.append(name)
+
+    tree.write(pruned_profile_path, encoding='UTF-8')
+
+    if pruned:
+        _LOG.info(f"Pruned {len(pruned)} suppressed inspections from {profile_path}: {', '.join(pruned)}")
+    else:
+        _LOG.info(f"No suppressed inspections to prune from {profile_path}")
+
+    return pruned
+
+
+def _is_enabled_tool(tool: etree.Element) -> bool:
+    """
+    Return True if an inspection tool is enabled, for any of its scopes
+    """
+    return tool.get('enabled') != 'false' or any(s.get('enabled') != 'false' for s in tool.findall('scope'))
+
+
+def _is_suppressed_tool_level(tool: etree.Element, suppressions: suppress.SuppressionMatcher) -> bool:
+    """
+    Return True if the level of an inspection tool, and of all its scopes, is a suppressed severity
+    """
+    levels = [tool.get('level')] + [s.get('level') for s in tool.findall('scope')]
+    return all(level is not None and level in suppressions.suppress_severity for level in levels)
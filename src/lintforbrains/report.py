@@ -1,41 +1,202 @@
+import collections
+import contextlib
+import heapq
 import itertools
-import pathlib
+import json
+import marshal
+import os
+import re
+import sys
+import tempfile
 import typing
+import urllib.parse
+from xml.sax import saxutils
 
+import click
+
+from lintforbrains import archive
+from lintforbrains import baseline
 from lintforbrains import config
+from lintforbrains import gate
+from lintforbrains import history
 from lintforbrains import logging
+from lintforbrains import metrics
 from lintforbrains import results
+from lintforbrains import suppress
+from lintforbrains import watch
 from lintforbrains.utilities import abort
 
 _LOG = logging.get_logger(__name__)
 
+_THRESHOLD_EXIT_CODE = 3
+
+_REPORT_SINK_BUFFER_SIZE = 1 << 16
+
+_REPORT_FILE_BUFFER_SIZE = 1 << 20
+
+_XML_INVALID_CHARS_PATTERN = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
 
-def run_report(project_dir: str, project_config: config.Configuration, results_dir: str = None) -> int:
+def run_report(project_dir: str, project_config: config.Configuration, results_dir: str = None, jobs: int = 1,
+               use_cache: bool = True, timings: bool = False, metrics_prometheus: str = None,
+               metrics_statsd: str = None, baseline_path: str = None, write_baseline_path: str = None,
+               fail_on: typing.Sequence[str] = None, quiet: bool = False,
+               results_watcher: watch.ResultsWatcher = None, output_format: str = None,
+               output_path: str = None) -> int:
     """
     Run the report command
     """
 
+    report_metrics = metrics.Metrics('report')
+
+    # find report writer
+    output_format = output_format or project_config.report.output
+    try:
+        report_writer_class = get_report_writer_class(output_format)
+    except InspectionReportError as ex:
+        return abort(str(ex))
+
+    # keep summaries out of machine-readable reports written to stdout
+    summary_err = output_path is None and output_format != 'plain'
+
+    # compile failure thresholds
+    try:
+        thresholds = [gate.parse_threshold(t) for t in (fail_on or project_config.report.fail_on or ())]
+    except gate.GateError as ex:
+        return abort(str(ex))
+    problem_gate = gate.ProblemGate(thresholds) if thresholds else None
+
+    # without detailed output, stop parsing as soon as a threshold is crossed
+    check_thresholds = problem_gate is not None and quiet and baseline_path is None and write_baseline_path is None
+
     # find inspection results
-    if results_dir is None:
+    if results_watcher is not None:
+        results_dir = results_watcher.results_dir
+    elif results_dir is None:
         results_dir = results.latest_results_dir(project_dir, project_config)
         if results_dir is None:
             return abort("Unable to locate inspection results.")
 
-    # load inspection results
-    inspection_results = results.InspectionResults(project_dir, results_dir, project_config)
+    # compile suppressions
+    suppressions = suppress.SuppressionMatcher(suppress_severity=project_config.report.suppress_severity,
+                                               suppress_files=project_config.report.suppress_files,
+                                               suppress_problems=project_config.report.suppress_problems)
+
+    # load inspection results, or parse them as the running inspector writes them
+    if results_watcher is not None:
+        inspection_results = results.PipelinedInspectionResults(project_dir, results_watcher, project_config,
+                                                                jobs=jobs,
+                                                                suppressions=suppressions,
+                                                                command_metrics=report_metrics)
+    else:
+        try:
+            inspection_results = results.InspectionResults(project_dir, results_dir, project_config,
+                                                          jobs=jobs,
+                                                          use_cache=use_cache and not check_thresholds,
+                                                          suppressions=suppressions,
+                                                          command_metrics=report_metrics)
+        except archive.ArchiveError as ex:
+            return abort(str(ex))
+
+    # source files modified since the inspection have moved lines, so their problems are fingerprinted without code
+    results_time = history.results_timestamp(results_dir)
+
+    # load baseline problems
+    baseline_diff = None
+    if baseline_path is not None:
+        with report_metrics.phase('load_baseline') as phase:
+            baseline_index = _load_baseline_index(project_dir, project_config, baseline_path, suppressions, jobs)
+            phase.count('problems', len(baseline_index))
+        baseline_diff = baseline.BaselineDiff(baseline_index, baseline.ProblemFingerprinter(project_dir, results_time))
 
     # create inspection report
     inspection_report = InspectionReport(inspection_results,
-                                         suppress_severity=project_config.report.suppress_severity,
-                                         suppress_problems=project_config.report.suppress_problems)
-
-    # write inspection report
-    inspection_report_writer = SimpleReportWriter()
-    inspection_report_writer.write(inspection_report)
+                                         suppressions=suppressions,
+                                         max_buffered_problems=project_config.report.max_buffered_problems,
+                                         baseline_diff=baseline_diff,
+                                         problem_gate=problem_gate if not check_thresholds else None)
+
+    if write_baseline_path is not None:
+        # write baseline instead of the report
+        with report_metrics.phase('write_baseline') as phase:
+            baseline_index = baseline.BaselineIndex.from_problems(inspection_report.iter_problems(),
+                                                                  baseline.ProblemFingerprinter(project_dir,
+                                                                                                results_time))
+            baseline_index.save(write_baseline_path)
+            phase.count('problems', len(baseline_index))
+        click.echo(f"Wrote baseline of {len(baseline_index)} problems to {write_baseline_path}", err=summary_err)
+    elif check_thresholds:
+        # check thresholds, parsing the results files most likely to cross them first
+        with report_metrics.phase('check_thresholds'):
+            problem_gate.check(inspection_report.iter_problems(severities=problem_gate.severities))
+    elif quiet:
+        # count problems without writing the report
+        with report_metrics.phase('count_problems'):
+            collections.deque(inspection_report.iter_problems(), maxlen=0)
+    else:
+        # write inspection report
+        with report_metrics.phase('write_report'), _open_report_output(output_path) as stream:
+            report_writer_class(stream).write(inspection_report)
+
+    # write baseline summary
+    if baseline_diff is not None:
+        for type_name, file, count in baseline_diff.iter_fixed_problems():
+            click.echo(f"Fixed {count} {type_name} problems in {file}", err=summary_err)
+        click.echo(f"{baseline_diff.new_count} new problems, {baseline_diff.fixed_count} fixed problems "
+                   f"since baseline {baseline_path}", err=summary_err)
+
+    # write report metrics
+    # archives are not written to
+    metrics.emit_metrics(report_metrics, results_dir if not archive.is_archive(results_dir) else None,
+                         timings=timings,
+                         prometheus_path=metrics_prometheus,
+                         statsd_address=metrics_statsd)
+
+    # write threshold summary
+    if problem_gate is not None:
+        if problem_gate.failed:
+            return abort(problem_gate.format_summary(), exit_code=_THRESHOLD_EXIT_CODE, err=summary_err)
+        click.echo(problem_gate.format_summary(), err=summary_err)
 
     return 0
 
 
+@contextlib.contextmanager
+def _open_report_output(output_path: typing.Optional[str]) -> typing.Iterator[typing.Optional[typing.TextIO]]:
+    """
+    Open the report output file for the duration of the context, or yield None to write the report to stdout
+    """
+    if output_path is None:
+        yield None
+        return
+
+    try:
+        fh = open(output_path, 'w', encoding='utf-8', buffering=_REPORT_FILE_BUFFER_SIZE)
+    except OSError as ex:
+        abort(f"Unable to write report to {output_path}: {ex}")
+
+    with fh:
+        yield fh
+
+
+def _load_baseline_index(project_dir: str, project_config: config.Configuration, baseline_path: str,
+                         suppressions: suppress.SuppressionMatcher, jobs: int) -> baseline.BaselineIndex:
+    """
+    Load the baseline index from a baseline file, or build it from a results directory or archive
+    """
+    if not os.path.isdir(baseline_path) and not archive.is_archive(baseline_path):
+        return baseline.BaselineIndex.load(baseline_path)
+
+    baseline_results = results.InspectionResults(project_dir, baseline_path, project_config,
+                                                 jobs=jobs,
+                                                 suppressions=suppressions)
+    baseline_report = InspectionReport(baseline_results, suppressions=suppressions)
+
+    return baseline.BaselineIndex.from_problems(baseline_report.iter_problems(),
+                                                baseline.ProblemFingerprinter(project_dir,
+                                                                              history.results_timestamp(baseline_path)))
+
+
 class InspectionReportError(Exception):
     pass
 
@@ -49,82 +210,319 @@ class InspectionReport:
                  inspection_results: results.InspectionResults,
                  suppress_severity: typing.Iterable[str] = None,
                  suppress_files: typing.Iterable[str] = None,
-                 suppress_problems: typing.Iterable[str] = None):
+                 suppress_problems: typing.Iterable[str] = None,
+                 suppressions: suppress.SuppressionMatcher = None,
+                 max_buffered_problems: int = None,
+                 command_metrics: metrics.Metrics = None,
+                 baseline_diff: baseline.BaselineDiff = None,
+                 problem_gate: gate.ProblemGate = None):
         """
         Initialize instance of the InspectionReport class.
+
+        :param inspection_results: inspection results
+        :param suppress_severity: suppressed problem severities
+        :param suppress_files: suppressed file globs
+        :param suppress_problems: suppressed problems as group::type or group::*
+        :param suppressions: compiled suppressions, used instead of the suppress_* arguments
+        :param max_buffered_problems: maximum number of problems sorted in memory when grouping (None for no limit)
+        :param command_metrics: metrics the report phases are recorded in (by default the metrics of the results)
+        :param baseline_diff: only problems missing from the baseline are reported
+        :param problem_gate: reported problems are counted against its thresholds
+        """
+        if suppressions is None:
+            suppressions = suppress.SuppressionMatcher(suppress_severity, suppress_files, suppress_problems)
+        self.suppress_severity = suppressions.suppress_severity
+        self.suppress_files = suppressions.suppress_files
+        self.suppress_problems = suppressions.suppress_problems
+        self.suppressions = suppressions
+        self.inspection_results = inspection_results
+        self.max_buffered_problems = max_buffered_problems
+        self.metrics = command_metrics or inspection_results.metrics
+        self.baseline_diff = baseline_diff
+        self.problem_gate = problem_gate
+
+        self._problems = None
+
+    @property
+    def problems(self) -> typing.Sequence[results.InspectionProblem]:
+        """
+        Unsuppressed inspection problems
+        """
+        if self._problems is None:
+            self._problems = self._process_problems(self.inspection_results.iter_problems())
+        return self._problems
+
+    def iter_problems(self, severities: typing.Collection[results.InspectionProblemSeverity] = None) \
+            -> typing.Iterator[results.InspectionProblem]:
         """
-        self.suppress_severity = suppress_severity or []
-        self.suppress_files = suppress_files or []
-        self.suppress_problems = suppress_problems or []
-        self.problems = self._process_problems(inspection_results.problems)
+        Iterate over the unsuppressed inspection problems without loading them all into memory.
+
+        :param severities: problem severities to parse first (see InspectionResults.iter_problems)
+        """
+        if self._problems is not None:
+            return iter(self._problems)
+        problems = self.metrics.timed_iter('filter_problems',
+                                           self._filter_problems(self.inspection_results.iter_problems(severities)),
+                                           'problems')
+        if self.baseline_diff is not None:
+            problems = self.metrics.timed_iter('match_baseline', self.baseline_diff.iter_new_problems(problems),
+                                               'problems')
+        if self.problem_gate is not None:
+            problems = self.problem_gate.iter_counted(problems)
+        return problems
 
     def _is_suppressed_file(self, p: results.InspectionProblem):
-        file_path = pathlib.PurePath(p.file)
-        for suppressed_pattern in self.suppress_files:
-            if file_path.match(suppressed_pattern):
-                return True
-        return False
+        return self.suppressions.is_suppressed_file(p.file)
 
     def _is_suppressed_severity(self, p: results.InspectionProblem):
-        problem_sev = p.severity.value
-        for suppressed_sev in self.suppress_severity:
-            if suppressed_sev == problem_sev:
-                return True
-        return False
+        return self.suppressions.is_suppressed_severity(p.severity)
 
     def _is_suppressed_problem(self, p: results.InspectionProblem):
-        problem_group = p.type.group.name
-        problem_type = p.type.name
-        for s in self.suppress_problems:
-            suppressed_group, _, suppressed_type = s.partition('::')
-            if suppressed_type == problem_type and suppressed_group == problem_group:
-                return True
-            if suppressed_type is None and suppressed_group == problem_group:
-                return True
-            if suppressed_type == '*' and suppressed_group == problem_group:
-                return True
-        return False
+        return self.suppressions.is_suppressed_type(p.type)
 
-    def _process_problems(self, problems: typing.Iterable[results.InspectionProblem]):
-        result = []
+    def _filter_problems(self, problems: typing.Iterable[results.InspectionProblem]):
+        debug = _LOG.isEnabledFor(logging.DEBUG)
 
         for p in problems:
             if self._is_suppressed_file(p):
-                _LOG.debug(f"{p} suppressed by file")
+                if debug:
+                    _LOG.debug(f"{p} suppressed by file")
                 continue
             if self._is_suppressed_severity(p):
-                _LOG.debug(f"{p} suppressed by severity")
+                if debug:
+                    _LOG.debug(f"{p} suppressed by severity")
                 continue
             if self._is_suppressed_problem(p):
-                _LOG.debug(f"{p} suppressed by problem")
+                if debug:
+                    _LOG.debug(f"{p} suppressed by problem")
                 continue
-            result.append(p)
+            yield p
 
-        return result
+    def _process_problems(self, problems: typing.Iterable[results.InspectionProblem]):
+        problems = self._filter_problems(problems)
+        if self.baseline_diff is not None:
+            problems = self.baseline_diff.iter_new_problems(problems)
+        if self.problem_gate is not None:
+            problems = self.problem_gate.iter_counted(problems)
+        return results.ProblemTable(problems)
+
+    def group_problems(self, problems: typing.Iterable[results.InspectionProblem], *keys: str):
+        """
+        Group problems by one or more keys (file, severity or type).
 
-    # noinspection PyMethodMayBeStatic
-    def group_problems_by_file(self, problems: typing.Iterable[results.InspectionProblem]):
-        def _by_problem_file(p: results.InspectionProblem):
-            return p.file
+        The problems are sorted once by all of the keys (and then by line) and grouped into nested groups, so
+        group_problems(problems, 'file', 'severity') yields (file, [(severity, [problem, ...]), ...]) pairs. Each group
+        is an iterator that must be consumed in order. When there are more than max_buffered_problems problems the
+        sort spills sorted runs to disk and merges them.
 
-        return itertools.groupby(sorted(problems, key=_by_problem_file), key=_by_problem_file)
+        :param problems: inspection problems
+        :param keys: group keys, from outermost to innermost
+        """
+        problem_sorter = ProblemSorter(keys, max_buffered_problems=self.max_buffered_problems)
+        sorted_problems = self.metrics.timed_iter('sort_problems', problem_sorter.sort(problems), 'problems')
+        return _group_sorted_problems(sorted_problems, [_PROBLEM_GROUP_KEYS[k] for k in keys])
 
-    # noinspection PyMethodMayBeStatic
-    def group_problems_by_severity(self, problems: typing.Iterable[results.InspectionProblem]):
-        def _by_problem_severity(p: results.InspectionProblem):
-            return p.severity.value
+    def group_problems_by_file(self, problems: typing.Iterable[results.InspectionProblem]):
+        return self.group_problems(problems, 'file')
 
-        return itertools.groupby(sorted(problems, key=_by_problem_severity), key=_by_problem_severity)
+    def group_problems_by_severity(self, problems: typing.Iterable[results.InspectionProblem]):
+        return self.group_problems(problems, 'severity')
 
-    # noinspection PyMethodMayBeStatic
     def group_problems_by_type(self, problems: typing.Iterable[results.InspectionProblem]):
-        def _by_problem_class(p: results.InspectionProblem):
-            return p.type
+        return self.group_problems(problems, 'type')
+
+
+class ProblemSorter:
+    """
+    The ProblemSorter class sorts inspection problems by one or more group keys, then by line.
+
+    Up to max_buffered_problems problems are sorted in memory. Beyond that, sorted runs are written to temporary files
+    and merged, so the number of problems held in memory is bounded no matter how many problems are sorted.
+    """
+
+    def __init__(self, keys: typing.Sequence[str], max_buffered_problems: int = None):
+        """
+        Initialize instance of the ProblemSorter class.
+
+        :param keys: sort keys (file, severity or type)
+        :param max_buffered_problems: maximum number of problems sorted in memory (None for no limit)
+        """
+        self.keys = keys
+        self.max_buffered_problems = max_buffered_problems
+
+        self._key_functions = [_PROBLEM_SORT_KEYS[k] for k in keys]
+
+    def sort_key(self, p: results.InspectionProblem):
+        return tuple(f(p) for f in self._key_functions) + (p.line,)
+
+    def sort(self, problems: typing.Iterable[results.InspectionProblem]) -> typing.Iterator[results.InspectionProblem]:
+        """
+        Iterate over the problems in sorted order.
+
+        :param problems: inspection problems
+        """
+        if self.max_buffered_problems is None:
+            return iter(sorted(problems, key=self.sort_key))
+        return self._sort_external(problems)
+
+    def _sort_external(self, problems: typing.Iterable[results.InspectionProblem]):
+        types = []
+        type_indexes = dict()
+
+        def _problem_record(entry: tuple):
+            sort_key, sequence, p = entry
+            type_index = type_indexes.get(p.type)
+            if type_index is None:
+                type_index = type_indexes[p.type] = len(types)
+                types.append(p.type)
+            return sort_key, sequence, type_index, p.severity.value, p.description, p.file, p.line, p.details
+
+        with tempfile.TemporaryDirectory(prefix='lintforbrains-sort-') as runs_dir:
+            run_files = []
+            buffer = []
+
+            for sequence, p in enumerate(problems):
+                buffer.append((self.sort_key(p), sequence, p))
+                if len(buffer) >= self.max_buffered_problems:
+                    buffer.sort(key=_entry_order)
+                    run_files.append(_write_sorted_run(runs_dir, len(run_files), map(_problem_record, buffer)))
+                    buffer = []
+
+            buffer.sort(key=_entry_order)
+
+            if not run_files:
+                for _, _, p in buffer:
+                    yield p
+                return
+
+            _LOG.debug(f"Merging {len(run_files)} sorted runs of {self.max_buffered_problems} problems")
+
+            severities = {s.value: s for s in results.InspectionProblemSeverity}
+            runs = [_read_sorted_run(f) for f in run_files]
+            for entry in heapq.merge(buffer, *runs, key=_entry_order):
+                if len(entry) == 3:
+                    yield entry[2]
+                else:
+                    _, _, type_index, severity, description, file, line, details = entry
+                    yield results.InspectionProblem(types[type_index], severities[severity], description, file, line,
+                                                    details)
+
+
+def _entry_order(entry: tuple):
+    """
+    Order buffered problems and problem records by sort key, then by input sequence
+    """
+    return entry[0], entry[1]
+
 
-        return itertools.groupby(sorted(problems, key=_by_problem_class), key=_by_problem_class)
+_PROBLEM_SORT_KEYS = {
+    'file': lambda p: p.file,
+    'severity': lambda p: p.severity.value,
+    'type': lambda p: p.type.name if p.type is not None else '',
+}
+
+_PROBLEM_GROUP_KEYS = {
+    'file': lambda p: p.file,
+    'severity': lambda p: p.severity.value,
+    'type': lambda p: p.type,
+}
+
+
+def _group_sorted_problems(problems: typing.Iterator[results.InspectionProblem],
+                           key_functions: typing.Sequence[typing.Callable]):
+    """
+    Group sorted problems into nested groups
+    """
+    for key, group in itertools.groupby(problems, key=key_functions[0]):
+        if len(key_functions) > 1:
+            yield key, _group_sorted_problems(group, key_functions[1:])
+        else:
+            yield key, group
+
+
+def _write_sorted_run(runs_dir: str, run_index: int, records: typing.Iterable[tuple]):
+    """
+    Write sorted problem records to a run file
+    """
+    run_file = os.path.join(runs_dir, f"run-{run_index}")
+    with open(run_file, 'wb') as fh:
+        for record in records:
+            marshal.dump(record, fh)
+
+    return run_file
+
+
+def _read_sorted_run(run_file: str):
+    """
+    Read problem records from a run file
+    """
+    with open(run_file, 'rb') as fh:
+        while True:
+            try:
+                yield marshal.load(fh)
+            except EOFError:
+                return
+
+
+class ReportSink:
+    """
+    The ReportSink class buffers the text written by a report writer and writes it to a stream in large chunks, so a
+    report of millions of problems is not written one line at a time.
+    """
+
+    def __init__(self, stream: typing.TextIO, buffer_size: int = _REPORT_SINK_BUFFER_SIZE):
+        """
+        Initialize instance of the ReportSink class.
+
+        :param stream: output stream
+        :param buffer_size: number of characters buffered before they are written to the stream
+        """
+        self.stream = stream
+        self.buffer_size = buffer_size
+
+        self._buffer = []
+        self._buffered = 0
+
+    def write(self, text: str):
+        self._buffer.append(text)
+        self._buffered += len(text)
+        if self._buffered >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self.stream.write(''.join(self._buffer))
+            self._buffer = []
+            self._buffered = 0
+        self.stream.flush()
 
 
 class InspectionReportWriter:
+    """
+    The InspectionReportWriter class writes an inspection report to a stream.
+
+    Problems are written as they are read from the results, through a buffered sink. Writers that group problems by
+    file get them sorted by file, which holds at most report.max_buffered_problems problems in memory.
+    """
+
+    group_by_file = True
+    """
+    Write the problems grouped by file, instead of in the order they are read
+    """
+
+    def __init__(self, stream: typing.TextIO = None):
+        """
+        Initialize instance of the InspectionReportWriter class.
+
+        :param stream: output stream (None for stdout)
+        """
+        self.sink = ReportSink(stream if stream is not None else sys.stdout)
+
+    def _begin_write(self, report: InspectionReport):
+        pass
+
+    def _end_write(self, report: InspectionReport):
+        pass
 
     def _begin_write_file(self, report: InspectionReport, file: str):
         pass
@@ -136,22 +534,228 @@ class InspectionReportWriter:
         pass
 
     def write(self, report: InspectionReport):
-        for file, file_problems in report.group_problems_by_file(report.problems):
-            self._begin_write_file(report, file)
+        self._begin_write(report)
+
+        if self.group_by_file:
+            for file, file_problems in report.group_problems_by_file(report.iter_problems()):
+                self._begin_write_file(report, file)
 
-            for problem in file_problems:
+                for problem in file_problems:
+                    self._write_problem(report, problem)
+
+                self._end_write_file(report, file)
+        else:
+            for problem in report.iter_problems():
                 self._write_problem(report, problem)
 
-            self._end_write_file(report, file)
+        self._end_write(report)
+
+        self.sink.flush()
 
 
 class SimpleReportWriter(InspectionReportWriter):
 
     def _begin_write_file(self, report: InspectionReport, file: str):
-        print(file)
+        self.sink.write(f"{file}\n")
 
     def _write_problem(self, report: InspectionReport, problem: results.InspectionProblem):
-        print(f"{problem.line} : [{problem.severity.value}] - {problem.details} ({problem.description})")
+        self.sink.write(f"{problem.line} : [{problem.severity.value}] - {problem.details} ({problem.description})\n")
 
     def _end_write_file(self, report: InspectionReport, file: str):
-        print('--------------')
+        self.sink.write('--------------\n')
+
+
+class JsonLinesReportWriter(InspectionReportWriter):
+    """
+    The JsonLinesReportWriter class writes one JSON object per problem, in the order the problems are read.
+    """
+
+    group_by_file = False
+
+    def _write_problem(self, report: InspectionReport, problem: results.InspectionProblem):
+        self.sink.write(json.dumps({
+            'file': results.problem_file_path(problem.file),
+            'line': problem.line,
+            'severity': problem.severity.value,
+            'group': problem.type.group.name if problem.type is not None else None,
+            'inspection': problem.type.name if problem.type is not None else None,
+            'description': problem.description,
+            'details': problem.details,
+        }))
+        self.sink.write('\n')
+
+
+class SarifReportWriter(InspectionReportWriter):
+    """
+    The SarifReportWriter class writes a SARIF 2.1.0 log with a result per problem, in the order the problems are
+    read. The rules of the inspections that reported problems are written after the results.
+    """
+
+    group_by_file = False
+
+    def __init__(self, stream: typing.TextIO = None):
+        super().__init__(stream)
+        self._rules = dict()
+        self._result_count = 0
+
+    def _begin_write(self, report: InspectionReport):
+        self._rules = dict()
+        self._result_count = 0
+        self.sink.write('{"$schema": "https://json.schemastore.org/sarif-2.1.0.json", "version": "2.1.0", '
+                        '"runs": [{"results": [\n')
+
+    def _write_problem(self, report: InspectionReport, problem: results.InspectionProblem):
+        rule_id = problem.type.name if problem.type is not None else 'unknown'
+        if rule_id not in self._rules:
+            self._rules[rule_id] = problem.type
+
+        location = {
+            'physicalLocation': {
+                'artifactLocation': _sarif_artifact_location(report.inspection_results.project_dir, problem.file),
+                'region': {'startLine': max(problem.line, 1)},
+            },
+        }
+
+        if self._result_count:
+            self.sink.write(',\n')
+        self.sink.write(json.dumps({
+            'ruleId': rule_id,
+            'level': _SARIF_LEVELS[problem.severity],
+            'message': {'text': problem.details or problem.description or rule_id},
+            'locations': [location],
+        }))
+        self._result_count += 1
+
+    def _end_write(self, report: InspectionReport):
+        rules = [{'id': rule_id,
+                  'name': rule_id,
+                  'shortDescription': {'text': t.title if t is not None and t.title else rule_id},
+                  'properties': {'group': t.group.name if t is not None else None}}
+                 for rule_id, t in sorted(self._rules.items())]
+        self.sink.write('\n], "tool": {"driver": ')
+        self.sink.write(json.dumps({'name': 'lintforbrains', 'rules': rules}))
+        self.sink.write('}}]}\n')
+
+
+class CheckstyleReportWriter(InspectionReportWriter):
+    """
+    The CheckstyleReportWriter class writes a Checkstyle XML report, with the problems grouped by file.
+    """
+
+    def _begin_write(self, report: InspectionReport):
+        self.sink.write('<?xml version="1.0" encoding="UTF-8"?>\n<checkstyle version="4.3">\n')
+
+    def _begin_write_file(self, report: InspectionReport, file: str):
+        self.sink.write(f"<file name={_xml_attr(results.problem_file_path(file))}>\n")
+
+    def _write_problem(self, report: InspectionReport, problem: results.InspectionProblem):
+        source = f"{problem.type.group.name}.{problem.type.name}" if problem.type is not None else 'unknown'
+        self.sink.write(f"<error line=\"{problem.line}\" severity=\"{_CHECKSTYLE_SEVERITIES[problem.severity]}\" "
+                        f"message={_xml_attr(problem.details or problem.description)} source={_xml_attr(source)}/>\n")
+
+    def _end_write_file(self, report: InspectionReport, file: str):
+        self.sink.write('</file>\n')
+
+    def _end_write(self, report: InspectionReport):
+        self.sink.write('</checkstyle>\n')
+
+
+class JUnitReportWriter(InspectionReportWriter):
+    """
+    The JUnitReportWriter class writes a JUnit XML report with a test suite per file and a failed test case per
+    problem. The problems of one file are buffered, since a test suite starts with its test count.
+    """
+
+    def __init__(self, stream: typing.TextIO = None):
+        super().__init__(stream)
+        self._file_problems = []
+
+    def _begin_write(self, report: InspectionReport):
+        self.sink.write('<?xml version="1.0" encoding="UTF-8"?>\n<testsuites name="lintforbrains">\n')
+
+    def _begin_write_file(self, report: InspectionReport, file: str):
+        self._file_problems = []
+
+    def _write_problem(self, report: InspectionReport, problem: results.InspectionProblem):
+        self._file_problems.append(problem)
+
+    def _end_write_file(self, report: InspectionReport, file: str):
+        path = _xml_attr(results.problem_file_path(file))
+        count = len(self._file_problems)
+        self.sink.write(f"<testsuite name={path} tests=\"{count}\" failures=\"{count}\" errors=\"0\">\n")
+        for problem in self._file_problems:
+            type_name = problem.type.name if problem.type is not None else 'unknown'
+            self.sink.write(f"<testcase name={_xml_attr(f'{type_name}:{problem.line}')} classname={path}>"
+                            f"<failure message={_xml_attr(problem.details or problem.description)} "
+                            f"type=\"{problem.severity.value}\">{_xml_text(problem.description)}</failure>"
+                            f"</testcase>\n")
+        self.sink.write('</testsuite>\n')
+        self._file_problems = []
+
+    def _end_write(self, report: InspectionReport):
+        self.sink.write('</testsuites>\n')
+
+
+_REPORT_WRITERS = {
+    'plain': SimpleReportWriter,
+    'jsonl': JsonLinesReportWriter,
+    'sarif': SarifReportWriter,
+    'checkstyle': CheckstyleReportWriter,
+    'junit': JUnitReportWriter,
+}
+
+REPORT_FORMATS = tuple(_REPORT_WRITERS)
+
+
+def get_report_writer_class(output_format: str) -> typing.Type[InspectionReportWriter]:
+    """
+    Return the report writer class of a report format.
+
+    :param output_format: report format (plain, jsonl, sarif, checkstyle or junit)
+    """
+    try:
+        return _REPORT_WRITERS[output_format]
+    except KeyError:
+        raise InspectionReportError(f"Unknown report format {output_format!r} "
+                                    f"(expected one of {', '.join(REPORT_FORMATS)})") from None
+
+
+_SARIF_LEVELS = {
+    results.InspectionProblemSeverity.ERROR: 'error',
+    results.InspectionProblemSeverity.WARNING: 'warning',
+    results.InspectionProblemSeverity.WEAK: 'note',
+    results.InspectionProblemSeverity.INFO: 'note',
+    results.InspectionProblemSeverity.TYPO: 'note',
+}
+
+_CHECKSTYLE_SEVERITIES = {
+    results.InspectionProblemSeverity.ERROR: 'error',
+    results.InspectionProblemSeverity.WARNING: 'warning',
+    results.InspectionProblemSeverity.WEAK: 'info',
+    results.InspectionProblemSeverity.INFO: 'info',
+    results.InspectionProblemSeverity.TYPO: 'info',
+}
+
+
+def _sarif_artifact_location(project_dir: str, file: str) -> typing.Dict[str, str]:
+    """
+    Return the SARIF artifact location of a problem file, relative to the project directory when it is in it
+    """
+    path = results.problem_file_path(file)
+    if path == project_dir or path.startswith(project_dir.rstrip('/') + '/'):
+        return {'uri': urllib.parse.quote(os.path.relpath(path, project_dir)), 'uriBaseId': '%SRCROOT%'}
+    return {'uri': urllib.parse.quote(path)}
+
+
+def _xml_attr(value: typing.Optional[str]) -> str:
+    """
+    Quote an XML attribute value, dropping the characters XML does not allow
+    """
+    return saxutils.quoteattr(_XML_INVALID_CHARS_PATTERN.sub('', value or ''))
+
+
+def _xml_text(value: typing.Optional[str]) -> str:
+    """
+    Escape XML text, dropping the characters XML does not allow
+    """
+    return saxutils.escape(_XML_INVALID_CHARS_PATTERN.sub('', value or ''))
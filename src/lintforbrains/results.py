@@ -1,17 +1,50 @@
+import array
+import collections
+import collections.abc
+import concurrent.futures
 import enum
+import functools
+import hashlib
+import marshal
 import os
 import pathlib
+import re
+import shutil
+import sys
 import typing
 
 from lxml import etree
 
+from lintforbrains import archive
 from lintforbrains import config
+from lintforbrains import history
 from lintforbrains import logging
+from lintforbrains import metrics
+from lintforbrains import suppress
+from lintforbrains import watch
 
+from lintforbrains.utilities import atomic_write
 from lintforbrains.utilities import substitute
 
 _LOG = logging.get_logger(__name__)
 
+_PARALLEL_PARSE_THRESHOLD = 8
+
+_RESULTS_CACHE_VERSION = 1
+
+_SEVERITY_PEEK_SIZE = 4096
+
+_SEVERITY_PATTERN = re.compile(rb'<problem_class[^>]*\sseverity="([^"]*)"')
+
+FILE_URL_PREFIX = 'file://'
+
+
+def problem_file_path(file: str) -> str:
+    """
+    Return the path of a problem file URL.
+    """
+    return file[len(FILE_URL_PREFIX):] if file.startswith(FILE_URL_PREFIX) else file
+
 
 def latest_results_dir(project_dir: str, configuration: config.Configuration):
     """
@@ -20,10 +53,15 @@ def latest_results_dir(project_dir: str, configuration: config.Configuration):
 
     results_dir = os.path.normpath(os.path.join(project_dir, configuration.inspect.output_dir))
 
+    # the latest symlink is maintained by the inspector
+    most_recent_results_dir = history.ResultsHistory(results_dir).latest()
+    if most_recent_results_dir is not None:
+        _LOG.debug(f"Found latest inspection results {most_recent_results_dir}")
+        return most_recent_results_dir
+
     most_recent_results_time = None
-    most_recent_results_dir = None
     for p in pathlib.Path(results_dir).iterdir():
-        if p.is_dir():
+        if (p.is_dir() and not p.is_symlink()) or archive.is_archive(str(p)):
             st = p.stat()
             if most_recent_results_time is None or st.st_mtime > most_recent_results_time:
                 most_recent_results_time = st.st_mtime
@@ -35,6 +73,38 @@ def latest_results_dir(project_dir: str, configuration: config.Configuration):
     return most_recent_results_dir
 
 
+def merge_results_dirs(results_dir: str,
+                       sources: typing.Sequence[typing.Tuple[str, typing.Optional[typing.Callable[[str], bool]]]]):
+    """
+    Merge the results files of one or more inspection results directories into a results directory.
+
+    The problems files are merged one inspection at a time and streamed, so no results file is loaded whole.
+
+    :param results_dir: merged results directory
+    :param sources: (results directory, problem filter) pairs, the filter is called with the unsubstituted file of each
+                    problem and returns False to drop the problem. The .descriptions.xml is copied from the last source.
+    """
+
+    descriptions_file = None
+    problems_files = collections.defaultdict(list)
+    for source_dir, problem_filter in sources:
+        source_descriptions_file = os.path.join(source_dir, '.descriptions.xml')
+        if os.path.isfile(source_descriptions_file):
+            descriptions_file = source_descriptions_file
+        for inspection_name, problems_file in _iter_results_files(source_dir):
+            problems_files[inspection_name].append((problems_file, problem_filter))
+
+    if descriptions_file is not None:
+        shutil.copyfile(descriptions_file, os.path.join(results_dir, '.descriptions.xml'))
+
+    for inspection_name, inspection_problems_files in sorted(problems_files.items()):
+        merged_file = os.path.join(results_dir, f"{inspection_name}.xml")
+        merged_count = _merge_problems_files(merged_file, inspection_problems_files)
+        _LOG.debug(f"Merged {merged_count} {inspection_name} problems into {merged_file}")
+        if not merged_count:
+            os.remove(merged_file)
+
+
 class InspectionProfile:
     """
     The InspectionProfile class represent a inspection profile.
@@ -42,6 +112,8 @@ class InspectionProfile:
 
     groups: typing.MutableMapping[str, 'InspectionGroup']
 
+    inspections: typing.MutableMapping[str, 'InspectionType']
+
     def __init__(self, profile_name: str):
         """
         Initialize instance of the InspectionProfile class.
@@ -50,6 +122,7 @@ class InspectionProfile:
         """
         self.name = profile_name
         self.groups = dict()
+        self.inspections = dict()
 
 
 class InspectionGroup:
@@ -78,12 +151,17 @@ class InspectionGroup:
             return NotImplemented
 
     def __eq__(self, other):
+        if self is other:
+            return True
         if isinstance(other, InspectionGroup):
             return (self.profile == other.profile and
                     self.name == other.name)
         else:
             return NotImplemented
 
+    def __hash__(self):
+        return hash(self.name)
+
     def __str__(self):
         return f"InspectionGroup ({self.name})"
 
@@ -117,6 +195,7 @@ class InspectionType:
         self.enabled = inspection_enabled
 
         self.group.inspections[inspection_name] = self
+        self.group.profile.inspections[inspection_name] = self
 
     def __lt__(self, other):
         if isinstance(other, InspectionType):
@@ -125,12 +204,17 @@ class InspectionType:
             return NotImplemented
 
     def __eq__(self, other):
+        if self is other:
+            return True
         if isinstance(other, InspectionType):
             return (self.group == other.group and
                     self.name == other.name)
         else:
             return NotImplemented
 
+    def __hash__(self):
+        return hash((self.group.name, self.name))
+
     def __str__(self):
         return f"InspectionType ({self.group.name}::{self.name})"
 
@@ -152,6 +236,8 @@ class InspectionProblem:
     The InspectionProblem class represents an inspection problem.
     """
 
+    __slots__ = ('type', 'file', 'line', 'severity', 'description', 'details')
+
     def __init__(self, inspection_type: InspectionType, problem_severity: InspectionProblemSeverity,
                  problem_description: str, problem_file: str, problem_line: int, problem_details: str):
         """
@@ -186,9 +272,97 @@ class InspectionProblem:
         return f"{self.type} {self.details} at {self.file}:{self.line}"
 
 
+class ProblemTable(collections.abc.Sequence):
+    """
+    The ProblemTable class is a compact, column-oriented store of inspection problems.
+
+    Each problem is stored as a row of integers in typed arrays, with the inspection types, severities and strings
+    held once in lookup tables, since the same file paths and descriptions repeat across many problems. Indexing or
+    iterating the table returns InspectionProblem objects that share the stored values.
+    """
+
+    def __init__(self, problems: typing.Iterable[InspectionProblem] = ()):
+        """
+        Initialize instance of the ProblemTable class.
+
+        :param problems: initial problems
+        """
+        self._types = _ValueTable()
+        self._severities = _ValueTable()
+        self._files = _ValueTable()
+        self._descriptions = _ValueTable()
+        self._details = _ValueTable()
+
+        self._type_column = array.array('I')
+        self._severity_column = array.array('B')
+        self._file_column = array.array('I')
+        self._line_column = array.array('q')
+        self._description_column = array.array('I')
+        self._details_column = array.array('I')
+
+        self.extend(problems)
+
+    def append(self, problem: InspectionProblem):
+        """
+        Append a problem to the table.
+
+        :param problem: inspection problem
+        """
+        self._type_column.append(self._types.add(problem.type))
+        self._severity_column.append(self._severities.add(problem.severity))
+        self._file_column.append(self._files.add(problem.file))
+        self._line_column.append(problem.line)
+        self._description_column.append(self._descriptions.add(problem.description))
+        self._details_column.append(self._details.add(problem.details))
+
+    def extend(self, problems: typing.Iterable[InspectionProblem]):
+        """
+        Append problems to the table.
+
+        :param problems: inspection problems
+        """
+        for p in problems:
+            self.append(p)
+
+    def __len__(self):
+        return len(self._line_column)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        return InspectionProblem(self._types.values[self._type_column[index]],
+                                 self._severities.values[self._severity_column[index]],
+                                 self._descriptions.values[self._description_column[index]],
+                                 self._files.values[self._file_column[index]],
+                                 self._line_column[index],
+                                 self._details.values[self._details_column[index]])
+
+
+class _ValueTable:
+    """
+    Table of distinct values addressed by insertion index
+    """
+
+    __slots__ = ('values', 'indexes')
+
+    def __init__(self):
+        self.values = []
+        self.indexes = dict()
+
+    def add(self, value) -> int:
+        index = self.indexes.get(value)
+        if index is None:
+            index = self.indexes[value] = len(self.values)
+            self.values.append(value)
+        return index
+
+
 class InspectionResults:
     """
     TODO: needs class summary
+
+    Results are read from a results directory, or streamed from a results archive without extracting it.
     """
 
     profile: InspectionProfile
@@ -196,49 +370,213 @@ class InspectionResults:
     Inspection profile
     """
 
-    problems: typing.Sequence[InspectionProblem]
-    """
-    Inspection problems
-    """
-
-    def __init__(self, project_dir: str, results_dir: str, configuration: config.Configuration):
+    def __init__(self, project_dir: str, results_dir: str, configuration: config.Configuration, jobs: int = 1,
+                 use_cache: bool = False, suppressions: suppress.SuppressionMatcher = None,
+                 command_metrics: metrics.Metrics = None):
         """
         Initialize instance of the InspectionResults class.
 
-        :param results_dir: results directory
+        :param project_dir: project directory
+        :param results_dir: results directory or results archive
+        :param configuration: project configuration
+        :param jobs: number of parser processes (0 for one per CPU, ignored for archives)
+        :param use_cache: read and update the parsed results cache in the results directory (ignored for archives)
+        :param suppressions: suppressed problems are skipped while parsing and never loaded
+        :param command_metrics: metrics the parse phases are recorded in
         """
         self.project_dir = os.path.normpath(project_dir)
         self.results_dir = os.path.normpath(results_dir)
         self.configuration = configuration
+        self.jobs = jobs or os.cpu_count() or 1
+        self.use_cache = use_cache
+        self.suppressions = suppressions
+        self.metrics = command_metrics or metrics.Metrics('report')
+
+        self._cache = None
+        self._problems = None
+
+        self._archive = archive.ResultsArchive(self.results_dir) if archive.is_archive(self.results_dir) else None
 
         self._load_results()
 
+    @property
+    def problems(self) -> typing.Sequence[InspectionProblem]:
+        """
+        Inspection problems
+        """
+        if self._problems is None:
+            self._problems = self._load_results_inspection_problems()
+        return self._problems
+
+    def iter_problems(self, severities: typing.Collection[InspectionProblemSeverity] = None) \
+            -> typing.Iterator[InspectionProblem]:
+        """
+        Iterate over the inspection problems.
+
+        Problems are parsed incrementally from the results files, so only one problem is held in memory at a time.
+        When parsing with multiple jobs the results files are parsed by a process pool instead, and when the cache is
+        used only the results files that changed since the cache was written are parsed. In every case the problems
+        are yielded in the same order.
+
+        Results files of inspection types that are entirely suppressed are skipped without being read, and other
+        suppressed problems are discarded before they are loaded.
+
+        When severities are given, the results files most likely to hold problems of those severities are parsed
+        first (the ones whose first problem has one of the severities, largest first), so a consumer that stops early
+        sees them soonest. The problems are then not yielded in the usual order.
+
+        The results files of an archive are decompressed and parsed in a single pass in archive order, by this process
+        and without the cache.
+
+        :param severities: problem severities to parse first
+        """
+        return self.metrics.timed_iter('parse_problems', self._iter_problems(severities), 'problems')
+
+    def _iter_problems(self, severities: typing.Collection[InspectionProblemSeverity] = None) \
+            -> typing.Iterator[InspectionProblem]:
+        if self._archive is not None:
+            yield from self._iter_archived_problems()
+            return
+
+        results_files = list(self._iter_results_files())
+
+        if self.suppressions is not None:
+            results_files = [(n, f) for n, f in results_files if not self._is_suppressed_results_file(n, f)]
+
+        if severities:
+            severity_values = {s.value for s in severities}
+            results_files.sort(key=lambda r: _results_file_priority(r[1], severity_values))
+
+        if self._cache is not None:
+            problem_rows = self._load_problem_rows_cached(results_files)
+            if self.suppressions is not None:
+                problem_rows = ((r for r in rows if not _is_suppressed_problem_row(self.suppressions, r))
+                                for rows in problem_rows)
+        elif self.jobs > 1 and len(results_files) >= _PARALLEL_PARSE_THRESHOLD:
+            problem_rows = self._load_problem_rows_parallel(results_files, self.suppressions)
+        else:
+            problem_rows = self._load_problem_rows(results_files, self.suppressions)
+
+        for (inspection_name, problems_file), rows in zip(results_files, problem_rows):
+            inspection_type = self._find_inspection_type(inspection_name)
+            _LOG.debug(f"Parsing {inspection_type} problems from {problems_file}")
+            for row in rows:
+                yield InspectionProblem(inspection_type, *row)
+
+    def _iter_archived_problems(self) -> typing.Iterator[InspectionProblem]:
+        for inspection_name, fh in self._archive.iter_problems_files():
+            if self.suppressions is not None and self._is_suppressed_results_file(inspection_name, inspection_name):
+                continue
+            inspection_type = self._find_inspection_type(inspection_name)
+            _LOG.debug(f"Parsing {inspection_type} problems from {self.results_dir}")
+            for row in _iter_problem_rows_fromfile(self.project_dir, fh, self.suppressions):
+                yield InspectionProblem(inspection_type, *row)
+
+    def _is_suppressed_results_file(self, inspection_name: str, problems_file: str):
+        inspection_type = self._find_inspection_type(inspection_name)
+        if self.suppressions.is_suppressed_type(inspection_type):
+            _LOG.debug(f"Skipping {problems_file}, {inspection_type} is suppressed")
+            return True
+        return False
+
+    def _load_problem_rows(self, results_files: typing.Sequence[typing.Tuple[str, str]],
+                           suppressions: suppress.SuppressionMatcher = None):
+        """
+        Iterate over the problem rows of each results file, parsing the results files incrementally
+        """
+        for _, problems_file in results_files:
+            yield _iter_problem_rows_fromfile(self.project_dir, problems_file, suppressions)
+
+    def _load_problem_rows_parallel(self, results_files: typing.Sequence[typing.Tuple[str, str]],
+                                    suppressions: suppress.SuppressionMatcher = None):
+        """
+        Iterate over the problem rows of each results file, parsing the results files in a process pool
+        """
+        _LOG.debug(f"Parsing {len(results_files)} problems files with {self.jobs} jobs")
+
+        parse_rows = functools.partial(_parse_problem_rows_fromfile, self.project_dir, suppressions=suppressions)
+
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.jobs)
+        try:
+            yield from executor.map(parse_rows, [problems_file for _, problems_file in results_files])
+        finally:
+            # a consumer that stops early does not wait for the remaining files to be parsed
+            executor.shutdown(cancel_futures=True)
+
+    def _load_problem_rows_cached(self, results_files: typing.Sequence[typing.Tuple[str, str]]):
+        """
+        Return the problem rows of each results file, parsing only the results files missing from the cache
+        """
+        problem_rows = dict()
+
+        changed_files = []
+        changed_fingerprints = []
+        for inspection_name, problems_file in results_files:
+            fingerprint, rows = self._cache.lookup(problems_file)
+            if rows is None:
+                changed_files.append((inspection_name, problems_file))
+                changed_fingerprints.append(fingerprint)
+            else:
+                problem_rows[problems_file] = rows
+
+        _LOG.debug(f"Found {len(problem_rows)} cached problems files, parsing {len(changed_files)} problems files")
+
+        if self.jobs > 1 and len(changed_files) >= _PARALLEL_PARSE_THRESHOLD:
+            parsed_rows = self._load_problem_rows_parallel(changed_files)
+        else:
+            parsed_rows = (list(rows) for rows in self._load_problem_rows(changed_files))
+
+        for (_, problems_file), fingerprint, rows in zip(changed_files, changed_fingerprints, parsed_rows):
+            self._cache.update(problems_file, fingerprint, rows)
+            problem_rows[problems_file] = rows
+
+        if self._cache.modified:
+            self._cache.save()
+
+        return [problem_rows[problems_file] for _, problems_file in results_files]
+
     def _load_results(self):
-        self.profile = self._load_results_inspection_profile()
-        self.problems = self._load_results_inspection_problems()
+        if self.use_cache and self._archive is None:
+            self._cache = _ResultsCache.load(self.results_dir, self.project_dir)
+        with self.metrics.phase('parse_profile') as phase:
+            self.profile = self._load_results_inspection_profile()
+            phase.count('inspections', len(self.profile.inspections))
 
     def _load_results_inspection_profile(self):
+        if self._archive is not None:
+            _LOG.debug(f"Parsing descriptions of {self.results_dir}")
+            return self._parse_inspection_profile_xml(etree.fromstring(self._archive.read_descriptions()))
+
         profile_path = os.path.join(self.results_dir, '.descriptions.xml')
+
+        if self._cache is None:
+            _LOG.debug("Parsing {}".format(profile_path))
+            return self._parse_inspection_profile_fromfile(profile_path)
+
+        fingerprint, profile_data = self._cache.lookup(profile_path)
+        if profile_data is not None:
+            _LOG.debug("Loaded cached {}".format(profile_path))
+            return _restore_profile(profile_data)
+
         _LOG.debug("Parsing {}".format(profile_path))
         profile = self._parse_inspection_profile_fromfile(profile_path)
+
+        self._cache.update(profile_path, fingerprint, _dump_profile(profile))
+        self._cache.save()
+
         return profile
 
     def _find_inspection_type(self, inspection_name: str):
-        for group_name in self.profile.groups:
-            if inspection_name in self.profile.groups[group_name].inspections:
-                return self.profile.groups[group_name].inspections[inspection_name]
-        return None
+        return self.profile.inspections.get(inspection_name)
+
+    def _iter_results_files(self):
+        """
+        Iterate over the (inspection name, file path) of each problems file in the results directory
+        """
+        return _iter_results_files(self.results_dir)
 
     def _load_results_inspection_problems(self):
-        problems = []
-        for e in pathlib.Path(self.results_dir).iterdir():
-            if e.is_file() and e.suffix == '.xml':
-                problems_file = str(e)
-                inspection_name = e.stem
-                inspection_type = self._find_inspection_type(inspection_name)
-                _LOG.debug(f"Parsing {inspection_type} problems from {problems_file}")
-                problems.extend(self._parse_inspection_problems_fromfile(inspection_type, problems_file))
-        return problems
+        return ProblemTable(self.iter_problems())
 
     def _parse_inspection_profile_xml(self, e: etree.Element):
         """
@@ -302,27 +640,352 @@ class InspectionResults:
         """
         Parse problems XML element
         """
+        return [self._parse_inspection_problem_xml(inspection_type, c) for c in e.iter('problem')]
+
+    def _parse_inspection_problem_xml(self, inspection_type: InspectionType, e: etree.Element):
+        """
+        Parse a problem XML element
+        """
+        return InspectionProblem(inspection_type, *_parse_problem_row_xml(self.project_dir, e))
+
 
-        problems = []
+class PipelinedInspectionResults(InspectionResults):
+    """
+    The PipelinedInspectionResults class parses the results of an inspection while the inspector is still running.
 
-        for c in e.iter('problem'):
-            problem_class = c.find('problem_class')
-            problem_severity = InspectionProblemSeverity(problem_class.get('severity'))
-            problem_description = problem_class.text
+    Each problems file is parsed as soon as the inspector completes it, so parsing overlaps with the inspection. The
+    inspection profile is loaded once the inspector has written it; until then the parsed problem rows are held, and
+    they are yielded as problems as soon as it is loaded. Problems are yielded in the order the files are completed.
+    With multiple jobs, completed files are parsed by a process pool while the watcher waits for the next one.
+    """
 
-            problem_file = substitute(c.findtext('file'), {
-                'PROJECT_DIR': self.project_dir
-            })
-            problem_line = int(c.findtext('line'))
-            problem_details = c.findtext('description')
+    def __init__(self, project_dir: str, results_watcher: watch.ResultsWatcher, configuration: config.Configuration,
+                 jobs: int = 1, suppressions: suppress.SuppressionMatcher = None,
+                 command_metrics: metrics.Metrics = None):
+        """
+        Initialize instance of the PipelinedInspectionResults class.
+
+        :param project_dir: project directory
+        :param results_watcher: watcher of the results directory of the running inspection
+        :param configuration: project configuration
+        :param jobs: number of parser processes (0 for one per CPU)
+        :param suppressions: suppressed problems are skipped while parsing and never loaded
+        :param command_metrics: metrics the parse phases are recorded in
+        """
+        self.results_watcher = results_watcher
+        super().__init__(project_dir, results_watcher.results_dir, configuration,
+                         jobs=jobs,
+                         suppressions=suppressions,
+                         command_metrics=command_metrics)
 
-            problem = InspectionProblem(inspection_type,
-                                        problem_severity,
-                                        problem_description,
-                                        problem_file,
-                                        problem_line,
-                                        problem_details)
+    def _load_results(self):
+        # the inspection profile is loaded once the inspector has written it
+        self.profile = None
+
+    def _iter_problems(self, severities: typing.Collection[InspectionProblemSeverity] = None) \
+            -> typing.Iterator[InspectionProblem]:
+        pending_rows = []
+
+        # files being parsed by the process pool, in the order they were completed
+        parsing_files = collections.deque()
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.jobs) if self.jobs > 1 else None
+        try:
+            completed_files = self.results_watcher.iter_completed_files()
+            while True:
+                with self.metrics.phase('wait_inspector') as phase:
+                    completed_file = next(completed_files, None)
+                    if completed_file is None:
+                        break
+                    phase.count('files')
+
+                inspection_name, problems_file = completed_file
+                _LOG.debug(f"Parsing {inspection_name} problems from {problems_file}")
+                if executor is None:
+                    pending_rows.append((inspection_name, list(_iter_problem_rows_fromfile(
+                        self.project_dir, problems_file, self.suppressions))))
+                else:
+                    parsing_files.append((inspection_name, executor.submit(
+                        _parse_problem_rows_fromfile, self.project_dir, problems_file, self.suppressions)))
+                    while parsing_files and parsing_files[0][1].done():
+                        inspection_name, future = parsing_files.popleft()
+                        pending_rows.append((inspection_name, future.result()))
+
+                if self.profile is None and watch.is_complete_xml_file(self._profile_path(), 'inspections'):
+                    self._load_profile()
+
+                if self.profile is not None:
+                    yield from self._iter_pending_problems(pending_rows)
+                    pending_rows = []
+
+            for inspection_name, future in parsing_files:
+                pending_rows.append((inspection_name, future.result()))
+        finally:
+            if executor is not None:
+                # a consumer that stops early does not wait for the remaining files to be parsed
+                executor.shutdown(cancel_futures=True)
+
+        if self.profile is None:
+            self._load_profile()
+        yield from self._iter_pending_problems(pending_rows)
+
+    def _profile_path(self) -> str:
+        return os.path.join(self.results_dir, '.descriptions.xml')
+
+    def _load_profile(self):
+        with self.metrics.phase('parse_profile') as phase:
+            self.profile = self._load_results_inspection_profile()
+            phase.count('inspections', len(self.profile.inspections))
+
+    def _iter_pending_problems(self, pending_rows: typing.Sequence[typing.Tuple[str, typing.Sequence[tuple]]]):
+        for inspection_name, rows in pending_rows:
+            inspection_type = self._find_inspection_type(inspection_name)
+            if self.suppressions is not None and self.suppressions.is_suppressed_type(inspection_type):
+                _LOG.debug(f"Skipping {inspection_name} problems, {inspection_type} is suppressed")
+                continue
+            for row in rows:
+                yield InspectionProblem(inspection_type, *row)
+
+
+class _ResultsFileFingerprint(typing.NamedTuple):
+    size: int
+    mtime_ns: int
+    digest: str
+
+
+class _ResultsCache:
+    """
+    On-disk cache of parsed results files, stored in the results directory.
+
+    Entries are keyed by results file name and validated against the file size, modification time and content hash,
+    so a results file that is touched without being changed is not parsed again. Entries are stored with marshal,
+    which is fast to load and, unlike pickle, cannot construct arbitrary objects.
+    """
+
+    def __init__(self, cache_path: str, project_dir: str, entries: typing.MutableMapping[str, tuple]):
+        self.cache_path = cache_path
+        self.project_dir = project_dir
+        self.entries = entries
+        self.modified = False
+
+    @classmethod
+    def load(cls, results_dir: str, project_dir: str) -> '_ResultsCache':
+        cache_path = os.path.join(results_dir, history.RESULTS_CACHE_FILENAME)
+
+        entries = dict()
+        try:
+            with open(cache_path, 'rb') as fh:
+                cache_data = marshal.load(fh)
+            if cache_data['version'] == _RESULTS_CACHE_VERSION and cache_data['project_dir'] == project_dir:
+                entries = cache_data['entries']
+        except FileNotFoundError:
+            pass
+        except (OSError, EOFError, ValueError, TypeError, KeyError) as ex:
+            _LOG.debug(f"Ignoring unreadable results cache {cache_path}: {ex}")
+
+        return cls(cache_path, project_dir, entries)
+
+    def lookup(self, file: str):
+        """
+        Return the (fingerprint, value) of a results file, value is None when the file is not cached or changed
+        """
+        entry = self.entries.get(os.path.basename(file))
+        cached_fingerprint = _ResultsFileFingerprint(*entry[0]) if entry is not None else None
+
+        fingerprint = _fingerprint_file(file, cached_fingerprint)
+        if cached_fingerprint is None or fingerprint.digest != cached_fingerprint.digest:
+            return fingerprint, None
+
+        if fingerprint != cached_fingerprint:
+            # the file was touched without being changed
+            self.entries[os.path.basename(file)] = (tuple(fingerprint), entry[1])
+            self.modified = True
+
+        return fingerprint, self._restore(entry[1])
+
+    def update(self, file: str, fingerprint: _ResultsFileFingerprint, value):
+        """
+        Store the value of a results file, fingerprint must be taken before the file is parsed
+        """
+        if isinstance(value, list):
+            value = [(r[0].value,) + tuple(r[1:]) for r in value]
+        self.entries[os.path.basename(file)] = (tuple(fingerprint), value)
+        self.modified = True
+
+    def save(self):
+        cache_data = {
+            'version': _RESULTS_CACHE_VERSION,
+            'project_dir': self.project_dir,
+            'entries': self.entries,
+        }
+        try:
+            with atomic_write(self.cache_path, 'wb') as fh:
+                marshal.dump(cache_data, fh)
+        except OSError as ex:
+            _LOG.debug(f"Unable to write results cache {self.cache_path}: {ex}")
+            return
+
+        self.modified = False
+
+        _LOG.debug(f"Wrote results cache {self.cache_path}")
+
+    @staticmethod
+    def _restore(value):
+        if isinstance(value, list):
+            severities = {s.value: s for s in InspectionProblemSeverity}
+            return [(severities[r[0]],) + tuple(r[1:]) for r in value]
+        return value
+
+
+def _fingerprint_file(file: str, cached_fingerprint: _ResultsFileFingerprint = None) -> _ResultsFileFingerprint:
+    """
+    Return the fingerprint of a results file, the content is only hashed when the size or mtime changed
+    """
+    st = os.stat(file)
+
+    if (cached_fingerprint is not None and
+            cached_fingerprint.size == st.st_size and
+            cached_fingerprint.mtime_ns == st.st_mtime_ns):
+        return cached_fingerprint
+
+    digest = hashlib.sha1()
+    with open(file, 'rb') as fh:
+        for chunk in iter(functools.partial(fh.read, 1024 * 1024), b''):
+            digest.update(chunk)
+
+    return _ResultsFileFingerprint(st.st_size, st.st_mtime_ns, digest.hexdigest())
+
+
+def _dump_profile(profile: InspectionProfile):
+    """
+    Convert an inspection profile into builtin types for the results cache
+    """
+    return (profile.name, [(g.name, [(t.name, t.title, t.description, t.enabled) for t in g.inspections.values()])
+                           for g in profile.groups.values()])
+
+
+def _restore_profile(profile_data) -> InspectionProfile:
+    """
+    Convert an inspection profile from builtin types stored in the results cache
+    """
+    profile_name, groups_data = profile_data
+
+    profile = InspectionProfile(profile_name)
+    for group_name, inspections_data in groups_data:
+        group = InspectionGroup(profile, group_name)
+        for inspection_data in inspections_data:
+            InspectionType(group, *inspection_data)
 
-            problems.append(problem)
+    return profile
 
-        return problems
+
+def _intern(value: typing.Optional[str]):
+    """
+    Intern a repeated problem string so that all problems share a single copy
+    """
+    return sys.intern(value) if value is not None else None
+
+
+def _iter_results_files(results_dir: str):
+    """
+    Iterate over the (inspection name, file path) of each problems file in a results directory
+    """
+    for e in sorted(pathlib.Path(results_dir).iterdir()):
+        if e.is_file() and e.suffix == '.xml' and e.name != '.descriptions.xml':
+            yield e.stem, str(e)
+
+
+def _results_file_priority(file: str, severity_values: typing.Collection[str]) -> typing.Tuple[int, int]:
+    """
+    Return the sort key of a problems file, ordering files whose first problem has one of the severities first, then
+    larger files first
+    """
+    try:
+        with open(file, 'rb') as fh:
+            head = fh.read(_SEVERITY_PEEK_SIZE)
+            size = os.fstat(fh.fileno()).st_size
+    except OSError:
+        return 1, 0
+
+    match = _SEVERITY_PATTERN.search(head)
+    has_severity = match is not None and match.group(1).decode('utf-8', 'replace') in severity_values
+    return (0 if has_severity else 1), -size
+
+
+def _merge_problems_files(merged_file: str,
+                          problems_files: typing.Sequence[typing.Tuple[str, typing.Optional[typing.Callable]]]):
+    """
+    Write the filtered problems of one or more problems files into a single problems file
+    """
+    merged_count = 0
+
+    with etree.xmlfile(merged_file, encoding='utf-8') as xf:
+        with xf.element('problems', is_local_tool='true'):
+            xf.write('\n')
+            for problems_file, problem_filter in problems_files:
+                for _, e in etree.iterparse(problems_file, events=('end',), tag='problem'):
+                    if problem_filter is None or problem_filter(e.findtext('file')):
+                        e.tail = '\n'
+                        xf.write(e)
+                        merged_count += 1
+
+                    # release the written element and any preceding siblings
+                    e.clear()
+                    while e.getprevious() is not None:
+                        del e.getparent()[0]
+
+    return merged_count
+
+
+def _is_suppressed_problem_row(suppressions: suppress.SuppressionMatcher, row: tuple):
+    """
+    Return True if a problem row is suppressed by severity or file
+    """
+    return suppressions.is_suppressed_severity(row[0]) or suppressions.is_suppressed_file(row[2])
+
+
+def _parse_problem_row_xml(project_dir: str, e: etree.Element, suppressions: suppress.SuppressionMatcher = None):
+    """
+    Parse a problem XML element into a tuple of InspectionProblem arguments (excluding the inspection type), or None
+    if the problem is suppressed
+    """
+
+    problem_class = e.find('problem_class')
+    problem_severity = InspectionProblemSeverity(problem_class.get('severity'))
+    if suppressions is not None and suppressions.is_suppressed_severity(problem_severity):
+        return None
+
+    problem_file = substitute(e.findtext('file'), {
+        'PROJECT_DIR': project_dir
+    })
+    if suppressions is not None and suppressions.is_suppressed_file(problem_file):
+        return None
+
+    problem_file = _intern(problem_file)
+    problem_description = _intern(problem_class.text)
+    problem_line = int(e.findtext('line'))
+    problem_details = _intern(e.findtext('description'))
+
+    return problem_severity, problem_description, problem_file, problem_line, problem_details
+
+
+def _iter_problem_rows_fromfile(project_dir: str, file: typing.Union[str, typing.BinaryIO],
+                                suppressions: suppress.SuppressionMatcher = None):
+    """
+    Parse problem rows from a problems XML file (or file object) incrementally
+    """
+    for _, e in etree.iterparse(file, events=('end',), tag='problem'):
+        row = _parse_problem_row_xml(project_dir, e, suppressions)
+        if row is not None:
+            yield row
+
+        # release the parsed element and any preceding siblings
+        e.clear()
+        while e.getprevious() is not None:
+            del e.getparent()[0]
+
+
+def _parse_problem_rows_fromfile(project_dir: str, file: str, suppressions: suppress.SuppressionMatcher = None):
+    """
+    Parse problem rows from a problems XML file (used by parser worker processes)
+    """
+    return list(_iter_problem_rows_fromfile(project_dir, file, suppressions))
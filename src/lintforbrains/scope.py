@@ -0,0 +1,170 @@
+import re
+import typing
+
+from lintforbrains import logging
+from lintforbrains.utilities import translate_glob_part
+
+_LOG = logging.get_logger(__name__)
+
+_CHARACTER_CLASS_PATTERN = re.compile(r'\[!?\]?[^\]]*\]')
+
+
+class FileScope:
+    """
+    The FileScope class selects the project files to inspect with include and exclude globs.
+
+    Globs are relative to the project directory and match whole paths: *, ? and [...] do not match across directories,
+    and ** matches any number of directories (so vendor/** matches every file below vendor). Path components are
+    matched like report suppressions. A file is in the scope if it is in the source directory, matches an include glob
+    (or there are none) and matches no exclude glob.
+
+    The scope is passed to the inspector as an IDE scope pattern, so files outside of it are never inspected. IDE
+    patterns have no character classes, so a [...] is passed as ?, which widens the glob. Widened include globs only
+    inspect more files, but widened exclude globs would skip files in the scope, so exclude globs with character
+    classes are left out of the IDE scope pattern (with a warning) and their files are inspected.
+    """
+
+    def __init__(self, include_files: typing.Iterable[str] = None, exclude_files: typing.Iterable[str] = None,
+                 source_dir: str = None):
+        """
+        Initialize instance of the FileScope class.
+
+        :param include_files: included file globs
+        :param exclude_files: excluded file globs
+        :param source_dir: source directory, relative to the project directory (None for the project directory)
+        """
+        self.include_files = [g for g in include_files or [] if g]
+        self.exclude_files = [g for g in exclude_files or [] if g]
+        self.source_dir = _normalize_glob(source_dir) if source_dir else None
+        if self.source_dir in ('', '.'):
+            self.source_dir = None
+
+        self._include_regex = _compile_globs(self.include_files)
+        self._exclude_regex = _compile_globs(self.exclude_files)
+        self._excluded_dirs_regex = _compile_globs([g[:-len('/**')] for g in map(_normalize_glob, self.exclude_files)
+                                                    if g.endswith('/**')])
+
+        self._pattern_exclude_files = []
+        for g in self.exclude_files:
+            if _CHARACTER_CLASS_PATTERN.search(g):
+                _LOG.warning(f"Exclude glob {g} has character classes, which IDE scopes cannot match exactly, so the "
+                             f"files it excludes are still inspected")
+            else:
+                self._pattern_exclude_files.append(g)
+
+    @property
+    def is_restricted(self) -> bool:
+        """
+        True if there are include or exclude globs
+        """
+        return bool(self.include_files or self.exclude_files)
+
+    def contains(self, file: str) -> bool:
+        """
+        Return True if a file (relative to the project directory) is in the scope.
+        """
+        if self.source_dir is not None and not file.startswith(self.source_dir + '/'):
+            return False
+        if self._include_regex is not None and self._include_regex.match(file) is None:
+            return False
+        if self._exclude_regex is not None and self._exclude_regex.match(file) is not None:
+            return False
+        return True
+
+    def excludes_dir(self, dir_path: str) -> bool:
+        """
+        Return True if every file below a directory (relative to the project directory) is excluded, so it need not
+        be walked.
+        """
+        return self._excluded_dirs_regex is not None and self._excluded_dirs_regex.match(dir_path) is not None
+
+    def to_pattern(self) -> typing.Optional[str]:
+        """
+        Return the IDE scope pattern of the scope, or None if it is not restricted.
+        """
+        if not self.is_restricted:
+            return None
+
+        terms = []
+        if self.source_dir is not None:
+            terms.append(f"file:{self.source_dir}//*")
+        if self.include_files:
+            terms.append(_any_file_pattern(self.include_files))
+        terms.extend(f"!{_any_file_pattern([g])}" for g in self._pattern_exclude_files)
+
+        return '&&'.join(terms)
+
+
+def intersect_scope_patterns(*patterns: typing.Optional[str]) -> typing.Optional[str]:
+    """
+    Return an IDE scope pattern that matches the files matched by every one of the given patterns (None patterns
+    match every file).
+    """
+    patterns = [p for p in patterns if p]
+    if len(patterns) < 2:
+        return patterns[0] if patterns else None
+    return '&&'.join(f"({p})" for p in patterns)
+
+
+def _normalize_glob(glob: str) -> str:
+    """
+    Strip the leading ./ and slashes of a glob, and the trailing slashes
+    """
+    while glob.startswith('./'):
+        glob = glob[2:]
+    return glob.strip('/')
+
+
+def _any_file_pattern(globs: typing.Sequence[str]) -> str:
+    """
+    Return an IDE scope pattern that matches the files matched by any of the given globs
+    """
+    file_patterns = [f"file:{p}" for g in globs for p in _translate_scope_glob(g)]
+    return file_patterns[0] if len(file_patterns) == 1 else f"({'||'.join(file_patterns)})"
+
+
+def _translate_scope_glob(glob: str) -> typing.List[str]:
+    """
+    Translate a glob into IDE file patterns, in which // matches any number of directories
+    """
+    parts = [_CHARACTER_CLASS_PATTERN.sub('?', p) for p in _normalize_glob(glob).split('/')]
+
+    leading_recursive = parts[0] == '**'
+    if leading_recursive:
+        parts = parts[1:]
+
+    # a trailing ** matches every file below the directory
+    if not parts or parts[-1] == '**':
+        parts.append('*')
+
+    pattern = '/'.join(parts)
+    while '/**/' in pattern:
+        pattern = pattern.replace('/**/', '//')
+
+    # the IDE needs a directory before //, so a leading ** is also matched as no directories
+    if leading_recursive:
+        return [pattern, f"*//{pattern}"]
+    return [pattern]
+
+
+def _compile_globs(globs: typing.Sequence[str]) -> typing.Optional[typing.Pattern]:
+    """
+    Compile globs into a single regular expression that matches whole paths
+    """
+    if not globs:
+        return None
+
+    regexes = []
+    for glob in globs:
+        parts = _normalize_glob(glob).split('/')
+        regex = []
+        for i, part in enumerate(parts):
+            last = i == len(parts) - 1
+            if part == '**':
+                regex.append('.*' if last else '(?:[^/]+/)*')
+            else:
+                regex.append(translate_glob_part(part) + ('' if last else '/'))
+        regexes.append(''.join(regex))
+
+    return re.compile('(?:' + '|'.join(f"(?:{r})" for r in regexes) + r')\Z', re.DOTALL)
+
@@ -0,0 +1,516 @@
+import collections
+import concurrent.futures
+import http.client
+import http.server
+import itertools
+import json
+import os
+import re
+import signal
+import socket
+import socketserver
+import threading
+import time
+import typing
+import urllib.parse
+
+import click
+
+from lintforbrains import cache
+from lintforbrains import config
+from lintforbrains import inspect
+from lintforbrains import logging
+from lintforbrains.utilities import abort
+
+_LOG = logging.get_logger(__name__)
+
+_SERVER_SOCKET_FILENAME = 'server.sock'
+
+_JOB_POLL_TIMEOUT = 30
+
+_JOB_QUEUED = 'queued'
+_JOB_RUNNING = 'running'
+_JOB_SUCCEEDED = 'succeeded'
+_JOB_FAILED = 'failed'
+_JOB_CANCELLED = 'cancelled'
+
+_JOB_FINISHED = (_JOB_SUCCEEDED, _JOB_FAILED, _JOB_CANCELLED)
+
+# finished jobs kept for clients to query, the oldest are dropped first
+_MAX_FINISHED_JOBS = 1000
+
+
+def run_serve(pycharm_version: str, pycharm_edition: str, pycharm_home_dir: str, pycharm_config_dir: str,
+              python_bin: str, debug_level: int, cache_dir: str, jobs: int = 1, socket_path: str = None,
+              sandbox: bool = False) -> int:
+    """
+    Run the serve command
+    """
+
+    # create inspector factory
+    def _inspector_factory(pycharm_system_dir: typing.Optional[str]):
+        return inspect.Inspector(pycharm_version,
+                                 pycharm_edition,
+                                 pycharm_home_dir,
+                                 pycharm_config_dir,
+                                 python_bin,
+                                 debug_level,
+                                 cache_dir=cache_dir,
+                                 pycharm_system_dir=pycharm_system_dir,
+                                 sandbox=sandbox)
+
+    server = InspectionServer(socket_path or server_socket_path(cache_dir),
+                              _inspector_factory,
+                              jobs=jobs,
+                              system_dir_root=os.path.join(cache_dir, 'system'))
+
+    click.echo(f"Serving inspections on {server.socket_path}")
+
+    # stop like on ctrl-c when the container is stopped
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+    return 0
+
+
+def run_inspect_client(socket_path: str, project_dir: str, config_file: str, incremental: bool = False,
+                       since: str = None, shards: int = 1, prune_profile: bool = None) -> int:
+    """
+    Run the inspect command through the inspection server
+    """
+
+    client = InspectionClient(socket_path)
+
+    try:
+        job = client.submit(project_dir, config_file, incremental=incremental, since=since, shards=shards,
+                            prune_profile=prune_profile)
+        click.echo(f"Submitted inspection job {job['id']} to {socket_path}")
+
+        status = job['status']
+        while job['status'] not in _JOB_FINISHED:
+            job = client.wait(job['id'], job['status'])
+            if job['status'] != status:
+                status = job['status']
+                click.echo(f"Inspection job {job['id']} {status}")
+    except InspectionServerError as ex:
+        return abort(str(ex))
+
+    if job['status'] != _JOB_SUCCEEDED:
+        return abort(f"Inspection job {job['id']} {job['status']}: {job['error']}")
+
+    click.echo(f"Inspection results written to {job['results_dir']}")
+
+    return 0
+
+
+def server_socket_path(cache_dir: str) -> str:
+    """
+    Return the default socket path of the inspection server
+    """
+    return os.path.join(cache_dir, _SERVER_SOCKET_FILENAME)
+
+
+def find_server(socket_path: str) -> typing.Optional[str]:
+    """
+    Return the socket path if an inspection server is listening on it, or None
+    """
+    if not os.path.exists(socket_path):
+        return None
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except OSError:
+            return None
+
+    return socket_path
+
+
+class InspectionServerError(Exception):
+    pass
+
+
+class InspectionJob:
+    """
+    The InspectionJob class tracks an inspection queued on the server.
+    """
+
+    def __init__(self, job_id: str, project_dir: str, config_file: str, incremental: bool, since: typing.Optional[str],
+                 shards: int, prune_profile: typing.Optional[bool] = None):
+        """
+        Initialize instance of the InspectionJob class.
+
+        :param job_id: job id
+        :param project_dir: project directory
+        :param config_file: project configuration file
+        :param incremental: only inspect files changed since the previous results
+        :param since: git ref to find changed files from
+        :param shards: number of concurrent inspector processes
+        :param prune_profile: disable the inspections whose problems are all suppressed (None to use the configuration)
+        """
+        self.id = job_id
+        self.project_dir = project_dir
+        self.config_file = config_file
+        self.incremental = incremental
+        self.since = since
+        self.shards = shards
+        self.prune_profile = prune_profile
+        self.status = _JOB_QUEUED
+        self.results_dir = None
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+
+    def to_dict(self) -> typing.Dict[str, typing.Any]:
+        return {
+            'id': self.id,
+            'project_dir': self.project_dir,
+            'config_file': self.config_file,
+            'status': self.status,
+            'results_dir': self.results_dir,
+            'error': self.error,
+            'submitted': self.submitted,
+            'started': self.started,
+            'finished': self.finished,
+        }
+
+
+class InspectionServer:
+    """
+    The InspectionServer class runs queued inspection jobs for clients connected over a Unix socket.
+
+    Jobs run on a bounded pool of worker threads. Jobs for the same project run one at a time: each project has its
+    own job queue, and only the job at its head is dispatched to a worker, so queued jobs never hold a worker. Each
+    project keeps its own IDE system directory, so its caches and indexes stay warm between jobs.
+    """
+
+    def __init__(self, socket_path: str, inspector_factory: typing.Callable[[typing.Optional[str]], inspect.Inspector],
+                 jobs: int = 1, system_dir_root: str = None, max_finished_jobs: int = _MAX_FINISHED_JOBS):
+        """
+        Initialize instance of the InspectionServer class.
+
+        :param socket_path: server socket path
+        :param inspector_factory: returns an inspector for a system directory (None for the configured one)
+        :param jobs: number of concurrent inspection jobs
+        :param system_dir_root: directory of the per-project system directories (None to share one)
+        :param max_finished_jobs: number of finished jobs kept for clients to query
+        """
+        self.socket_path = socket_path
+        self.inspector_factory = inspector_factory
+        self.system_dir_root = system_dir_root
+        self.max_finished_jobs = max_finished_jobs
+
+        self._jobs = collections.OrderedDict()
+        self._job_ids = itertools.count(1)
+        self._job_changed = threading.Condition()
+        self._project_jobs = dict()
+
+        if find_server(socket_path):
+            raise InspectionServerError(f"Inspection server is already running on {socket_path}")
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        os.makedirs(os.path.dirname(os.path.abspath(socket_path)), exist_ok=True)
+
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=jobs, thread_name_prefix='inspection')
+        self._http_server = _UnixHTTPServer(socket_path, _InspectionRequestHandler)
+        self._http_server.inspection_server = self
+
+    def serve_forever(self):
+        self._http_server.serve_forever()
+
+    def shutdown(self):
+        self._http_server.shutdown()
+
+    def close(self):
+        """
+        Stop accepting jobs, wait for the running jobs, cancel the queued jobs and remove the server socket.
+        """
+        self._http_server.server_close()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+        with self._job_changed:
+            queued_jobs = [j for j in self._jobs.values() if j.status == _JOB_QUEUED]
+        for job in queued_jobs:
+            self._set_job_status(job, _JOB_CANCELLED, finished=time.time(), error="The inspection server stopped")
+
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+    def submit(self, project_dir: str, config_file: str, incremental: bool = False, since: str = None,
+               shards: int = 1, prune_profile: bool = None) -> InspectionJob:
+        """
+        Queue an inspection job.
+        """
+        project_key = os.path.realpath(project_dir)
+
+        with self._job_changed:
+            job = InspectionJob(str(next(self._job_ids)), project_dir, config_file, incremental, since, shards,
+                                prune_profile)
+            self._jobs[job.id] = job
+            project_jobs = self._project_jobs.setdefault(project_key, collections.deque())
+            project_jobs.append(job)
+            dispatch = len(project_jobs) == 1
+
+        _LOG.info(f"Queued inspection job {job.id} for {project_dir}")
+
+        if dispatch:
+            self._dispatch_project(project_key)
+        return job
+
+    def get_job(self, job_id: str) -> typing.Optional[InspectionJob]:
+        with self._job_changed:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self) -> typing.List[InspectionJob]:
+        with self._job_changed:
+            return list(self._jobs.values())
+
+    def wait_job(self, job: InspectionJob, status: str, timeout: float) -> InspectionJob:
+        """
+        Wait until the status of a job is no longer the given status, or until the timeout expires.
+        """
+        with self._job_changed:
+            self._job_changed.wait_for(lambda: job.status != status, timeout=timeout)
+            return job
+
+    def _set_job_status(self, job: InspectionJob, status: str, **kwargs):
+        with self._job_changed:
+            job.status = status
+            for key, value in kwargs.items():
+                setattr(job, key, value)
+            if status in _JOB_FINISHED:
+                self._drop_finished_jobs()
+            self._job_changed.notify_all()
+
+    def _drop_finished_jobs(self):
+        """
+        Drop the oldest finished jobs beyond the number kept, must be called with the job condition held
+        """
+        finished_job_ids = [i for i, j in self._jobs.items() if j.status in _JOB_FINISHED]
+        for job_id in finished_job_ids[:max(len(finished_job_ids) - self.max_finished_jobs, 0)]:
+            del self._jobs[job_id]
+
+    def _dispatch_project(self, project_key: str):
+        """
+        Run the job at the head of the queue of a project on a worker
+        """
+        try:
+            self._executor.submit(self._run_project_job, project_key)
+        except RuntimeError:
+            # the server is closing, and cancels the queued jobs
+            _LOG.debug(f"Not running the queued jobs of {project_key}, the server is closing")
+
+    def _run_project_job(self, project_key: str):
+
+        # jobs of one project share its results and system dirs, so the next job is only dispatched once this one
+        # finished, behind the jobs of other projects
+        with self._job_changed:
+            job = self._project_jobs[project_key][0]
+        try:
+            self._run_job(job)
+        finally:
+            with self._job_changed:
+                project_jobs = self._project_jobs[project_key]
+                project_jobs.popleft()
+                if not project_jobs:
+                    del self._project_jobs[project_key]
+            if project_jobs:
+                self._dispatch_project(project_key)
+
+    def _run_job(self, job: InspectionJob):
+        self._set_job_status(job, _JOB_RUNNING, started=time.time())
+        _LOG.info(f"Running inspection job {job.id} for {job.project_dir}")
+
+        try:
+            project_config = config.load_config(job.config_file)
+
+            inspector = self.inspector_factory(self._project_system_dir(job.project_dir, project_config))
+
+            results_dir = inspector.run(job.project_dir,
+                                        project_config,
+                                        incremental=job.incremental,
+                                        since=job.since,
+                                        shards=job.shards,
+                                        prune_profile=job.prune_profile)
+        except Exception as ex:
+            _LOG.exception(f"Inspection job {job.id} failed")
+            self._set_job_status(job, _JOB_FAILED, finished=time.time(), error=str(ex) or type(ex).__name__)
+        else:
+            _LOG.info(f"Inspection job {job.id} succeeded")
+            self._set_job_status(job, _JOB_SUCCEEDED, finished=time.time(), results_dir=results_dir)
+
+    def _project_system_dir(self, project_dir: str, project_config: config.Configuration) -> typing.Optional[str]:
+        """
+        Return the system directory of a project, or None if the project configures its own
+        """
+        if self.system_dir_root is None or project_config.inspect.system_dir:
+            return None
+
+        return cache.project_system_dir(self.system_dir_root, project_dir)
+
+
+class InspectionClient:
+    """
+    The InspectionClient class submits inspection jobs to an inspection server.
+    """
+
+    def __init__(self, socket_path: str, timeout: float = _JOB_POLL_TIMEOUT):
+        """
+        Initialize instance of the InspectionClient class.
+
+        :param socket_path: server socket path
+        :param timeout: seconds a status request waits for the job status to change
+        """
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def submit(self, project_dir: str, config_file: str, incremental: bool = False, since: str = None,
+               shards: int = 1, prune_profile: bool = None) -> typing.Dict[str, typing.Any]:
+        """
+        Submit an inspection job and return the job.
+        """
+        return self._request('POST', '/jobs', {
+            'project_dir': os.path.abspath(project_dir),
+            'config_file': os.path.abspath(config_file),
+            'incremental': incremental,
+            'since': since,
+            'shards': shards,
+            'prune_profile': prune_profile,
+        })
+
+    def get(self, job_id: str) -> typing.Dict[str, typing.Any]:
+        """
+        Return a job.
+        """
+        return self._request('GET', f"/jobs/{job_id}")
+
+    def wait(self, job_id: str, status: str = None) -> typing.Dict[str, typing.Any]:
+        """
+        Return a job once its status changes (from the given status, by default from its current status), or once
+        the timeout expires.
+        """
+        if status is None:
+            status = self.get(job_id)['status']
+        query = urllib.parse.urlencode({'status': status, 'timeout': self.timeout})
+        return self._request('GET', f"/jobs/{job_id}?{query}")
+
+    def _request(self, method: str, path: str, body: typing.Mapping[str, typing.Any] = None):
+        connection = _UnixHTTPConnection(self.socket_path, timeout=self.timeout + 10)
+        try:
+            headers = {'Content-Type': 'application/json'}
+            connection.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+            response = connection.getresponse()
+            data = json.loads(response.read().decode('utf-8'))
+        except (OSError, http.client.HTTPException, ValueError) as ex:
+            raise InspectionServerError(f"Error requesting {method} {path} from {self.socket_path}: {ex}") from ex
+        finally:
+            connection.close()
+
+        if response.status >= 400:
+            raise InspectionServerError(f"Error requesting {method} {path}: {data.get('error')}")
+
+        return data
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    inspection_server: InspectionServer
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+
+    def __init__(self, socket_path: str, timeout: float = None):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class _InspectionRequestHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Handles the inspection server API:
+
+    POST /jobs              queue a job
+    GET  /jobs              list the jobs
+    GET  /jobs/<id>         return a job, waiting for its status to change from ?status= for up to ?timeout= seconds
+    """
+
+    server: _UnixHTTPServer
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        query = urllib.parse.parse_qs(url.query)
+
+        if url.path == '/jobs':
+            return self._send_json(200, [j.to_dict() for j in self.server.inspection_server.list_jobs()])
+
+        m = re.fullmatch(r'/jobs/([^/]+)', url.path)
+        if not m:
+            return self._send_json(404, {'error': f"Not found: {url.path}"})
+
+        job = self.server.inspection_server.get_job(m.group(1))
+        if job is None:
+            return self._send_json(404, {'error': f"No such job: {m.group(1)}"})
+
+        if 'status' in query:
+            try:
+                timeout = min(float(query.get('timeout', [_JOB_POLL_TIMEOUT])[0]), _JOB_POLL_TIMEOUT)
+            except ValueError:
+                return self._send_json(400, {'error': "Invalid timeout"})
+            job = self.server.inspection_server.wait_job(job, query['status'][0], timeout)
+
+        return self._send_json(200, job.to_dict())
+
+    def do_POST(self):
+        url = urllib.parse.urlsplit(self.path)
+        if url.path != '/jobs':
+            return self._send_json(404, {'error': f"Not found: {url.path}"})
+
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8'))
+            project_dir = body['project_dir']
+            config_file = body['config_file']
+            shards = body.get('shards')
+            if shards is None:
+                shards = 1
+            elif type(shards) is not int or shards < 1:
+                raise ValueError(f"shards must be a positive integer, not {shards!r}")
+        except (ValueError, KeyError, TypeError) as ex:
+            return self._send_json(400, {'error': f"Invalid job: {ex}"})
+
+        if not os.path.isdir(project_dir):
+            return self._send_json(400, {'error': f"No such project directory: {project_dir}"})
+
+        job = self.server.inspection_server.submit(project_dir,
+                                                   config_file,
+                                                   incremental=bool(body.get('incremental')),
+                                                   since=body.get('since'),
+                                                   shards=shards,
+                                                   prune_profile=body.get('prune_profile'))
+
+        return self._send_json(202, job.to_dict())
+
+    def _send_json(self, status: int, data):
+        content = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def address_string(self):
+        return self.server.server_address
+
+    def log_message(self, format, *args):
+        _LOG.debug(format % args)
@@ -0,0 +1,125 @@
+import pathlib
+import re
+import typing
+
+from lintforbrains import logging
+from lintforbrains.utilities import translate_glob_part
+
+_LOG = logging.get_logger(__name__)
+
+
+class SuppressionMatcher:
+    """
+    The SuppressionMatcher class matches inspection problems against the report suppression rules.
+
+    The rules are compiled once: the file globs into a single regular expression and the severity and problem rules
+    into sets. Results are memoized per file path and per inspection type, since both repeat across many problems.
+    """
+
+    def __init__(self,
+                 suppress_severity: typing.Iterable[str] = None,
+                 suppress_files: typing.Iterable[str] = None,
+                 suppress_problems: typing.Iterable[str] = None):
+        """
+        Initialize instance of the SuppressionMatcher class.
+
+        :param suppress_severity: suppressed problem severities (e.g. TYPO)
+        :param suppress_files: suppressed file globs, matched like pathlib.PurePath.match
+        :param suppress_problems: suppressed problems as group::type or group::*
+        """
+        self.suppress_severity = frozenset(suppress_severity or [])
+        self.suppress_files = list(suppress_files or [])
+        self.suppress_problems = list(suppress_problems or [])
+
+        self._suppressed_files_regex = _compile_file_patterns(self.suppress_files)
+
+        self._suppressed_groups = set()
+        self._suppressed_types = set()
+        for s in self.suppress_problems:
+            suppressed_group, _, suppressed_type = s.partition('::')
+            if suppressed_type == '*':
+                self._suppressed_groups.add(suppressed_group)
+            elif suppressed_type:
+                self._suppressed_types.add((suppressed_group, suppressed_type))
+
+        self._suppressed_files_cache = dict()
+        self._suppressed_types_cache = dict()
+
+    def __getstate__(self):
+        # the memos are not pickled for parser processes, the type memo references the whole inspection profile
+        state = self.__dict__.copy()
+        state['_suppressed_files_cache'] = dict()
+        state['_suppressed_types_cache'] = dict()
+        return state
+
+    def is_suppressed_file(self, file: str) -> bool:
+        """
+        Return True if problems in the given file are suppressed.
+        """
+        try:
+            return self._suppressed_files_cache[file]
+        except KeyError:
+            pass
+
+        suppressed = False
+        if self._suppressed_files_regex is not None:
+            suppressed = self._suppressed_files_regex.search(str(pathlib.PurePosixPath(file))) is not None
+
+        self._suppressed_files_cache[file] = suppressed
+        return suppressed
+
+    def is_suppressed_severity(self, severity) -> bool:
+        """
+        Return True if problems with the given severity are suppressed.
+        """
+        return severity.value in self.suppress_severity
+
+    def is_suppressed_type(self, inspection_type) -> bool:
+        """
+        Return True if every problem of the given inspection type is suppressed.
+        """
+        if inspection_type is None:
+            return False
+
+        try:
+            return self._suppressed_types_cache[inspection_type]
+        except KeyError:
+            pass
+
+        group_name = inspection_type.group.name
+        suppressed = (group_name in self._suppressed_groups or
+                      (group_name, inspection_type.name) in self._suppressed_types)
+
+        self._suppressed_types_cache[inspection_type] = suppressed
+        return suppressed
+
+    def is_suppressed(self, problem) -> bool:
+        """
+        Return True if the given problem is suppressed by any rule.
+        """
+        return (self.is_suppressed_file(problem.file) or
+                self.is_suppressed_severity(problem.severity) or
+                self.is_suppressed_type(problem.type))
+
+
+def _compile_file_patterns(patterns: typing.Sequence[str]) -> typing.Optional[typing.Pattern]:
+    """
+    Compile file globs into a single regular expression that matches like pathlib.PurePath.match
+    """
+    if not patterns:
+        return None
+
+    regexes = []
+    for pattern in patterns:
+        pattern_path = pathlib.PurePosixPath(pattern)
+        pattern_parts = [translate_glob_part(p) for p in pattern_path.parts if p != '/']
+        if pattern_path.is_absolute():
+            # absolute patterns match the whole path
+            regexes.append('^/' + '/'.join(pattern_parts) + r'\Z')
+        else:
+            # relative patterns match from the right
+            regexes.append('(?:^|/)' + '/'.join(pattern_parts) + r'\Z')
+
+    _LOG.debug(f"Compiled {len(patterns)} file suppressions")
+
+    return re.compile('|'.join(f"(?:{r})" for r in regexes), re.DOTALL)
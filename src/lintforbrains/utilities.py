@@ -1,15 +1,81 @@
+import contextlib
+import os
+import re
 import sys
+import tempfile
 import typing
 
 import click
 
 
-def abort(message: str, exit_code=1):
-    click.echo(message)
+def abort(message: str, exit_code=1, err: bool = False):
+    click.echo(message, err=err)
     sys.exit(exit_code)
 
 
+@contextlib.contextmanager
+def atomic_write(path: str, mode: str = 'w', encoding: str = None) -> typing.Iterator[typing.IO]:
+    """
+    Open a temporary file next to a path for writing, and replace the path with it when the context exits without
+    error, so readers never see a partial file. The file is readable by everyone, unlike the private temporary file.
+
+    :param path: path of the file
+    :param mode: file mode, 'w' or 'wb'
+    :param encoding: text encoding (defaults to utf-8 in text mode)
+    """
+    if encoding is None and 'b' not in mode:
+        encoding = 'utf-8'
+
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=f".{os.path.basename(path)}-")
+    try:
+        with os.fdopen(fd, mode, encoding=encoding) as fh:
+            yield fh
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(temp_path)
+        raise
+
+
 def substitute(input: str, substitutions: typing.Mapping[str, typing.Any]):
     for key, value in substitutions.items():
         input = input.replace(f"${key}$", value)
     return input
+
+
+def translate_glob_part(part: str) -> str:
+    """
+    Translate a single path component glob (*, ? and [...] wildcards) into a regular expression that does not match
+    across path separators
+    """
+    i, n = 0, len(part)
+    result = []
+    while i < n:
+        c = part[i]
+        i += 1
+        if c == '*':
+            result.append('[^/]*')
+        elif c == '?':
+            result.append('[^/]')
+        elif c == '[':
+            j = i
+            if j < n and part[j] == '!':
+                j += 1
+            if j < n and part[j] == ']':
+                j += 1
+            while j < n and part[j] != ']':
+                j += 1
+            if j >= n:
+                result.append('\\[')
+            else:
+                chars = part[i:j].replace('\\', '\\\\')
+                i = j + 1
+                if chars[0] == '!':
+                    chars = '^' + chars[1:]
+                elif chars[0] == '^':
+                    chars = '\\' + chars
+                result.append(f"[{chars}]")
+        else:
+            result.append(re.escape(c))
+    return ''.join(result)
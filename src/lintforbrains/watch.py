@@ -0,0 +1,147 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import subprocess
+import time
+import typing
+
+from lintforbrains import logging
+
+_LOG = logging.get_logger(__name__)
+
+_POLL_INTERVAL = 0.5
+
+_INOTIFY_TIMEOUT = 1.0
+
+_INOTIFY_EVENTS = 0x00000008 | 0x00000080  # IN_CLOSE_WRITE | IN_MOVED_TO
+
+_XML_TAIL_SIZE = 64
+
+
+class WatchError(Exception):
+    pass
+
+
+class ResultsWatcher:
+    """
+    The ResultsWatcher class yields the problems files of a results directory as the inspector completes them.
+
+    The inspector writes one problems file per inspection while it runs. A problems file is complete once it ends with
+    its closing root element; the directory is rescanned whenever inotify reports a file was closed or moved into it,
+    or every poll interval where inotify is not available. Once the inspector exits every remaining problems file is
+    yielded. Without an inspector process, the problems files of the results directory are yielded immediately.
+    """
+
+    def __init__(self, results_dir: str, process: subprocess.Popen = None, poll_interval: float = _POLL_INTERVAL):
+        """
+        Initialize instance of the ResultsWatcher class.
+
+        :param results_dir: results directory
+        :param process: inspector process writing the results directory (None if it has finished)
+        :param poll_interval: seconds between scans of the results directory without inotify
+        """
+        self.results_dir = results_dir
+        self.process = process
+        self.poll_interval = poll_interval
+
+    def iter_completed_files(self) -> typing.Iterator[typing.Tuple[str, str]]:
+        """
+        Iterate over the (inspection name, file path) of each problems file once it is complete.
+        """
+        yielded = set()
+
+        events = _open_inotify(self.results_dir) if self.process is not None else None
+        try:
+            while True:
+                running = self.process is not None and self.process.poll() is None
+                if not running and self.process is not None and self.process.returncode != 0:
+                    raise WatchError(f"Inspector exited with return code {self.process.returncode}")
+
+                for inspection_name, problems_file in _list_problems_files(self.results_dir):
+                    if problems_file in yielded:
+                        continue
+                    if running and not is_complete_xml_file(problems_file, 'problems'):
+                        continue
+                    yielded.add(problems_file)
+                    _LOG.debug(f"Completed {problems_file}")
+                    yield inspection_name, problems_file
+
+                if not running:
+                    return
+
+                if events is not None:
+                    events.wait(_INOTIFY_TIMEOUT)
+                else:
+                    time.sleep(self.poll_interval)
+        finally:
+            if events is not None:
+                events.close()
+
+
+def is_complete_xml_file(path: str, root_tag: str) -> bool:
+    """
+    Return True if an XML file ends with the closing tag of its root element.
+    """
+    try:
+        with open(path, 'rb') as fh:
+            size = os.fstat(fh.fileno()).st_size
+            fh.seek(max(0, size - _XML_TAIL_SIZE))
+            tail = fh.read()
+    except OSError:
+        return False
+    return tail.rstrip().endswith(f"</{root_tag}>".encode('ascii'))
+
+
+def _list_problems_files(results_dir: str) -> typing.List[typing.Tuple[str, str]]:
+    """
+    Return the (inspection name, file path) of each problems file in a results directory
+    """
+    try:
+        entries = sorted(os.scandir(results_dir), key=lambda e: e.name)
+    except FileNotFoundError:
+        return []
+    return [(e.name[:-len('.xml')], e.path) for e in entries
+            if e.name.endswith('.xml') and e.name != '.descriptions.xml' and e.is_file()]
+
+
+class _Inotify:
+    """
+    Minimal inotify watch of the files closed after writing or moved into a directory
+    """
+
+    def __init__(self, libc, path: str):
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self._fd, os.fsencode(path), _INOTIFY_EVENTS) < 0:
+            errno = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errno, f"inotify_add_watch failed for {path}")
+
+    def wait(self, timeout: float):
+        """
+        Wait until there are events or the timeout expires, and discard the events
+        """
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if readable:
+            try:
+                while os.read(self._fd, 65536):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def close(self):
+        os.close(self._fd)
+
+
+def _open_inotify(path: str) -> typing.Optional[_Inotify]:
+    """
+    Return an inotify watch of a directory, or None if inotify is not available
+    """
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        return _Inotify(libc, path)
+    except (OSError, AttributeError) as ex:
+        _LOG.debug(f"Polling {path}, inotify is not available: {ex}")
+        return None
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Fake inspect.sh used by the tests.
+
+Reports one FakeInspection problem per Python file in the inspected scope (-scope pattern, -d directory or the whole
+project) and records its arguments and environment in inspect-args.json in the output directory.
+"""
+import json
+import os
+import re
+import sys
+
+_SCOPE_TOKEN_PATTERN = re.compile(r'\s*(\(|\)|&&|\|\||!|file:[^()&|!]+)')
+
+
+def walk_python_files(project_dir, inspect_dir):
+    files = []
+    for dir_path, dir_names, file_names in os.walk(inspect_dir):
+        dir_names[:] = sorted(d for d in dir_names if not d.startswith('.'))
+        files.extend(os.path.relpath(os.path.join(dir_path, f), project_dir)
+                     for f in sorted(file_names) if f.endswith('.py'))
+    return files
+
+
+def compile_scope(scope):
+    """
+    Compile a scope pattern of file: terms combined with &&, ||, ! and parentheses into a predicate of a file path
+    """
+    expression = []
+    patterns = []
+    for token in _SCOPE_TOKEN_PATTERN.findall(scope):
+        if token.startswith('file:'):
+            regex = ''.join('/(?:.*/)?' if t == '//' else '[^/]*' if t == '*' else re.escape(t)
+                            for t in re.findall(r'//|\*|[^*/]+|/', token[len('file:'):].strip()))
+            patterns.append(re.compile(regex + r'\Z'))
+            expression.append(f"p[{len(patterns) - 1}].match(f)")
+        else:
+            expression.append({'&&': ' and ', '||': ' or ', '!': ' not '}.get(token, token))
+    return eval(f"lambda f, p=patterns: {''.join(expression)}", {'patterns': patterns})
+
+
+def main(project_dir, profile_path, output_dir, *options):
+    options = list(options)
+
+    if '-scope' in options:
+        in_scope = compile_scope(options[options.index('-scope') + 1])
+        files = [f for f in walk_python_files(project_dir, project_dir) if in_scope(f)]
+    else:
+        inspect_dir = options[options.index('-d') + 1] if '-d' in options else project_dir
+        files = walk_python_files(project_dir, inspect_dir)
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    with open(os.path.join(output_dir, 'inspect-args.json'), 'w') as fh:
+        json.dump({'args': [project_dir, profile_path, output_dir] + options, 'files': files,
+                   'env': {k: v for k, v in os.environ.items() if k.startswith('PYCHARM')}}, fh)
+
+    with open(os.path.join(output_dir, '.descriptions.xml'), 'w') as fh:
+        fh.write('<inspections profile="Fake">\n'
+                 '  <group name="Fake">\n'
+                 '    <inspection shortName="FakeInspection" displayName="Fake inspection" enabled="true">'
+                 'Fake inspection</inspection>\n'
+                 '  </group>\n'
+                 '</inspections>\n')
+
+    if files:
+        with open(os.path.join(output_dir, 'FakeInspection.xml'), 'w') as fh:
+            fh.write('<problems is_local_tool="true">\n')
+            for f in files:
+                fh.write('<problem>\n'
+                         f'  <file>file://$PROJECT_DIR$/{f}</file>\n'
+                         '  <line>1</line>\n'
+                         '  <problem_class severity="WARNING" attribute_key="WARNING_ATTRIBUTES">Fake problem'
+                         '</problem_class>\n'
+                         f'  <description>Fake problem in {f}</description>\n'
+                         '</problem>\n')
+            fh.write('</problems>\n')
+
+    print(f"Inspected {len(files)} files")
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
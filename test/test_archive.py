@@ -0,0 +1,75 @@
+import contextlib
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+
+import lintforbrains.archive
+import lintforbrains.config
+import lintforbrains.report
+import lintforbrains.results
+import lintforbrains.suppress
+
+from . import TestCase
+
+
+class ResultsArchiveTestCase(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.results_dir = os.path.join(self.temp_dir.name, 'inspection-20210101T000000-0')
+        shutil.copytree('test-data/results', self.results_dir)
+        with open(os.path.join(self.results_dir, 'inspect.log'), 'w') as fh:
+            fh.write('log\n')
+        self.project_config = lintforbrains.config.Configuration({'inspect': {}, 'report': {}})
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _load_problems(self, results_dir: str, **kwargs):
+        inspection_results = lintforbrains.results.InspectionResults('fake-project-dir', results_dir,
+                                                                     self.project_config, **kwargs)
+        return [(p.type.name, p.severity, p.file, p.line, p.description) for p in inspection_results.iter_problems()]
+
+    def _assert_archive(self, compression: str, suffix: str):
+        expected_problems = self._load_problems(self.results_dir)
+
+        archive_path = lintforbrains.archive.create_archive(self.results_dir, compression)
+
+        self.assertEqual(self.results_dir + suffix, archive_path)
+        self.assertTrue(lintforbrains.archive.is_archive(archive_path))
+        self.assertEqual(expected_problems, self._load_problems(archive_path, jobs=4, use_cache=True))
+
+        # suppressed inspection types are skipped
+        suppressions = lintforbrains.suppress.SuppressionMatcher(suppress_problems=['Spelling::*'])
+        self.assertEqual([p for p in expected_problems if p[0] != 'SpellCheckingInspection'],
+                         self._load_problems(archive_path, suppressions=suppressions))
+
+    def test_gzip_archive(self):
+        self._assert_archive('gzip', '.tar.gz')
+
+        # the index and the descriptions are the first members
+        with tarfile.open(self.results_dir + '.tar.gz') as tf:
+            names = tf.getnames()
+        self.assertEqual(['.archive-index.json', '.descriptions.xml'], names[:2])
+        self.assertEqual('inspect.log', names[-1])
+
+    @unittest.skipIf(lintforbrains.archive.zstandard is None, "zstandard is not installed")
+    def test_zstd_archive(self):
+        self._assert_archive('zstd', '.tar.zst')
+
+    def test_run_report_archive(self):
+        archive_path = lintforbrains.archive.create_archive(self.results_dir, remove=True)
+        self.assertFalse(os.path.exists(self.results_dir))
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            lintforbrains.report.run_report('fake-project-dir', self.project_config, archive_path)
+        self.assertIn("file://fake-project-dir/scripts/clear-exchanges.sh\n", output.getvalue())
+
+        with open(archive_path, 'wb') as fh:
+            fh.write(b'not an archive')
+        with self.assertRaises(lintforbrains.archive.ArchiveError):
+            lintforbrains.results.InspectionResults('fake-project-dir', archive_path, self.project_config)
@@ -0,0 +1,126 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+
+import lintforbrains.baseline
+import lintforbrains.config
+import lintforbrains.report
+import lintforbrains.results
+
+from . import TestCase
+
+
+class BaselineTestCase(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.project_dir = self.temp_dir.name
+
+        profile = lintforbrains.results.InspectionProfile("fake-profile")
+        group = lintforbrains.results.InspectionGroup(profile, "Python")
+        self.pep8_type = lintforbrains.results.InspectionType(group, "PyPep8Inspection", "", "", True)
+        self.unused_type = lintforbrains.results.InspectionType(group, "PyUnusedLocalInspection", "", "", True)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _write_source(self, lines):
+        with open(os.path.join(self.project_dir, 'main.py'), 'w') as fh:
+            fh.write('\n'.join(lines) + '\n')
+
+    def _problem(self, inspection_type, line: int, details: str):
+        return lintforbrains.results.InspectionProblem(inspection_type,
+                                                       lintforbrains.results.InspectionProblemSeverity.WARNING,
+                                                       "", f"file://{self.project_dir}/main.py", line, details)
+
+    def test_diff(self):
+        self._write_source(['import os', 'x = 1', 'def f():', '    y = 2', '    return 1'])
+        baseline_problems = [self._problem(self.pep8_type, 1, "PEP 8: line too long (125 > 120 characters)"),
+                             self._problem(self.unused_type, 4, "Local variable 'y' value is not used"),
+                             self._problem(self.unused_type, 5, "Local variable 'z' value is not used")]
+
+        index = lintforbrains.baseline.BaselineIndex.from_problems(
+            baseline_problems, lintforbrains.baseline.ProblemFingerprinter(self.project_dir))
+
+        index_path = os.path.join(self.project_dir, 'baseline.lfb')
+        index.save(index_path)
+        index = lintforbrains.baseline.BaselineIndex.load(index_path)
+        self.assertEqual(3, len(index))
+
+        # lines were inserted above the problems, and the line length changed
+        self._write_source(['"""module"""', 'import os', 'x = 1', 'def f():', '    w = 0', '    y = 2'])
+        current_problems = [self._problem(self.pep8_type, 2, "PEP 8: line too long (130 > 120 characters)"),
+                            self._problem(self.unused_type, 5, "Local variable 'w' value is not used"),
+                            self._problem(self.unused_type, 6, "Local variable 'y' value is not used")]
+
+        diff = lintforbrains.baseline.BaselineDiff(index, lintforbrains.baseline.ProblemFingerprinter(self.project_dir))
+        new_problems = list(diff.iter_new_problems(current_problems))
+
+        self.assertEqual([current_problems[1]], new_problems)
+        self.assertEqual(1, diff.new_count)
+        self.assertEqual(1, diff.fixed_count)
+        self.assertEqual([('Python::PyUnusedLocalInspection', 'main.py', 1)], list(diff.iter_fixed_problems()))
+
+    def test_diff_duplicate_problems(self):
+        self._write_source(['a = 1', 'a = 1', 'a = 1'])
+        fingerprinter = lintforbrains.baseline.ProblemFingerprinter(self.project_dir)
+
+        index = lintforbrains.baseline.BaselineIndex.from_problems(
+            [self._problem(self.pep8_type, line, "PEP 8: whitespace") for line in (1, 2)], fingerprinter)
+
+        diff = lintforbrains.baseline.BaselineDiff(index, fingerprinter)
+        new_problems = list(diff.iter_new_problems(
+            [self._problem(self.pep8_type, line, "PEP 8: whitespace") for line in (1, 2, 3)]))
+
+        self.assertEqual(1, len(new_problems))
+        self.assertEqual(0, diff.fixed_count)
+
+    def test_diff_changed_source(self):
+        self._write_source(['import os', 'x = 1'])
+        os.utime(os.path.join(self.project_dir, 'main.py'), (1000000000, 1000000000))
+        fingerprinter = lintforbrains.baseline.ProblemFingerprinter(self.project_dir, results_time=1000000000)
+        fingerprint = fingerprinter.fingerprint(self._problem(self.pep8_type, 2, "PEP 8: whitespace"))
+        self.assertNotEqual(fingerprint.problem_key, fingerprint.code_key)
+
+        # the baseline results were found before a line was inserted above the problem
+        self._write_source(['"""module"""', 'import os', 'x = 1'])
+        fingerprinter = lintforbrains.baseline.ProblemFingerprinter(self.project_dir, results_time=1000000000)
+        fingerprint = fingerprinter.fingerprint(self._problem(self.pep8_type, 2, "PEP 8: whitespace"))
+        self.assertEqual(fingerprint.problem_key, fingerprint.code_key)
+
+        index = lintforbrains.baseline.BaselineIndex.from_problems(
+            [self._problem(self.pep8_type, 2, "PEP 8: whitespace")], fingerprinter)
+        diff = lintforbrains.baseline.BaselineDiff(index, lintforbrains.baseline.ProblemFingerprinter(self.project_dir))
+        self.assertEqual([], list(diff.iter_new_problems([self._problem(self.pep8_type, 3, "PEP 8: whitespace")])))
+        self.assertEqual(0, diff.fixed_count)
+
+    def test_diff_many_duplicate_problems(self):
+        self._write_source(['a = 1'])
+        fingerprinter = lintforbrains.baseline.ProblemFingerprinter(self.project_dir)
+        problems = [self._problem(self.pep8_type, 1, "PEP 8: whitespace")] * 20000
+
+        index = lintforbrains.baseline.BaselineIndex.from_problems(problems, fingerprinter)
+        diff = lintforbrains.baseline.BaselineDiff(index, fingerprinter)
+
+        self.assertEqual(1, len(list(diff.iter_new_problems(problems + problems[:1]))))
+        self.assertEqual(0, diff.fixed_count)
+
+    def test_run_report_baseline(self):
+        project_config = lintforbrains.config.Configuration({'inspect': {}, 'report': {}})
+        results_dir = os.path.join(self.project_dir, 'results')
+        shutil.copytree('test-data/results', results_dir)
+        baseline_path = os.path.join(self.project_dir, 'baseline.lfb')
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            lintforbrains.report.run_report(self.project_dir, project_config, results_dir,
+                                            write_baseline_path=baseline_path)
+        self.assertIn("Wrote baseline of 458 problems", output.getvalue())
+
+        for baseline in (baseline_path, results_dir):
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                lintforbrains.report.run_report(self.project_dir, project_config, results_dir, baseline_path=baseline)
+            self.assertEqual(f"0 new problems, 0 fixed problems since baseline {baseline}\n", output.getvalue())
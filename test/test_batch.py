@@ -0,0 +1,104 @@
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+
+import lintforbrains.batch
+
+from . import TestCase
+
+
+class BatchTestCase(TestCase):
+    """
+    Runs batch inspections against the fake inspect.sh in test-data/pycharm
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root_dir = os.path.join(self.temp_dir.name, 'monorepo')
+        self.cache_dir = os.path.join(self.temp_dir.name, 'cache')
+
+        for project, files in [('services/small', ['a.py']), ('services/big', ['a.py', 'b.py', 'c.py']),
+                               ('.hidden/project', ['a.py'])]:
+            project_dir = os.path.join(self.root_dir, project)
+            os.makedirs(os.path.join(project_dir, 'src'))
+            for f in files:
+                with open(os.path.join(project_dir, 'src', f), 'w') as fh:
+                    fh.write("print('hello')\n")
+            with open(os.path.join(project_dir, '.lintconfig'), 'w') as fh:
+                fh.write('inspect {\n  source_dir = "src/"\n  output_dir = "results/"\n}\n')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _run_inspect_all(self, jobs):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return lintforbrains.batch.run_inspect_all(self.root_dir, '2021.2', 'community',
+                                                       os.path.abspath('test-data/pycharm'),
+                                                       os.path.join(self.temp_dir.name, 'pycharm-config'),
+                                                       sys.executable,
+                                                       debug_level=0,
+                                                       cache_dir=self.cache_dir,
+                                                       jobs=jobs)
+
+    def test_find_projects(self):
+        self.assertEqual([os.path.join(self.root_dir, 'services/big/.lintconfig'),
+                          os.path.join(self.root_dir, 'services/small/.lintconfig')],
+                         lintforbrains.batch.find_projects(self.root_dir))
+
+    def test_plan_jobs(self):
+        durations = lintforbrains.batch.DurationHistory(os.path.join(self.cache_dir, 'inspect-durations.json'))
+        os.makedirs(self.cache_dir)
+        with open(durations.path, 'w') as fh:
+            json.dump({os.path.realpath(os.path.join(self.root_dir, 'services/small')): 10.0,
+                       os.path.realpath(os.path.join(self.root_dir, 'services/big')): 60.0}, fh)
+
+        config_files = [os.path.join(self.root_dir, p, '.lintconfig')
+                        for p in ['services/small', 'services/big', 'services/new']]
+        batch_jobs = lintforbrains.batch.plan_jobs(config_files, durations)
+
+        # projects never inspected first, then longest-first
+        self.assertEqual(['new', 'big', 'small'], [os.path.basename(j.project_dir) for j in batch_jobs])
+
+    def test_job_memory(self):
+        vmoptions_path = os.path.join(self.temp_dir.name, 'pycharm64.vmoptions')
+        with open(vmoptions_path, 'w') as fh:
+            fh.write('-Xms128m\n-Xmx2048m\n')
+
+        self.assertEqual(3 << 30, lintforbrains.batch.job_memory(vmoptions_path))
+        self.assertEqual(4 << 30, lintforbrains.batch.job_memory(os.path.join(self.temp_dir.name, 'missing')))
+        self.assertGreaterEqual(lintforbrains.batch.default_concurrency(1 << 30), 1)
+
+    def test_inspect_projects_interrupted(self):
+        project_dirs = [os.path.join(self.root_dir, p) for p in ['services/big', 'services/small']]
+        batch_jobs = [lintforbrains.batch.BatchJob(d, os.path.join(d, '.lintconfig'), None) for d in project_dirs]
+
+        def _inspector_factory(pycharm_system_dir, job_metrics):
+            raise KeyboardInterrupt()
+
+        # the queued jobs are not started once the batch is interrupted
+        with self.assertRaises(KeyboardInterrupt):
+            lintforbrains.batch.inspect_projects(batch_jobs, _inspector_factory, concurrency=1)
+        self.assertIsNotNone(batch_jobs[0].started)
+        self.assertIsNone(batch_jobs[1].started)
+
+    def test_run_inspect_all(self):
+        self.assertEqual(0, self._run_inspect_all(jobs=2))
+
+        with open(os.path.join(self.root_dir, 'inspect-all.json')) as fh:
+            index = json.load(fh)
+
+        self.assertEqual(os.path.abspath(self.root_dir), index['root_dir'])
+        self.assertEqual([os.path.join(self.root_dir, 'services/big'), os.path.join(self.root_dir, 'services/small')],
+                         [p['project_dir'] for p in index['projects']])
+        for project in index['projects']:
+            self.assertEqual('succeeded', project['status'])
+            self.assertEqual(os.path.join(project['project_dir'], 'results'), os.path.dirname(project['results_dir']))
+            self.assertTrue(os.path.isfile(os.path.join(project['results_dir'], 'inspect-args.json')))
+
+        # concurrent inspections ran in sandboxes, and their durations are recorded for scheduling
+        self.assertEqual([], os.listdir(os.path.join(self.cache_dir, 'sandboxes')))
+        with open(os.path.join(self.cache_dir, 'inspect-durations.json')) as fh:
+            self.assertEqual(2, len(json.load(fh)))
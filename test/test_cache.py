@@ -0,0 +1,152 @@
+import fcntl
+import os
+import tempfile
+import time
+from unittest import mock
+
+import lintforbrains.cache
+
+from . import TestCase
+
+
+class SystemDirectoryTestCase(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = self.temp_dir.name
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _make_system_dir(self, name: str, size: int, last_used: float = None):
+        system_dir = lintforbrains.cache.SystemDirectory(os.path.join(self.cache_dir, 'system', name))
+        with system_dir.lock():
+            os.makedirs(os.path.join(system_dir.path, 'index'))
+            with open(os.path.join(system_dir.path, 'index', 'data'), 'w') as fh:
+                fh.write('x' * size)
+        if last_used is not None:
+            os.utime(system_dir.lock_path, (last_used, last_used))
+        return system_dir
+
+    def test_configure(self):
+        base_vmoptions_path = os.path.join(self.cache_dir, 'pycharm64.vmoptions')
+        with open(base_vmoptions_path, 'w') as fh:
+            fh.write('-Xmx2048m\n-Didea.system.path=/default/system\n')
+
+        system_dir = lintforbrains.cache.SystemDirectory(os.path.join(self.cache_dir, 'system', 'PyCharmCE2021.2'))
+        env = system_dir.configure('/fake-config-dir', base_vmoptions_path)
+
+        self.assertEqual({'PYCHARM_PROPERTIES': system_dir.properties_path,
+                          'PYCHARM_VM_OPTIONS': system_dir.vmoptions_path}, env)
+
+        with open(system_dir.properties_path) as fh:
+            self.assertEqual(f"idea.config.path=/fake-config-dir\n"
+                             f"idea.system.path={system_dir.path}\n"
+                             f"idea.log.path={system_dir.path}/log\n", fh.read())
+
+        with open(system_dir.vmoptions_path) as fh:
+            self.assertEqual(f"-Xmx2048m\n"
+                             f"-Didea.system.path={system_dir.path}\n"
+                             f"-Didea.log.path={system_dir.path}/log\n", fh.read())
+
+        # unchanged files are not rewritten
+        os.utime(system_dir.properties_path, (900000000, 900000000))
+        system_dir.configure('/fake-config-dir', base_vmoptions_path)
+        self.assertEqual(900000000, os.stat(system_dir.properties_path).st_mtime)
+
+    def test_lock(self):
+        system_dir = lintforbrains.cache.SystemDirectory(os.path.join(self.cache_dir, 'system', 'PyCharmCE2021.2'))
+
+        with system_dir.lock():
+            with self.assertRaises(lintforbrains.cache.SystemDirectoryError):
+                with system_dir.lock(blocking=False):
+                    pass
+            self.assertFalse(system_dir.prune())
+
+        with system_dir.lock(blocking=False):
+            pass
+
+    def test_lock_pruned_while_waiting(self):
+        system_dir = self._make_system_dir('PyCharmCE2021.2', 100)
+        flock = fcntl.flock
+        pruned = []
+
+        def _flock(fh, operation):
+            if operation == fcntl.LOCK_EX | fcntl.LOCK_NB and not pruned:
+                # another inspection holds the lock
+                pruned.append(None)
+                raise BlockingIOError()
+            if operation == fcntl.LOCK_EX:
+                # the directory is pruned before the waiting inspection gets the lock
+                pruned[0] = system_dir.prune()
+            return flock(fh, operation)
+
+        with mock.patch('fcntl.flock', _flock):
+            with system_dir.lock():
+                self.assertEqual([True], pruned)
+                self.assertEqual(['.lintforbrains.lock'], os.listdir(system_dir.path))
+                with self.assertRaises(lintforbrains.cache.SystemDirectoryError):
+                    with system_dir.lock(blocking=False):
+                        pass
+
+        self.assertEqual([system_dir.path], [d.path for d in lintforbrains.cache.find_system_dirs(self.cache_dir)])
+        self.assertEqual(['PyCharmCE2021.2'], os.listdir(os.path.join(self.cache_dir, 'system')))
+
+    def test_stats(self):
+        system_dir = self._make_system_dir('PyCharmCE2021.2', 100, last_used=900000000)
+
+        self.assertEqual(lintforbrains.cache.SystemDirectoryStats(system_dir.path, 100, 2, 900000000),
+                         system_dir.stats())
+        self.assertEqual([system_dir.path], [d.path for d in lintforbrains.cache.find_system_dirs(self.cache_dir)])
+
+    def test_run_cache_prune(self):
+        old_system_dir = self._make_system_dir('PyCharmCE2021.1', 100, last_used=time.time() - 10 * 86400)
+        new_system_dir = self._make_system_dir('PyCharmCE2021.2', 100)
+
+        lintforbrains.cache.run_cache_prune(self.cache_dir, 7, False)
+
+        self.assertFalse(os.path.exists(old_system_dir.path))
+        self.assertTrue(os.path.exists(new_system_dir.path))
+
+        lintforbrains.cache.run_cache_prune(self.cache_dir, None, True)
+
+        self.assertEqual([], lintforbrains.cache.find_system_dirs(self.cache_dir))
+
+    def test_sandbox(self):
+        config_template = os.path.join(self.cache_dir, 'config')
+        os.makedirs(os.path.join(config_template, 'options'))
+        system_template = self._make_system_dir('PyCharmCE2021.2', 100)
+        sandboxes_dir = os.path.join(self.cache_dir, 'sandboxes')
+
+        with lintforbrains.cache.Sandbox.create(sandboxes_dir, config_template, system_template) as sandbox:
+            self.assertTrue(os.path.isdir(os.path.join(sandbox.config_dir, 'options')))
+            self.assertTrue(os.path.isfile(os.path.join(sandbox.system_dir.path, 'index', 'data')))
+
+            # a sandbox in use is not pruned
+            lintforbrains.cache.run_cache_prune(self.cache_dir, 7, False)
+            self.assertTrue(os.path.isdir(sandbox.path))
+
+            with open(os.path.join(sandbox.system_dir.path, 'index', 'data'), 'w') as fh:
+                fh.write('warmer')
+
+            # the lock, generated IDE config and logs of the run are not copied between the sandbox and the template
+            self.assertEqual(['index'], os.listdir(sandbox.system_dir.path))
+            with sandbox.system_dir.lock():
+                sandbox.system_dir.configure(sandbox.config_dir)
+                os.makedirs(os.path.join(sandbox.system_dir.path, 'log'))
+
+            # the template is not updated while it is in use
+            with system_template.lock():
+                self.assertFalse(sandbox.promote(system_template))
+            self.assertTrue(sandbox.promote(system_template))
+
+        self.assertFalse(os.path.exists(sandbox.path))
+        with open(os.path.join(system_template.path, 'index', 'data')) as fh:
+            self.assertEqual('warmer', fh.read())
+        self.assertEqual(['.lintforbrains.lock', 'index'], sorted(os.listdir(system_template.path)))
+
+        # abandoned sandboxes are pruned
+        abandoned_sandbox = lintforbrains.cache.Sandbox(os.path.join(sandboxes_dir, 'sandbox-abandoned'))
+        os.makedirs(abandoned_sandbox.config_dir)
+        lintforbrains.cache.run_cache_prune(self.cache_dir, 7, False)
+        self.assertEqual([], lintforbrains.cache.find_sandboxes(self.cache_dir))
@@ -0,0 +1,75 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+
+import lintforbrains.config
+import lintforbrains.gate
+import lintforbrains.report
+import lintforbrains.results
+
+from . import TestCase
+
+
+class GateTestCase(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.results_dir = os.path.join(self.temp_dir.name, 'results')
+        shutil.copytree('test-data/results', self.results_dir)
+        self.project_config = lintforbrains.config.Configuration({'inspect': {}, 'report': {}})
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _run_report(self, fail_on, quiet):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            try:
+                exit_code = lintforbrains.report.run_report('fake-project-dir', self.project_config, self.results_dir,
+                                                            use_cache=False, fail_on=fail_on, quiet=quiet)
+            except SystemExit as ex:
+                exit_code = ex.code
+        return exit_code, output.getvalue()
+
+    def test_parse_threshold(self):
+        severities = lintforbrains.results.InspectionProblemSeverity
+
+        self.assertEqual((severities.ERROR, 0), lintforbrains.gate.parse_threshold('ERROR'))
+        self.assertEqual((severities.WARNING, 50), lintforbrains.gate.parse_threshold('warning:50'))
+        self.assertEqual((severities.WEAK, 3), lintforbrains.gate.parse_threshold('WEAK WARNING:3'))
+
+        with self.assertRaises(lintforbrains.gate.GateError):
+            lintforbrains.gate.parse_threshold('FATAL')
+        with self.assertRaises(lintforbrains.gate.GateError):
+            lintforbrains.gate.parse_threshold('ERROR:many')
+
+    def test_iter_problems_severities(self):
+        inspection_results = lintforbrains.results.InspectionResults('fake-project-dir', self.results_dir,
+                                                                     self.project_config)
+
+        # the largest results file of warnings is parsed first
+        problems = inspection_results.iter_problems(severities={lintforbrains.results.InspectionProblemSeverity.WARNING})
+        self.assertEqual('CheckTagEmptyBody', next(problems).type.name)
+
+        self.assertEqual(458, len(list(inspection_results.iter_problems())))
+
+    def test_run_report_fail_on(self):
+        exit_code, output = self._run_report(['ERROR', 'WARNING:176'], quiet=True)
+        self.assertEqual(0, exit_code)
+        self.assertEqual("Passed: 176 WARNING, 0 ERROR problems\n", output)
+
+        # stops at the first warning over the threshold
+        exit_code, output = self._run_report(['WARNING:150'], quiet=True)
+        self.assertEqual(3, exit_code)
+        self.assertEqual("Failed: at least 151 WARNING problems (thresholds crossed: WARNING:150)\n", output)
+
+        # counts every problem of the report
+        exit_code, output = self._run_report(['WEAK WARNING:50'], quiet=False)
+        self.assertEqual(3, exit_code)
+        self.assertTrue(output.endswith("Failed: 54 WEAK WARNING problems (thresholds crossed: WEAK WARNING:50)\n"))
+        self.assertIn("file://fake-project-dir/scripts/clear-exchanges.sh\n", output)
+
+        exit_code, output = self._run_report(['FATAL'], quiet=True)
+        self.assertEqual(1, exit_code)
@@ -0,0 +1,95 @@
+import json
+import os
+import tempfile
+import time
+
+import lintforbrains.config
+import lintforbrains.history
+import lintforbrains.results
+
+from . import TestCase
+
+
+class ResultsHistoryTestCase(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.output_dir = os.path.join(self.temp_dir.name, 'results')
+        self.history = lintforbrains.history.ResultsHistory(self.output_dir)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _make_results_dir(self, name: str, size: int, mtime: float = None):
+        results_dir = os.path.join(self.output_dir, name)
+        os.makedirs(results_dir)
+        with open(os.path.join(results_dir, 'Inspection.xml'), 'w') as fh:
+            fh.write('x' * size)
+        if mtime is not None:
+            os.utime(results_dir, (mtime, mtime))
+        return results_dir
+
+    def test_publish(self):
+        project_config = lintforbrains.config.Configuration({'inspect': {'output_dir': 'results/'}, 'report': {}})
+
+        # results written before the index are indexed on first use
+        old_results_dir = self._make_results_dir('inspection-20210101T000000-0', 10, mtime=900000000)
+        new_results_dir = self._make_results_dir('inspection-20210102T000000-abc', 20)
+        self.assertEqual(new_results_dir, lintforbrains.results.latest_results_dir(self.temp_dir.name, project_config))
+
+        self.history.publish(old_results_dir)
+
+        self.assertEqual(old_results_dir, self.history.latest())
+        self.assertEqual(old_results_dir, lintforbrains.results.latest_results_dir(self.temp_dir.name, project_config))
+        self.assertEqual('inspection-20210101T000000-0', os.readlink(os.path.join(self.output_dir, 'latest')))
+
+        with open(os.path.join(self.output_dir, 'index.json')) as fh:
+            index = json.load(fh)
+        self.assertEqual([('inspection-20210102T000000-abc', 20), ('inspection-20210101T000000-0', 10)],
+                         [(e['name'], e['size']) for e in index['results']])
+
+    def test_prune(self):
+        now = time.time()
+        results_dirs = [self._make_results_dir(f"inspection-{i}", 100) for i in range(5)]
+        for i, results_dir in enumerate(results_dirs):
+            self.history.publish(results_dir)
+        self.history._save_index([e._replace(finished=now - (4 - i) * 86400) for i, e in
+                                  enumerate(self.history.entries())])
+
+        policy = lintforbrains.history.RetentionPolicy
+        self.assertEqual([], self.history.prune(policy()))
+
+        self.assertEqual(results_dirs[:1], self.history.prune(policy(max_age_days=3.5), now=now))
+        self.assertEqual(results_dirs[1:2], self.history.prune(policy(max_bytes=350), now=now))
+        self.assertEqual(results_dirs[2:3], self.history.prune(policy(keep=2), now=now))
+
+        # the latest results are always kept
+        self.assertEqual(results_dirs[3:4], self.history.prune(policy(keep=1, max_bytes=0), now=now))
+        self.assertEqual(['inspection-4'], [e.name for e in self.history.entries()])
+        self.assertEqual(['.index.lock', 'index.json', 'inspection-4', 'latest'], sorted(os.listdir(self.output_dir)))
+
+    def test_results_cache_size(self):
+        results_dir = self._make_results_dir('inspection-0', 100)
+        with open(os.path.join(results_dir, lintforbrains.history.RESULTS_CACHE_FILENAME), 'wb') as fh:
+            fh.write(b'x' * 1000)
+
+        # the index is written when the results are published, and rebuilt by scanning when it is lost
+        self.history.publish(results_dir)
+        self.assertEqual([100], [e.size for e in self.history.entries()])
+        os.remove(self.history.index_path)
+        self.assertEqual([100], [e.size for e in self.history.entries()])
+
+    def test_prune_foreign_entries(self):
+        # no index yet, and the output directory is shared with other build outputs
+        foreign_dir = self._make_results_dir('coverage', 1000, mtime=900000000)
+        with open(os.path.join(self.output_dir, 'dist.tar.gz'), 'wb') as fh:
+            fh.write(b'x' * 1000)
+        results_dirs = [self._make_results_dir(f"inspection-{i}", 100, mtime=900000000 + i) for i in range(3)]
+        self.history.publish(results_dirs[2])
+
+        policy = lintforbrains.history.RetentionPolicy(keep=1, max_age_days=1, max_bytes=0)
+        self.assertEqual(results_dirs[:2], sorted(self.history.prune(policy)))
+
+        self.assertTrue(os.path.isdir(foreign_dir))
+        self.assertTrue(os.path.isfile(os.path.join(self.output_dir, 'dist.tar.gz')))
+        self.assertEqual(['inspection-2'], [e.name for e in self.history.entries()])
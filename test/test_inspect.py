@@ -1,7 +1,16 @@
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
 from unittest import mock
 
 import lintforbrains.config
 import lintforbrains.inspect
+import lintforbrains.results
 
 from . import TestCase
 
@@ -44,3 +53,282 @@ class InspectionTestCase(TestCase):
                                                 'fake-project-dir/src',
                                                 '-v1'],
                                                check=True)
+
+
+class FakeInspectorTestCase(TestCase):
+    """
+    Runs the Inspector against the fake inspect.sh in test-data/pycharm
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.project_dir = os.path.join(self.temp_dir.name, 'project')
+        self.pycharm_config_dir = os.path.join(self.temp_dir.name, 'pycharm-config')
+
+        for f in ['src/a.py', 'src/b.py', 'src/pkg/c.py']:
+            self._write_project_file(f, "print('hello')\n")
+
+        self.project_config = lintforbrains.config.Configuration({
+            'inspect': {'source_dir': 'src/', 'output_dir': 'results/'},
+            'report': {},
+        })
+
+        self.inspector = lintforbrains.inspect.Inspector('2021.2', 'community',
+                                                         os.path.abspath('test-data/pycharm'),
+                                                         self.pycharm_config_dir,
+                                                         sys.executable,
+                                                         debug_level=0,
+                                                         cache_dir=os.path.join(self.temp_dir.name, 'cache'))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _write_project_file(self, file: str, content: str, mtime: float = None):
+        path = os.path.join(self.project_dir, file)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as fh:
+            fh.write(content)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+
+    def _load_problem_files(self, results_dir: str):
+        results = lintforbrains.results.InspectionResults(self.project_dir, results_dir, self.project_config)
+        return sorted(os.path.relpath(p.file[len('file://'):], self.project_dir) for p in results.iter_problems())
+
+    def _load_inspected_files(self, results_dir: str):
+        with open(os.path.join(results_dir, 'inspect-args.json')) as fh:
+            return json.load(fh)['files']
+
+    def test_run(self):
+        results_dir = self.inspector.run(self.project_dir, self.project_config)
+
+        self.assertEqual(['src/a.py', 'src/b.py', 'src/pkg/c.py'], self._load_problem_files(results_dir))
+        self.assertEqual(results_dir, lintforbrains.results.latest_results_dir(self.project_dir, self.project_config))
+
+    def test_run_system_dir(self):
+        system_dir = os.path.join(self.temp_dir.name, 'cache', 'system', 'PyCharmCE2021.2')
+
+        results_dir = self.inspector.run(self.project_dir, self.project_config)
+
+        with open(os.path.join(results_dir, 'inspect-args.json')) as fh:
+            env = json.load(fh)['env']
+        self.assertEqual(os.path.join(system_dir, '.lintforbrains', 'idea.properties'), env['PYCHARM_PROPERTIES'])
+        self.assertEqual(os.path.join(system_dir, '.lintforbrains', 'pycharm64.vmoptions'), env['PYCHARM_VM_OPTIONS'])
+
+        self.project_config.inspect.system_dir = 'pycharm-system/'
+        self.project_config.inspect.output_dir = 'results-system-dir/'
+
+        results_dir = self.inspector.run(self.project_dir, self.project_config)
+
+        with open(os.path.join(results_dir, 'inspect-args.json')) as fh:
+            env = json.load(fh)['env']
+        self.assertEqual(os.path.join(self.project_dir, 'pycharm-system', '.lintforbrains', 'idea.properties'),
+                         env['PYCHARM_PROPERTIES'])
+
+    def test_run_sandbox(self):
+        self.inspector.sandbox = True
+        system_dir = os.path.join(self.temp_dir.name, 'cache', 'system', 'PyCharmCE2021.2')
+        os.makedirs(os.path.join(system_dir, 'index'))
+        with open(os.path.join(system_dir, 'index', 'data'), 'w') as fh:
+            fh.write('warm')
+
+        results_dir = self.inspector.run(self.project_dir, self.project_config)
+
+        self.assertEqual(['src/a.py', 'src/b.py', 'src/pkg/c.py'], self._load_problem_files(results_dir))
+
+        # the inspector ran in a sandbox seeded from the system dir
+        with open(os.path.join(results_dir, 'inspect-args.json')) as fh:
+            properties_path = json.load(fh)['env']['PYCHARM_PROPERTIES']
+        sandboxes_dir = os.path.join(self.temp_dir.name, 'cache', 'sandboxes')
+        self.assertTrue(properties_path.startswith(sandboxes_dir + os.sep))
+
+        # the shared config dir is not written, the sandbox is removed and the system dir is kept warm
+        self.assertFalse(os.path.exists(os.path.join(self.pycharm_config_dir, 'options', 'jdk.table.xml')))
+        self.assertEqual([], os.listdir(sandboxes_dir))
+        with open(os.path.join(system_dir, 'index', 'data')) as fh:
+            self.assertEqual('warm', fh.read())
+        # the IDE config generated for the sandbox is not promoted
+        self.assertFalse(os.path.exists(os.path.join(system_dir, '.lintforbrains')))
+
+    def test_run_archive(self):
+        archive_path = self.inspector.run(self.project_dir, self.project_config, archive_results='gzip')
+
+        self.assertTrue(archive_path.endswith('.tar.gz'))
+        self.assertFalse(os.path.exists(archive_path[:-len('.tar.gz')]))
+        self.assertEqual(archive_path, lintforbrains.results.latest_results_dir(self.project_dir, self.project_config))
+        self.assertEqual(['src/a.py', 'src/b.py', 'src/pkg/c.py'], self._load_problem_files(archive_path))
+
+        # archived results are not merged, so the next incremental inspection is a full inspection
+        results_dir = self.inspector.run(self.project_dir, self.project_config, incremental=True)
+        self.assertEqual(['src/a.py', 'src/b.py', 'src/pkg/c.py'], self._load_inspected_files(results_dir))
+
+    def test_prepare_results_dir(self):
+        output_dir = os.path.join(self.temp_dir.name, 'results')
+
+        results_dirs = {self.inspector._prepare_results_dir(output_dir) for _ in range(20)}
+
+        self.assertEqual(20, len(results_dirs))
+        for results_dir in results_dirs:
+            self.assertTrue(os.path.isdir(results_dir))
+            self.assertRegex(os.path.basename(results_dir), r'^inspection-\d{8}T\d{6}-')
+
+    def test_run_prune_profile(self):
+        profile_path = os.path.join(self.project_dir, 'profile.xml')
+        with open(profile_path, 'w') as fh:
+            fh.write('<profile version="1.0">\n'
+                     '  <inspection_tool class="SpellCheckingInspection" enabled="true" level="TYPO" />\n'
+                     '</profile>\n')
+        self.project_config.inspect.profile = profile_path
+        self.project_config.report.suppress_severity = ['TYPO']
+
+        results_dir = self.inspector.run(self.project_dir, self.project_config, prune_profile=True)
+
+        with open(os.path.join(results_dir, 'inspect-args.json')) as fh:
+            pruned_profile_path = json.load(fh)['args'][1]
+        self.assertNotEqual(profile_path, pruned_profile_path)
+        self.assertFalse(os.path.exists(pruned_profile_path))
+        self.assertEqual({'inspections': 1}, self.inspector.metrics.phases['prune_profile'].counts)
+
+    def test_run_report(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            lintforbrains.inspect.run_inspect(self.project_dir, self.project_config, '2021.2', 'community',
+                                              os.path.abspath('test-data/pycharm'), self.pycharm_config_dir,
+                                              sys.executable, debug_level=0, report=True)
+
+        self.assertIn(f"file://{self.project_dir}/src/pkg/c.py\n1 : [WARNING] - Fake problem in src/pkg/c.py",
+                      output.getvalue())
+
+        # the report options of the report command are passed through
+        report_path = os.path.join(self.temp_dir.name, 'report.jsonl')
+        lintforbrains.inspect.run_inspect(self.project_dir, self.project_config, '2021.2', 'community',
+                                          os.path.abspath('test-data/pycharm'), self.pycharm_config_dir,
+                                          sys.executable, debug_level=0, report=True, report_format='jsonl',
+                                          report_output=report_path, report_jobs=2)
+        with open(report_path) as fh:
+            self.assertEqual(['src/a.py', 'src/b.py', 'src/pkg/c.py'],
+                             sorted(os.path.relpath(json.loads(line)['file'], self.project_dir) for line in fh))
+
+    def test_run_report_inspector_failed(self):
+        def _consume(_, results_watcher):
+            list(results_watcher.iter_completed_files())
+
+        with tempfile.TemporaryFile('w') as outfile:
+            with self.assertRaises(lintforbrains.inspect.InspectorError):
+                self.inspector._execute_pipelined_command([sys.executable, '-c', 'import sys; sys.exit(2)'], outfile,
+                                                          None, self.temp_dir.name, _consume)
+
+    def test_run_incremental(self):
+        previous_results_dir = self.inspector.run(self.project_dir, self.project_config)
+        os.rename(previous_results_dir, os.path.join(os.path.dirname(previous_results_dir),
+                                                     'inspection-20000101T000000-0'))
+
+        for f in ['src/a.py', 'src/b.py', 'src/pkg/c.py']:
+            os.utime(os.path.join(self.project_dir, f), (900000000, 900000000))
+        self._write_project_file('src/b.py', "print('changed')\n")
+        self._write_project_file('src/d.py', "print('added')\n")
+        os.remove(os.path.join(self.project_dir, 'src/pkg/c.py'))
+
+        with mock.patch.object(lintforbrains.inspect.Inspector, '_execute_inspect_command',
+                               wraps=self.inspector._execute_inspect_command) as mock_execute:
+            results_dir = self.inspector.run(self.project_dir, self.project_config, incremental=True)
+
+        self.assertEqual('file:src/b.py||file:src/d.py', mock_execute.call_args[1]['scope'])
+        self.assertEqual(['src/a.py', 'src/b.py', 'src/d.py'], self._load_problem_files(results_dir))
+        self.assertEqual(['.descriptions.xml', 'FakeInspection.xml', 'inspect.log'], sorted(os.listdir(results_dir)))
+
+    def test_run_incremental_scope_syntax(self):
+        previous_results_dir = self.inspector.run(self.project_dir, self.project_config)
+        os.rename(previous_results_dir, os.path.join(os.path.dirname(previous_results_dir),
+                                                     'inspection-20000101T000000-0'))
+
+        for f in ['src/a.py', 'src/b.py', 'src/pkg/c.py']:
+            os.utime(os.path.join(self.project_dir, f), (900000000, 900000000))
+        self._write_project_file('src/a b(1)|!.py', "print('added')\n")
+
+        with mock.patch.object(lintforbrains.inspect.Inspector, '_execute_inspect_command',
+                               wraps=self.inspector._execute_inspect_command) as mock_execute:
+            self.inspector.run(self.project_dir, self.project_config, incremental=True)
+        self.assertEqual('file:src/a?b?1???.py', mock_execute.call_args[1]['scope'])
+
+        # too many changed files for a scope pattern
+        self._write_project_file('src/b.py', "print('changed')\n")
+        with mock.patch('lintforbrains.inspect._MAX_INCREMENTAL_FILES', 1), \
+                mock.patch.object(lintforbrains.inspect.Inspector, '_execute_inspect_command',
+                                  wraps=self.inspector._execute_inspect_command) as mock_execute:
+            results_dir = self.inspector.run(self.project_dir, self.project_config, incremental=True)
+        self.assertIsNone(mock_execute.call_args[1]['scope'])
+        self.assertEqual(['src/a b(1)|!.py', 'src/a.py', 'src/b.py', 'src/pkg/c.py'],
+                         self._load_problem_files(results_dir))
+
+    def test_run_incremental_sharded(self):
+        previous_results_dir = self.inspector.run(self.project_dir, self.project_config)
+        os.rename(previous_results_dir, os.path.join(os.path.dirname(previous_results_dir),
+                                                     'inspection-20000101T000000-0'))
+
+        for f in ['src/a.py', 'src/b.py', 'src/pkg/c.py']:
+            os.utime(os.path.join(self.project_dir, f), (900000000, 900000000))
+        self._write_project_file('src/b.py', "print('changed')\n")
+        self._write_project_file('src/d.py', "print('added')\n" * 10)
+
+        with mock.patch('lintforbrains.inspect._MIN_INCREMENTAL_SHARD_FILES', 1), \
+                mock.patch('lintforbrains.inspect.subprocess.Popen', wraps=subprocess.Popen) as mock_popen:
+            results_dir = self.inspector.run(self.project_dir, self.project_config, incremental=True, shards=3)
+
+        shard_calls = [c for c in mock_popen.call_args_list if c[0][0][0].endswith('inspect.sh')]
+        self.assertEqual([['-scope', 'file:src/d.py'], ['-scope', 'file:src/b.py']],
+                         [c[0][0][4:6] for c in shard_calls])
+        self.assertEqual(['src/a.py', 'src/b.py', 'src/d.py', 'src/pkg/c.py'], self._load_problem_files(results_dir))
+        self.assertEqual(['.descriptions.xml', 'FakeInspection.xml', 'inspect.log'], sorted(os.listdir(results_dir)))
+
+    def test_run_file_scope(self):
+        self._write_project_file('src/vendor/lib/e.py', "print('vendored')\n")
+        self._write_project_file('src/pkg/migrations/0001_initial.py', "print('migration')\n")
+        self.project_config.inspect.exclude_files = ['src/vendor/**', '**/migrations/*']
+
+        results_dir = self.inspector.run(self.project_dir, self.project_config)
+        self.assertEqual(['src/a.py', 'src/b.py', 'src/pkg/c.py'], self._load_problem_files(results_dir))
+
+        self.project_config.inspect.output_dir = 'results-sharded/'
+        results_dir = self.inspector.run(self.project_dir, self.project_config, shards=2)
+        self.assertEqual(['src/a.py', 'src/b.py', 'src/pkg/c.py'], self._load_problem_files(results_dir))
+
+    def test_run_sharded(self):
+        self._write_project_file('src/pkg/e.py', "print('hello')\n" * 100)
+
+        with mock.patch('lintforbrains.inspect.subprocess.Popen', wraps=subprocess.Popen) as mock_popen:
+            results_dir = self.inspector.run(self.project_dir, self.project_config, shards=2)
+
+        shard_calls = [c for c in mock_popen.call_args_list if c[0][0][0].endswith('inspect.sh')]
+        self.assertEqual(2, len(shard_calls))
+        self.assertEqual(2, len(set(c[1]['env']['PYCHARM_PROPERTIES'] for c in shard_calls)))
+        self.assertEqual(['src/a.py', 'src/b.py', 'src/pkg/c.py', 'src/pkg/e.py'], self._load_problem_files(results_dir))
+        self.assertEqual(['.descriptions.xml', 'FakeInspection.xml', 'inspect.log'], sorted(os.listdir(results_dir)))
+
+    def test_partition_source_dirs(self):
+        for d, size in [('src', 10), ('src/big', 100), ('src/medium', 60), ('src/small', 30), ('src/tiny', 5)]:
+            self._write_project_file(f'{d}/file.py', 'x' * size)
+        os.remove(os.path.join(self.project_dir, 'src/pkg/c.py'))
+
+        partitions = lintforbrains.inspect._partition_source_dirs(self.project_dir,
+                                                                  os.path.join(self.project_dir, 'src'),
+                                                                  os.path.join(self.project_dir, 'results'),
+                                                                  2)
+
+        self.assertEqual([['src/big', 'src/small'], ['src', 'src/medium', 'src/tiny']], partitions)
+
+    def test_configure_inspector_cached(self):
+        sdk_config_path = os.path.join(self.pycharm_config_dir, 'options', 'jdk.table.xml')
+
+        with mock.patch('lintforbrains.inspect.subprocess.run', wraps=subprocess.run) as mock_run:
+            self.inspector._configure_inspector()
+            os.utime(sdk_config_path, (900000000, 900000000))
+            self.inspector._configure_inspector()
+
+        self.assertEqual(1, mock_run.call_count)
+        self.assertEqual(900000000, os.stat(sdk_config_path).st_mtime)
+
+        with open(sdk_config_path) as fh:
+            sdk_config = fh.read()
+        self.assertIn(f'<version value="Python {platform.python_version()}"/>', sdk_config)
+        self.assertIn(f'<root url="file://{sys.path[-1]}" type="simple"/>', sdk_config)
@@ -0,0 +1,99 @@
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from click.testing import CliRunner
+
+import lintforbrains.__main__
+import lintforbrains.config
+import lintforbrains.metrics
+import lintforbrains.report
+
+from . import TestCase
+
+
+class MetricsTestCase(TestCase):
+
+    def test_phase(self):
+        metrics = lintforbrains.metrics.Metrics('test')
+
+        with metrics.phase('outer') as outer:
+            time.sleep(0.05)
+            with metrics.phase('inner') as inner:
+                inner.count('items', 3)
+                time.sleep(0.1)
+
+        self.assertEqual(['outer', 'inner'], list(metrics.phases))
+        self.assertEqual(1, outer.calls)
+        self.assertEqual({'items': 3}, inner.counts)
+
+        # the time of the inner phase is not counted for the outer phase
+        self.assertGreaterEqual(inner.wall_seconds, 0.1)
+        self.assertGreaterEqual(outer.wall_seconds, 0.05)
+        self.assertLess(outer.wall_seconds, 0.1)
+        self.assertGreater(outer.process_peak_rss_kb, 0)
+
+    def test_timed_iter(self):
+        metrics = lintforbrains.metrics.Metrics('test')
+
+        def _produce():
+            for i in range(1000):
+                yield i
+
+        numbers = metrics.timed_iter('produce', _produce(), 'numbers')
+        doubled = metrics.timed_iter('double', (n * 2 for n in numbers), 'numbers')
+
+        self.assertEqual([n * 2 for n in range(1000)], list(doubled))
+        self.assertEqual({'numbers': 1000}, metrics.phases['produce'].counts)
+        self.assertEqual({'numbers': 1000}, metrics.phases['double'].counts)
+
+    def test_write_prometheus(self):
+        metrics = lintforbrains.metrics.Metrics('test')
+        with metrics.phase('parse') as phase:
+            phase.count('problems', 5)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'lintforbrains.prom')
+            metrics.write_prometheus(path)
+            with open(path) as fh:
+                lines = fh.read().splitlines()
+
+        self.assertIn('lintforbrains_phase_calls{command="test",phase="parse"} 1', lines)
+        self.assertIn('lintforbrains_phase_items{command="test",phase="parse",item="problems"} 5', lines)
+
+    def test_parse_statsd_address(self):
+        self.assertEqual(('localhost', 8125), lintforbrains.metrics.parse_statsd_address('localhost:8125'))
+        for address in ('localhost', ':8125', 'localhost:port', 'localhost:0', 'localhost:65536'):
+            with self.assertRaises(ValueError):
+                lintforbrains.metrics.parse_statsd_address(address)
+
+        # the address is checked before the report runs
+        result = CliRunner().invoke(lintforbrains.__main__.cli, ['report', '--metrics-statsd', 'localhost', '.'])
+        self.assertEqual(2, result.exit_code)
+        self.assertIn('Invalid StatsD address', result.output)
+
+    def test_run_report_metrics(self):
+        project_config = lintforbrains.config.Configuration({'inspect': {}, 'report': {}})
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            results_dir = os.path.join(temp_dir, 'results')
+            shutil.copytree('test-data/results', results_dir)
+
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+                lintforbrains.report.run_report('fake-project-dir', project_config, results_dir, use_cache=False,
+                                                timings=True)
+
+            with open(os.path.join(results_dir, 'report-metrics.json')) as fh:
+                report_metrics = json.load(fh)
+
+        phases = {p['name']: p for p in report_metrics['phases']}
+        self.assertEqual({'parse_profile', 'parse_problems', 'filter_problems', 'sort_problems', 'write_report'},
+                         set(phases))
+        self.assertEqual(458, phases['parse_problems']['counts']['problems'])
+        self.assertEqual(458, phases['filter_problems']['counts']['problems'])
+        self.assertIn('write_report', output.getvalue())
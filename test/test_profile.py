@@ -0,0 +1,78 @@
+import os
+import tempfile
+
+from lxml import etree
+
+import lintforbrains.profile
+import lintforbrains.results
+import lintforbrains.suppress
+
+from . import TestCase
+
+
+class PruneProfileTestCase(TestCase):
+    PROJECT_PROFILE = '''<component name="InspectionProjectProfileManager">
+  <profile version="1.0">
+    <option name="myName" value="Project Default" />
+    <inspection_tool class="PyPep8Inspection" enabled="true" level="WEAK WARNING" enabled_by_default="true" />
+    <inspection_tool class="PyUnusedLocalInspection" enabled="true" level="WARNING" enabled_by_default="true">
+      <scope name="Tests" level="TYPO" enabled="true" />
+    </inspection_tool>
+    <inspection_tool class="SpellCheckingInspection" enabled="true" level="TYPO" enabled_by_default="true" />
+  </profile>
+</component>
+'''
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.profile_path = os.path.join(self.temp_dir.name, 'Project_Default.xml')
+        self.pruned_profile_path = os.path.join(self.temp_dir.name, 'pruned', 'Project_Default.xml')
+        os.makedirs(os.path.dirname(self.pruned_profile_path))
+        with open(self.profile_path, 'w') as fh:
+            fh.write(self.PROJECT_PROFILE)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _enabled_tools(self):
+        profile = etree.parse(self.pruned_profile_path).getroot().find('profile')
+        return {e.get('class'): e.get('enabled') for e in profile.findall('inspection_tool')}
+
+    def test_prune(self):
+        profile = lintforbrains.results.InspectionProfile("Project Default")
+        python_group = lintforbrains.results.InspectionGroup(profile, "Python")
+        bash_group = lintforbrains.results.InspectionGroup(profile, "Bash")
+        inspection_types = {
+            'PyPep8Inspection': lintforbrains.results.InspectionType(python_group, "PyPep8Inspection", "", "", True),
+            'PyUnusedLocalInspection': lintforbrains.results.InspectionType(python_group, "PyUnusedLocalInspection",
+                                                                            "", "", True),
+            'BashSimpleVarUsage': lintforbrains.results.InspectionType(bash_group, "BashSimpleVarUsage", "", "", True),
+        }
+        suppressions = lintforbrains.suppress.SuppressionMatcher(suppress_severity=['TYPO'],
+                                                                 suppress_problems=['Python::PyPep8Inspection',
+                                                                                    'Bash::*'])
+
+        pruned = lintforbrains.profile.prune_inspection_profile(self.profile_path, self.pruned_profile_path,
+                                                                suppressions, inspection_types)
+
+        # PyUnusedLocalInspection is only suppressed in the Tests scope
+        self.assertEqual(['BashSimpleVarUsage', 'PyPep8Inspection', 'SpellCheckingInspection'], pruned)
+        self.assertEqual({'PyPep8Inspection': 'false', 'PyUnusedLocalInspection': 'true',
+                          'SpellCheckingInspection': 'false', 'BashSimpleVarUsage': 'false'}, self._enabled_tools())
+
+    def test_prune_without_inspection_types(self):
+        suppressions = lintforbrains.suppress.SuppressionMatcher(suppress_problems=['Python::PyPep8Inspection',
+                                                                                    'Bash::*'])
+
+        pruned = lintforbrains.profile.prune_inspection_profile(self.profile_path, self.pruned_profile_path,
+                                                                suppressions)
+
+        self.assertEqual(['PyPep8Inspection'], pruned)
+
+    def test_prune_invalid_profile(self):
+        with open(self.profile_path, 'w') as fh:
+            fh.write('<component name="InspectionProjectProfileManager" />')
+
+        with self.assertRaises(lintforbrains.profile.ProfileError):
+            lintforbrains.profile.prune_inspection_profile(self.profile_path, self.pruned_profile_path,
+                                                           lintforbrains.suppress.SuppressionMatcher())
@@ -1,8 +1,105 @@
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+
+import lxml.etree
+
 from . import TestCase
 
+import lintforbrains.config
 import lintforbrains.report
 import lintforbrains.results
 
 
 class InspectionReportTestCase(TestCase):
-    pass
\ No newline at end of file
+
+    def setUp(self):
+        self.results = lintforbrains.results.InspectionResults("fake-project-dir", "test-data/results", None)
+
+    def test_group_problems_by_type(self):
+        report = lintforbrains.report.InspectionReport(self.results)
+
+        groups = [(t.name, len(list(problems))) for t, problems in report.group_problems_by_type(report.problems)]
+
+        self.assertEqual(10, len(groups))
+        self.assertEqual(sorted(groups), groups)
+        self.assertIn(('PyPep8Inspection', 41), groups)
+
+    def test_group_problems(self):
+        report = lintforbrains.report.InspectionReport(self.results)
+
+        groups = [(file, [(severity, [(t.name, [p.line for p in problems]) for t, problems in severity_problems])
+                          for severity, severity_problems in file_problems])
+                  for file, file_problems in report.group_problems(report.iter_problems(), 'file', 'severity', 'type')]
+
+        self.assertEqual(sorted(set(p.file for p in report.problems)), [file for file, _ in groups])
+        for _, file_groups in groups:
+            self.assertEqual(sorted(severity for severity, _ in file_groups), [severity for severity, _ in file_groups])
+            for _, type_groups in file_groups:
+                for _, lines in type_groups:
+                    self.assertEqual(sorted(lines), lines)
+
+    def test_group_problems_external_sort(self):
+        report = lintforbrains.report.InspectionReport(self.results)
+        external_report = lintforbrains.report.InspectionReport(self.results, max_buffered_problems=7)
+
+        def _flatten(r):
+            return [(file, severity, p) for file, file_problems in r.group_problems(r.iter_problems(), 'file', 'severity')
+                    for severity, problems in file_problems
+                    for p in problems]
+
+        self.assertEqual(_flatten(report), _flatten(external_report))
+
+    def test_write_formats(self):
+        report = lintforbrains.report.InspectionReport(self.results)
+        problems = list(report.iter_problems())
+
+        def _write(output_format):
+            output = io.StringIO()
+            lintforbrains.report.get_report_writer_class(output_format)(output).write(report)
+            return output.getvalue()
+
+        records = [json.loads(line) for line in _write('jsonl').splitlines()]
+        self.assertEqual(len(problems), len(records))
+        self.assertEqual('fake-project-dir/scripts/clear-exchanges.sh', records[0]['file'])
+
+        sarif = json.loads(_write('sarif'))
+        self.assertEqual(len(problems), len(sarif['runs'][0]['results']))
+        self.assertEqual(sorted(set(p.type.name for p in problems)),
+                         [r['id'] for r in sarif['runs'][0]['tool']['driver']['rules']])
+
+        checkstyle = lxml.etree.fromstring(_write('checkstyle').encode('utf-8'))
+        self.assertEqual(len(set(p.file for p in problems)), len(checkstyle.findall('file')))
+        self.assertEqual(len(problems), len(checkstyle.findall('file/error')))
+
+        junit = lxml.etree.fromstring(_write('junit').encode('utf-8'))
+        self.assertEqual(len(problems), sum(int(s.get('failures')) for s in junit.findall('testsuite')))
+        self.assertEqual(len(problems), len(junit.findall('testsuite/testcase/failure')))
+
+        with self.assertRaises(lintforbrains.report.InspectionReportError):
+            lintforbrains.report.get_report_writer_class('html')
+
+    def test_run_report_output(self):
+        project_config = lintforbrains.config.Configuration({'inspect': {}, 'report': {'output': 'jsonl'}})
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # the report writes its metrics and cache into the results dir
+            results_dir = os.path.join(temp_dir, 'results')
+            shutil.copytree('test-data/results', results_dir)
+            output_path = os.path.join(temp_dir, 'report.jsonl')
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                lintforbrains.report.run_report('fake-project-dir', project_config, results_dir,
+                                                output_path=output_path)
+            with open(output_path) as fh:
+                self.assertEqual(len(list(self.results.iter_problems())), len(fh.readlines()))
+            self.assertEqual('', output.getvalue())
+
+            # the format option overrides the config
+            with contextlib.redirect_stdout(output):
+                lintforbrains.report.run_report('fake-project-dir', project_config, results_dir,
+                                                output_format='checkstyle')
+            self.assertTrue(output.getvalue().startswith('<?xml'))
@@ -1,4 +1,11 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+import lintforbrains.history
 import lintforbrains.results
+import lintforbrains.suppress
 
 from . import TestCase
 
@@ -49,3 +56,124 @@ class ProblemParserTestCase(TestCase):
     #             306, "PEP 8: module level import not at top of file", "file://$PROJECT_DIR$/src/example_project/providers/__init__.py",,
     #
     #     ], problems)
+
+
+class InspectionResultsTestCase(TestCase):
+
+    def test_iter_problems(self):
+        results = lintforbrains.results.InspectionResults("fake-project-dir", "test-data/results", None)
+
+        problems = list(results.iter_problems())
+
+        self.assertEqual(458, len(problems))
+        self.assertEqual(problems, list(results.problems))
+        self.assertEqual("file://fake-project-dir/src/lucid_scheduler/api/handler/__init__.py",
+                         [p for p in problems if p.type.name == 'PyPep8Inspection'][0].file)
+
+    @mock.patch('lintforbrains.results._PARALLEL_PARSE_THRESHOLD', 2)
+    def test_iter_problems_parallel(self):
+        results = lintforbrains.results.InspectionResults("fake-project-dir", "test-data/results", None, jobs=2)
+        parallel_problems = list(results.iter_problems())
+
+        results.jobs = 1
+        serial_problems = list(results.iter_problems())
+
+        self.assertEqual(serial_problems, parallel_problems)
+
+    def test_find_inspection_type(self):
+        results = lintforbrains.results.InspectionResults("fake-project-dir", "test-data/results", None)
+
+        inspection_type = results._find_inspection_type('PyPep8Inspection')
+
+        self.assertIs(results.profile.groups[inspection_type.group.name].inspections['PyPep8Inspection'],
+                      inspection_type)
+        self.assertIsNone(results._find_inspection_type('FakeInspection'))
+        self.assertEqual({inspection_type: 1}, {results._find_inspection_type('PyPep8Inspection'): 1})
+
+    def test_iter_problems_suppressed(self):
+        suppressions = lintforbrains.suppress.SuppressionMatcher(suppress_severity=['WEAK WARNING'],
+                                                                 suppress_files=['src/lucid_scheduler/api/*/*.py'],
+                                                                 suppress_problems=['Spelling::*'])
+        results = lintforbrains.results.InspectionResults("fake-project-dir", "test-data/results", None,
+                                                          suppressions=suppressions)
+
+        parsed_files = []
+        parse_rows = lintforbrains.results._iter_problem_rows_fromfile
+
+        def _parse(project_dir, file, suppressions=None):
+            parsed_files.append(os.path.basename(file))
+            return parse_rows(project_dir, file, suppressions)
+
+        with mock.patch('lintforbrains.results._iter_problem_rows_fromfile', _parse):
+            problems = list(results.iter_problems())
+
+        self.assertNotIn('SpellCheckingInspection.xml', parsed_files)
+        self.assertEqual(9, len(parsed_files))
+        self.assertFalse([p for p in problems if suppressions.is_suppressed(p)])
+        self.assertEqual(176, len(problems))
+
+        results.use_cache = False
+        results.jobs = 2
+        with mock.patch('lintforbrains.results._PARALLEL_PARSE_THRESHOLD', 2):
+            self.assertEqual(problems, list(results.iter_problems()))
+
+
+class ProblemTableTestCase(TestCase):
+
+    def test_problem_table(self):
+        results = lintforbrains.results.InspectionResults("fake-project-dir", "test-data/results", None)
+        problems = list(results.iter_problems())
+
+        table = lintforbrains.results.ProblemTable(problems)
+
+        self.assertEqual(len(problems), len(table))
+        self.assertEqual(problems, list(table))
+        self.assertEqual(problems[10], table[10])
+        self.assertEqual(problems[-3:], table[-3:])
+        self.assertLess(len(table._files.values), len(problems))
+        self.assertLess(len(table._descriptions.values), len(problems))
+
+
+class ResultsCacheTestCase(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.results_dir = os.path.join(self.temp_dir.name, 'results')
+        shutil.copytree('test-data/results', self.results_dir)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _load_problems(self):
+        results = lintforbrains.results.InspectionResults("fake-project-dir", self.results_dir, None, use_cache=True)
+        return [str(p) for p in results.iter_problems()]
+
+    def test_cache(self):
+        problems = self._load_problems()
+
+        self.assertTrue(os.path.exists(os.path.join(self.results_dir, lintforbrains.history.RESULTS_CACHE_FILENAME)))
+
+        with mock.patch('lintforbrains.results._iter_problem_rows_fromfile') as mock_parse:
+            self.assertEqual(problems, self._load_problems())
+            mock_parse.assert_not_called()
+
+    def test_cache_invalidated_per_file(self):
+        problems = self._load_problems()
+
+        problems_file = os.path.join(self.results_dir, 'BashSimpleArrayUse.xml')
+        with open(problems_file) as fh:
+            content = fh.read()
+        with open(problems_file, 'w') as fh:
+            fh.write(content.replace('<line>', '<line>1'))
+
+        parsed_files = []
+        parse_rows = lintforbrains.results._iter_problem_rows_fromfile
+
+        def _parse(project_dir, file, suppressions=None):
+            parsed_files.append(os.path.basename(file))
+            return parse_rows(project_dir, file, suppressions)
+
+        with mock.patch('lintforbrains.results._iter_problem_rows_fromfile', _parse):
+            self.assertNotEqual(problems, self._load_problems())
+
+        self.assertEqual(['BashSimpleArrayUse.xml'], parsed_files)
@@ -0,0 +1,48 @@
+import lintforbrains.scope
+import lintforbrains.suppress
+
+from . import TestCase
+
+
+class FileScopeTestCase(TestCase):
+
+    def test_contains(self):
+        file_scope = lintforbrains.scope.FileScope(['src/**'], ['src/vendor/**', '**/migrations/*', 'src/*_pb2.py'])
+
+        self.assertTrue(file_scope.contains('src/app.py'))
+        self.assertTrue(file_scope.contains('src/pkg/api_pb2.py'))
+        self.assertFalse(file_scope.contains('setup.py'))
+        self.assertFalse(file_scope.contains('src/vendor/six/six.py'))
+        self.assertFalse(file_scope.contains('src/app/migrations/0001_initial.py'))
+        self.assertFalse(file_scope.contains('src/api_pb2.py'))
+
+        self.assertTrue(file_scope.excludes_dir('src/vendor'))
+        self.assertFalse(file_scope.excludes_dir('src'))
+
+    def test_to_pattern(self):
+        self.assertIsNone(lintforbrains.scope.FileScope(source_dir='src').to_pattern())
+
+        file_scope = lintforbrains.scope.FileScope(['src/**/*.py'], ['src/vendor/**', '**/migrations/*'],
+                                                   source_dir='src/')
+        self.assertEqual('file:src//*&&file:src//*.py&&!file:src/vendor//*'
+                         '&&!(file:migrations/*||file:*//migrations/*)', file_scope.to_pattern())
+
+        self.assertEqual('(file:a.py||file:b.py)&&(!file:vendor//*)',
+                         lintforbrains.scope.intersect_scope_patterns('file:a.py||file:b.py', None,
+                                                                      '!file:vendor//*'))
+
+    def test_character_classes(self):
+        # scope globs and report suppression globs match path components the same way
+        file_scope = lintforbrains.scope.FileScope(['src/test_[!x]*.py'])
+        suppressions = lintforbrains.suppress.SuppressionMatcher(suppress_files=['src/test_[!x]*.py'])
+        for file in ['src/test_a.py', 'src/test_x.py', 'src/test_.py']:
+            self.assertEqual(suppressions.is_suppressed_file(f"file://project/{file}"), file_scope.contains(file))
+
+        self.assertEqual('file:src/test_?*.py', file_scope.to_pattern())
+
+        # an exclude glob would be widened, so it is not passed to the inspector
+        with self.assertLogs('lintforbrains.scope', 'WARNING'):
+            file_scope = lintforbrains.scope.FileScope(['src/**'], ['src/test_[!x]*.py', 'src/vendor/**'])
+        self.assertFalse(file_scope.contains('src/test_a.py'))
+        self.assertTrue(file_scope.contains('src/test_x.py'))
+        self.assertEqual('file:src//*&&!file:src/vendor//*', file_scope.to_pattern())
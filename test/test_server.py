@@ -0,0 +1,173 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import lintforbrains.cache
+import lintforbrains.config
+import lintforbrains.inspect
+import lintforbrains.results
+import lintforbrains.server
+
+from . import TestCase
+
+
+class InspectionServerTestCase(TestCase):
+    """
+    Runs an InspectionServer against the fake inspect.sh in test-data/pycharm
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.temp_dir.name, 'cache')
+        self.project_dir = os.path.join(self.temp_dir.name, 'project')
+        self.config_file = os.path.join(self.project_dir, '.lintconfig')
+
+        os.makedirs(os.path.join(self.project_dir, 'src'))
+        for f in ['src/a.py', 'src/b.py']:
+            with open(os.path.join(self.project_dir, f), 'w') as fh:
+                fh.write("print('hello')\n")
+        with open(self.config_file, 'w') as fh:
+            fh.write('inspect {\n  source_dir = "src/"\n  output_dir = "results/"\n}\n')
+
+        def _inspector_factory(pycharm_system_dir):
+            return lintforbrains.inspect.Inspector('2021.2', 'community',
+                                                   os.path.abspath('test-data/pycharm'),
+                                                   os.path.join(self.temp_dir.name, 'pycharm-config'),
+                                                   sys.executable,
+                                                   debug_level=0,
+                                                   cache_dir=self.cache_dir,
+                                                   pycharm_system_dir=pycharm_system_dir)
+
+        self.server = lintforbrains.server.InspectionServer(lintforbrains.server.server_socket_path(self.cache_dir),
+                                                            _inspector_factory,
+                                                            jobs=2,
+                                                            system_dir_root=os.path.join(self.cache_dir, 'system'))
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.start()
+
+        self.client = lintforbrains.server.InspectionClient(self.server.socket_path, timeout=5)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server_thread.join()
+        self.server.close()
+        self.temp_dir.cleanup()
+
+    def _wait(self, job):
+        while job['status'] not in ('succeeded', 'failed', 'cancelled'):
+            job = self.client.wait(job['id'], job['status'])
+        return job
+
+    def test_run_job(self):
+        self.assertEqual(self.server.socket_path, lintforbrains.server.find_server(self.server.socket_path))
+
+        job = self.client.submit(self.project_dir, self.config_file)
+        self.assertIn(job['status'], ('queued', 'running'))
+
+        job = self._wait(job)
+        self.assertEqual('succeeded', job['status'])
+
+        results_dir = job['results_dir']
+        self.assertEqual(os.path.join(self.project_dir, 'results'), os.path.dirname(results_dir))
+
+        results = lintforbrains.results.InspectionResults(self.project_dir, results_dir,
+                                                          lintforbrains.config.load_config(self.config_file))
+        self.assertEqual(2, len(list(results.iter_problems())))
+
+        # the project has its own system dir in the cache dir
+        system_dirs = os.listdir(os.path.join(self.cache_dir, 'system'))
+        self.assertEqual(1, len(system_dirs))
+        self.assertTrue(system_dirs[0].startswith('project-'))
+
+    def test_run_job_failed(self):
+        job = self._wait(self.client.submit(self.project_dir, os.path.join(self.project_dir, 'missing.lintconfig')))
+
+        self.assertEqual('failed', job['status'])
+        self.assertIn('missing.lintconfig', job['error'])
+
+    def test_submit_invalid_project(self):
+        with self.assertRaises(lintforbrains.server.InspectionServerError):
+            self.client.submit(os.path.join(self.temp_dir.name, 'missing'), self.config_file)
+
+    def test_submit_invalid_shards(self):
+        for shards in ('x', [], 0, 1.5):
+            with self.assertRaisesRegex(lintforbrains.server.InspectionServerError, 'shards'):
+                self.client._request('POST', '/jobs', {'project_dir': self.project_dir,
+                                                       'config_file': self.config_file,
+                                                       'shards': shards})
+        self.assertEqual([], self.server.list_jobs())
+
+    def _block_project(self, project_dir: str) -> threading.Event:
+        """
+        Block the jobs of a project until the returned event is set
+        """
+        release = threading.Event()
+        inspector_factory = self.server.inspector_factory
+
+        blocked_system_dir = lintforbrains.cache.project_system_dir(os.path.join(self.cache_dir, 'system'), project_dir)
+
+        def _blocking_inspector_factory(pycharm_system_dir):
+            if pycharm_system_dir == blocked_system_dir:
+                release.wait(10)
+            return inspector_factory(pycharm_system_dir)
+
+        self.server.inspector_factory = _blocking_inspector_factory
+        return release
+
+    def test_project_queue(self):
+        other_project_dir = os.path.join(self.temp_dir.name, 'other')
+        os.makedirs(os.path.join(other_project_dir, 'src'))
+        with open(os.path.join(other_project_dir, 'src/a.py'), 'w') as fh:
+            fh.write("print('hello')\n")
+        other_config_file = os.path.join(other_project_dir, '.lintconfig')
+        with open(other_config_file, 'w') as fh:
+            fh.write('inspect {\n  source_dir = "src/"\n  output_dir = "results/"\n}\n')
+
+        release = self._block_project(self.project_dir)
+        jobs = [self.client.submit(self.project_dir, self.config_file) for _ in range(3)]
+
+        # the queued jobs of the blocked project do not hold the second worker
+        other_job = self._wait(self.client.submit(other_project_dir, other_config_file))
+        self.assertEqual('succeeded', other_job['status'])
+        self.assertEqual(['running', 'queued', 'queued'], [self.client.get(j['id'])['status'] for j in jobs])
+
+        release.set()
+        self.assertEqual(['succeeded'] * 3, [self._wait(j)['status'] for j in jobs])
+
+    def test_close_cancels_queued_jobs(self):
+        release = self._block_project(self.project_dir)
+        jobs = [self.server.submit(self.project_dir, self.config_file) for _ in range(2)]
+
+        close_thread = threading.Thread(target=self.server.close)
+        close_thread.start()
+        while not self.server._executor._shutdown:
+            time.sleep(0.01)
+        release.set()
+        close_thread.join()
+
+        self.assertEqual(['succeeded', 'cancelled'], [j.status for j in jobs])
+
+    def test_drop_finished_jobs(self):
+        self.server.max_finished_jobs = 1
+        jobs = [self._wait(self.client.submit(self.project_dir, self.config_file)) for _ in range(2)]
+
+        self.assertEqual([jobs[1]['id']], [j.id for j in self.server.list_jobs()])
+        with self.assertRaises(lintforbrains.server.InspectionServerError):
+            self.client.get(jobs[0]['id'])
+
+    def test_run_inspect_client_errors(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            with self.assertRaises(SystemExit):
+                lintforbrains.server.run_inspect_client(self.server.socket_path, self.project_dir,
+                                                        os.path.join(self.project_dir, 'missing.lintconfig'))
+            self.assertIn('failed', output.getvalue().splitlines()[-1])
+
+            with self.assertRaises(SystemExit):
+                lintforbrains.server.run_inspect_client(self.server.socket_path,
+                                                        os.path.join(self.temp_dir.name, 'missing'), self.config_file)
+            self.assertIn('Error requesting', output.getvalue().splitlines()[-1])
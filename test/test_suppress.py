@@ -0,0 +1,68 @@
+import pathlib
+import pickle
+
+import lintforbrains.results
+import lintforbrains.suppress
+
+from . import TestCase
+
+
+class SuppressionMatcherTestCase(TestCase):
+
+    def setUp(self):
+        profile = lintforbrains.results.InspectionProfile("fake-profile")
+        python_group = lintforbrains.results.InspectionGroup(profile, "Python")
+        proofreading_group = lintforbrains.results.InspectionGroup(profile, "Proofreading")
+
+        self.pep8_type = lintforbrains.results.InspectionType(python_group, "PyPep8Inspection", "", "", True)
+        self.unresolved_type = lintforbrains.results.InspectionType(python_group, "PyUnresolvedReferencesInspection",
+                                                                    "", "", True)
+        self.spelling_type = lintforbrains.results.InspectionType(proofreading_group, "SpellCheckingInspection",
+                                                                  "", "", True)
+
+    def test_is_suppressed_file(self):
+        patterns = ['*.py', 'migrations/*.py', 'src/vendor/*/*', '/abs/src/*.py', 'test_?.py', 'gen[0-9].py']
+        paths = ['file:///abs/src/main.py', '/abs/src/main.py', '/abs/src/migrations/0001.py', 'src/vendor/lib/x.c',
+                 'other/src/vendor/lib/x.c', 'src/vendor/lib/deep/x.c', '/abs/src/test_1.py', 'gen5.py', 'gen.txt',
+                 'README.md', 'file://fake-project-dir/src/main.py']
+
+        for pattern in patterns:
+            matcher = lintforbrains.suppress.SuppressionMatcher(suppress_files=[pattern])
+            for path in paths:
+                self.assertEqual(pathlib.PurePath(path).match(pattern), matcher.is_suppressed_file(path),
+                                 f"{pattern} {path}")
+
+        matcher = lintforbrains.suppress.SuppressionMatcher(suppress_files=patterns)
+        for path in paths:
+            self.assertEqual(any(pathlib.PurePath(path).match(p) for p in patterns), matcher.is_suppressed_file(path))
+
+    def test_is_suppressed_severity(self):
+        matcher = lintforbrains.suppress.SuppressionMatcher(suppress_severity=['TYPO', 'WEAK WARNING'])
+
+        self.assertTrue(matcher.is_suppressed_severity(lintforbrains.results.InspectionProblemSeverity.TYPO))
+        self.assertTrue(matcher.is_suppressed_severity(lintforbrains.results.InspectionProblemSeverity.WEAK))
+        self.assertFalse(matcher.is_suppressed_severity(lintforbrains.results.InspectionProblemSeverity.ERROR))
+
+    def test_is_suppressed_type(self):
+        matcher = lintforbrains.suppress.SuppressionMatcher(suppress_problems=['Proofreading::*',
+                                                                               'Python::PyPep8Inspection'])
+
+        self.assertTrue(matcher.is_suppressed_type(self.spelling_type))
+        self.assertTrue(matcher.is_suppressed_type(self.pep8_type))
+        self.assertFalse(matcher.is_suppressed_type(self.unresolved_type))
+        self.assertFalse(matcher.is_suppressed_type(None))
+
+    def test_pickle(self):
+        matcher = lintforbrains.suppress.SuppressionMatcher(suppress_files=['*.txt'],
+                                                            suppress_problems=['Python::PyPep8Inspection'])
+        pickled_size = len(pickle.dumps(matcher))
+
+        # the memos, which reference the inspection profile, are not pickled
+        matcher.is_suppressed_type(self.pep8_type)
+        matcher.is_suppressed_file('README.txt')
+        self.assertEqual(pickled_size, len(pickle.dumps(matcher)))
+
+        unpickled_matcher = pickle.loads(pickle.dumps(matcher))
+        self.assertTrue(unpickled_matcher.is_suppressed_type(self.pep8_type))
+        self.assertTrue(unpickled_matcher.is_suppressed_file('README.txt'))
+        self.assertEqual(1, len(matcher._suppressed_types_cache))
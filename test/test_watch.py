@@ -0,0 +1,64 @@
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+
+import lintforbrains.watch
+
+from . import TestCase
+
+
+class ResultsWatcherTestCase(TestCase):
+    WRITER = textwrap.dedent('''
+        import os, sys, time
+        results_dir, exit_code = sys.argv[1], int(sys.argv[2])
+        with open(os.path.join(results_dir, 'First.xml'), 'w') as fh:
+            fh.write('<problems is_local_tool="true">\\n</problems>\\n')
+        with open(os.path.join(results_dir, 'Second.xml'), 'w') as fh:
+            fh.write('<problems is_local_tool="true">\\n')
+            fh.flush()
+            # exits once the first file is seen
+            while not os.path.exists(os.path.join(results_dir, 'seen')):
+                time.sleep(0.01)
+            fh.write('</problems>\\n')
+        sys.exit(exit_code)
+    ''')
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.results_dir = self.temp_dir.name
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _start_writer(self, exit_code: int):
+        return subprocess.Popen([sys.executable, '-c', self.WRITER, self.results_dir, str(exit_code)])
+
+    def test_iter_completed_files(self):
+        process = self._start_writer(0)
+        watcher = lintforbrains.watch.ResultsWatcher(self.results_dir, process, poll_interval=0.05)
+
+        completed = []
+        for inspection_name, problems_file in watcher.iter_completed_files():
+            completed.append((inspection_name, process.poll()))
+            open(os.path.join(self.results_dir, 'seen'), 'w').close()
+
+        # the first file was completed while the writer was running
+        self.assertEqual(['First', 'Second'], [name for name, _ in completed])
+        self.assertIsNone(completed[0][1])
+
+    def test_iter_completed_files_failed(self):
+        process = self._start_writer(1)
+        watcher = lintforbrains.watch.ResultsWatcher(self.results_dir, process, poll_interval=0.05)
+
+        with self.assertRaises(lintforbrains.watch.WatchError):
+            for _ in watcher.iter_completed_files():
+                open(os.path.join(self.results_dir, 'seen'), 'w').close()
+
+    def test_iter_completed_files_finished(self):
+        open(os.path.join(self.results_dir, 'Partial.xml'), 'w').close()
+
+        watcher = lintforbrains.watch.ResultsWatcher(self.results_dir)
+        self.assertEqual([('Partial', os.path.join(self.results_dir, 'Partial.xml'))],
+                         list(watcher.iter_completed_files()))